@@ -1,9 +1,89 @@
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import json
+import threading
+import time
 from datetime import datetime, timedelta
-from database import db
+from database import (
+    db, score_sketch_name, SKILL_DEMAND_SKETCH, SKILL_SUPPLY_SKETCH, SKILL_SUPPLY_BUCKET,
+    SKILL_SKETCH_CAPACITY, SCORE_QUANTILES_SKETCH, SCORE_MOMENTS_SKETCH
+)
+from sketches import sketch_store, SpaceSavingSketch, CountMinSketch, KLLSketch, ScoreMomentsSketch
+from config import config
 import numpy as np
-from collections import defaultdict, Counter
+from collections import defaultdict, OrderedDict
+
+class AnalyticsCache:
+    """TTL result cache for analytics queries, invalidated by the database data version"""
+    
+    def __init__(self, ttl_seconds: int = 60, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (endpoint, params) -> (result, computed_at, data_version)
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'total_recompute_seconds': 0.0,
+            'last_recompute_seconds': 0.0
+        }
+    
+    def get_or_compute(self, endpoint: str, params: Dict, compute: Callable[[], Any]) -> Tuple[Any, Dict]:
+        """Return a cached result for (endpoint, params) or compute and store it"""
+        key = (endpoint, json.dumps(params, sort_keys=True, default=str))
+        data_version = db.get_data_version()
+        now = time.time()
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[2] == data_version and now - entry[1] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[0], {
+                    'cached': True,
+                    'age_seconds': round(now - entry[1], 3),
+                    'data_version': data_version
+                }
+            self.stats['misses'] += 1
+        
+        start = time.perf_counter()
+        result = compute()
+        elapsed = time.perf_counter() - start
+        
+        with self._lock:
+            self.stats['total_recompute_seconds'] += elapsed
+            self.stats['last_recompute_seconds'] = elapsed
+            if self.ttl_seconds > 0:
+                self._entries[key] = (result, now, data_version)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        
+        return result, {
+            'cached': False,
+            'age_seconds': 0.0,
+            'data_version': data_version
+        }
+    
+    def clear(self):
+        """Drop all cached results"""
+        with self._lock:
+            self._entries.clear()
+    
+    def get_metrics(self) -> Dict:
+        """Get cache hit rate and recompute timing metrics"""
+        with self._lock:
+            hits = self.stats['hits']
+            misses = self.stats['misses']
+            total_requests = hits + misses
+            return {
+                'ttl_seconds': self.ttl_seconds,
+                'entries': len(self._entries),
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / total_requests, 4) if total_requests else 0.0,
+                'avg_recompute_ms': round(self.stats['total_recompute_seconds'] / misses * 1000, 2) if misses else 0.0,
+                'last_recompute_ms': round(self.stats['last_recompute_seconds'] * 1000, 2)
+            }
 
 class RecruitmentAnalytics:
     def __init__(self):
@@ -13,6 +93,11 @@ class RecruitmentAnalytics:
             'education_bias': 0.20,  # 20% difference threshold
             'experience_bias': 0.25   # 25% difference threshold
         }
+        self.cache = AnalyticsCache(ttl_seconds=config.ANALYTICS_CACHE_TTL)
+    
+    def get_cached(self, endpoint: str, compute: Callable[..., Any], **params) -> Tuple[Any, Dict]:
+        """Run an analytics query through the result cache, returning (result, cache_info)"""
+        return self.cache.get_or_compute(endpoint, params, lambda: compute(**params))
     
     def get_hiring_funnel_metrics(self, days: int = 30) -> Dict:
         """Get comprehensive hiring funnel metrics"""
@@ -57,15 +142,8 @@ class RecruitmentAnalytics:
         avg_time_result = cursor.fetchone()
         avg_time_to_interview = avg_time_result[0] if avg_time_result[0] else 0
         
-        # Get score distribution
-        cursor.execute('''
-            SELECT final_score
-            FROM candidate_scores cs
-            JOIN candidates c ON cs.candidate_id = c.id
-            WHERE c.created_at >= ?
-        ''', (start_date.isoformat(),))
-        
-        scores = [row[0] for row in cursor.fetchall() if row[0] is not None]
+        # Get score distribution from the per-day sketches
+        score_distribution = self._summarize_score_sketches(cursor, start_date)
         
         conn.close()
         
@@ -84,32 +162,59 @@ class RecruitmentAnalytics:
                 'avg_time_to_interview_days': round(avg_time_to_interview, 2),
                 'avg_time_to_hire_days': round(avg_time_to_interview * 1.5, 2)  # Estimate
             },
-            'score_distribution': {
-                'mean_score': round(np.mean(scores), 2) if scores else 0,
-                'median_score': round(np.median(scores), 2) if scores else 0,
-                'std_score': round(np.std(scores), 2) if scores else 0,
-                'score_ranges': self._get_score_ranges(scores)
-            }
+            'score_distribution': score_distribution
         }
     
-    def _get_score_ranges(self, scores: List[float]) -> Dict:
-        """Categorize scores into ranges"""
-        if not scores:
-            return {'excellent': 0, 'good': 0, 'average': 0, 'poor': 0}
-        
-        ranges = {'excellent': 0, 'good': 0, 'average': 0, 'poor': 0}
-        
-        for score in scores:
-            if score >= 85:
-                ranges['excellent'] += 1
-            elif score >= 70:
-                ranges['good'] += 1
-            elif score >= 55:
-                ranges['average'] += 1
-            else:
-                ranges['poor'] += 1
+    def get_score_distribution(self, days: int = 30, job_id: Optional[int] = None) -> Dict:
+        """Get the final score distribution over a window, globally or for one job"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        start_date = datetime.now() - timedelta(days=days)
+        distribution = self._summarize_score_sketches(cursor, start_date, job_id)
+        conn.close()
+        
+        distribution.update({'period_days': days, 'job_id': job_id})
+        return distribution
+    
+    def _summarize_score_sketches(self, cursor, start_date: datetime, job_id: Optional[int] = None) -> Dict:
+        """Merge the per-day score sketches for candidates created after start_date
+        
+        Mean, standard deviation and score ranges are exact; quantiles come from
+        the merged KLL sketch and carry its normalized rank error.
+        """
+        # Buckets are candidate creation days; a candidate created on start_date's
+        # day sorts before its ISO timestamp, so the window starts the day after
+        since_day = (start_date + timedelta(days=1)).date().isoformat()
+        quantiles_name = score_sketch_name(SCORE_QUANTILES_SKETCH, job_id)
+        moments_name = score_sketch_name(SCORE_MOMENTS_SKETCH, job_id)
+        buckets = sketch_store.load_names_since(cursor, [quantiles_name, moments_name], since_day)
+        
+        quantiles = KLLSketch.merge(buckets[quantiles_name])
+        moments = ScoreMomentsSketch.merge(buckets[moments_name])
+        
+        if moments.count == 0:
+            return {
+                'mean_score': 0,
+                'median_score': 0,
+                'std_score': 0,
+                'score_ranges': dict(moments.bands),
+                'quantiles': {},
+                'sample_size': 0,
+                'quantile_rank_error': round(quantiles.rank_error(), 4)
+            }
         
-        return ranges
+        return {
+            'mean_score': round(moments.mean, 2),
+            'median_score': round(quantiles.quantile(0.5), 2),
+            'std_score': round(moments.std(), 2),
+            'score_ranges': dict(moments.bands),
+            'quantiles': {
+                f'p{int(q * 100)}': round(quantiles.quantile(q), 2)
+                for q in (0.1, 0.25, 0.5, 0.75, 0.9)
+            },
+            'sample_size': moments.count,
+            'quantile_rank_error': round(quantiles.rank_error(), 4)
+        }
     
     def detect_bias(self, job_id: Optional[int] = None) -> Dict:
         """Detect potential bias in hiring process"""
@@ -342,7 +447,7 @@ class RecruitmentAnalytics:
         conn = db.get_connection()
         cursor = conn.cursor()
         
-        # Get historical data for this job or similar jobs
+        # Get historical data for this job or its precomputed similar jobs
         cursor.execute('''
             SELECT 
                 cs.final_score,
@@ -352,9 +457,8 @@ class RecruitmentAnalytics:
             FROM candidate_scores cs
             JOIN candidates c ON cs.candidate_id = c.id
             LEFT JOIN interview_schedules i ON c.id = i.candidate_id
-            WHERE cs.job_id = ? OR cs.job_id IN (
-                SELECT id FROM job_descriptions 
-                WHERE title LIKE (SELECT '%' || title || '%' FROM job_descriptions WHERE id = ?)
+            WHERE cs.job_id IN (
+                SELECT ? UNION SELECT similar_job_id FROM job_similarity WHERE job_id = ?
             )
         ''', (job_id, job_id))
         
@@ -445,20 +549,10 @@ class RecruitmentAnalytics:
         
         trend_data = cursor.fetchone()
         
-        # Top skills in demand
-        cursor.execute('''
-            SELECT skills
-            FROM job_descriptions
-            WHERE created_at >= DATE('now', '-30 days')
-        ''')
-        
-        job_skills = []
-        for row in cursor.fetchall():
-            if row[0]:
-                skills = json.loads(row[0])
-                job_skills.extend(skills)
-        
-        top_skills = Counter(job_skills).most_common(10)
+        # Top skills in demand, merged from the per-day streaming sketches
+        demand_sketch = self._get_skill_demand_sketch(cursor, days=30)
+        supply_sketch = sketch_store.load(cursor, SKILL_SUPPLY_SKETCH, SKILL_SUPPLY_BUCKET) or CountMinSketch()
+        top_skills = demand_sketch.top(10)
         
         conn.close()
         
@@ -479,38 +573,41 @@ class RecruitmentAnalytics:
                 'trend_direction': 'up' if trend_percentage > 0 else 'down' if trend_percentage < 0 else 'stable'
             },
             'market_insights': {
-                'top_skills_demand': [{'skill': skill, 'count': count} for skill, count in top_skills],
-                'skill_gap_analysis': self._analyze_skill_gaps()
+                'top_skills_demand': [
+                    {'skill': skill, 'count': count, 'max_overestimate': error}
+                    for skill, count, error in top_skills
+                ],
+                'skill_gap_analysis': self._analyze_skill_gaps(demand_sketch, supply_sketch),
+                'error_bounds': {
+                    'demand_max_overestimate': round(demand_sketch.error_bound(), 2),
+                    'supply_max_overestimate': round(supply_sketch.error_bound(), 2),
+                    'supply_confidence': round(1 - supply_sketch.delta, 4)
+                }
             },
             'alerts': self._generate_alerts(pipeline_data, trend_percentage)
         }
     
-    def _analyze_skill_gaps(self) -> List[Dict]:
-        """Analyze gaps between job requirements and candidate skills"""
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
-        # Get job skills vs candidate skills
-        cursor.execute('''
-            SELECT j.skills as job_skills, c.skills as candidate_skills
-            FROM job_descriptions j
-            CROSS JOIN candidates c
-            WHERE j.created_at >= DATE('now', '-30 days')
-        ''')
-        
-        skill_gaps = defaultdict(int)
-        
-        for row in cursor.fetchall():
-            job_skills = json.loads(row[0]) if row[0] else []
-            candidate_skills = json.loads(row[1]) if row[1] else []
-            
-            candidate_skills_lower = [s.lower() for s in candidate_skills]
-            
-            for job_skill in job_skills:
-                if job_skill.lower() not in candidate_skills_lower:
-                    skill_gaps[job_skill] += 1
-        
-        conn.close()
+    def _get_skill_demand_sketch(self, cursor, days: int) -> SpaceSavingSketch:
+        """Merge the daily job skill demand sketches covering the last `days` days"""
+        cursor.execute("SELECT DATE('now', ?)", (f'-{days} days',))
+        since_day = cursor.fetchone()[0]
+        buckets = sketch_store.load_since(cursor, SKILL_DEMAND_SKETCH, since_day)
+        return SpaceSavingSketch.merge(buckets, capacity=SKILL_SKETCH_CAPACITY)
+    
+    def _analyze_skill_gaps(self, demand_sketch: SpaceSavingSketch, supply_sketch: CountMinSketch) -> List[Dict]:
+        """Analyze gaps between job requirements and candidate skills
+        
+        A demanded skill's gap is the number of (job, candidate) pairs where the job
+        asks for it and the candidate lacks it: demand * (candidates - holders).
+        """
+        total_candidates = supply_sketch.observations
+        
+        skill_gaps = {}
+        for skill, demand, _ in demand_sketch.top(demand_sketch.capacity):
+            holders = min(supply_sketch.estimate(skill.lower()), total_candidates)
+            gap_count = demand * (total_candidates - holders)
+            if gap_count > 0:
+                skill_gaps[skill] = gap_count
         
         # Return top skill gaps
         top_gaps = sorted(skill_gaps.items(), key=lambda x: x[1], reverse=True)[:5]
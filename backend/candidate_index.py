@@ -0,0 +1,290 @@
+import heapq
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from database import db, parse_skills
+from pair_features import normalize_skill
+
+# Experience is bucketed per year; anything above the cap shares the last bucket
+EXPERIENCE_YEAR_CAP = 50
+EXPERIENCE_FACETS = (('0-1', 0, 1), ('2-4', 2, 4), ('5-9', 5, 9), ('10+', 10, None))
+# Match sets up to this size are faceted from their entries rather than by a popcount per facet bitmap
+FACET_SCAN_LIMIT = 2000
+# Skills up to this size are faceted through their id arrays instead of a full-width AND + popcount
+SPARSE_SKILL_SIZE = 4096
+
+def ids_bitmap(ids: List[int]) -> int:
+    """Bitmap with the given ids set, built in one pass"""
+    if not ids:
+        return 0
+    bits = np.zeros(max(ids) + 1, dtype=bool)
+    bits[ids] = True
+    return int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little')
+
+def popcount(bitmap: int) -> int:
+    """Number of set bits in a bitmap (int.bit_count needs Python 3.10)"""
+    return bin(bitmap).count('1')
+
+def bitmap_ids(bitmap: int) -> np.ndarray:
+    """Set bit positions of a bitmap (candidate ids), ascending"""
+    if not bitmap:
+        return np.zeros(0, dtype=np.int64)
+    raw = np.frombuffer(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little'), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(raw, bitorder='little'))
+
+def bitmap_contains(bitmap: int, ids: np.ndarray) -> np.ndarray:
+    """Mask of which ids are set in a bitmap"""
+    if not bitmap or len(ids) == 0:
+        return np.zeros(len(ids), dtype=bool)
+    raw = np.frombuffer(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little'), dtype=np.uint8)
+    bits = np.unpackbits(raw, bitorder='little').astype(bool)
+    mask = np.zeros(len(ids), dtype=bool)
+    in_range = ids < len(bits)
+    mask[in_range] = bits[ids[in_range]]
+    return mask
+
+class CandidateBitmapIndex:
+    """In-memory bitmap index over candidate skills, experience and education
+    
+    Bit i of every bitmap stands for candidate id i. There is one bitmap
+    per canonical skill, per experience year and per education level, so
+    boolean skill filters and facet counts are ANDs, ORs and popcounts
+    instead of a scan that JSON-decodes every candidate's skills. Python
+    ints serve as the bitmaps: their bitwise operators run in C over
+    machine words, and popcount counts bits with bin().count in C. The index is rebuilt from the candidates table at
+    startup and kept current by the candidate write endpoints.
+    
+    Skill facets over large match sets are counted in descending skill size
+    and stop once no remaining skill can reach the top facet_limit. Small
+    skills are counted by looking their (cached) id arrays up in a match
+    mask, which is far cheaper than a full-width AND.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._all = 0
+        self._skills: Dict[str, int] = {}
+        self._skill_sizes: Dict[str, int] = {}
+        self._skill_ids: Dict[str, np.ndarray] = {}  # Sorted id arrays of small skills, dropped when they change
+        self._skill_names: Dict[str, str] = {}  # Canonical skill -> first spelling seen
+        self._experience: Dict[int, int] = {}
+        self._education: Dict[str, int] = {}
+        self._entries: Dict[int, Tuple[List[str], int, str]] = {}  # What each candidate is indexed under
+    
+    def rebuild(self):
+        """Rebuild the index from the candidates table"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, skills, experience_years, education_level FROM candidates')
+        rows = cursor.fetchall()
+        conn.close()
+        
+        # Group ids per key first: OR-ing bits one at a time would copy a whole bitmap per candidate
+        entries, names = {}, {}
+        skill_ids, year_ids, level_ids = {}, {}, {}
+        for candidate_id, skills, experience_years, education_level in rows:
+            entry = entries[candidate_id] = self._entry(parse_skills(skills), experience_years, education_level, names)
+            for skill in entry[0]:
+                skill_ids.setdefault(skill, []).append(candidate_id)
+            year_ids.setdefault(entry[1], []).append(candidate_id)
+            if entry[2]:
+                level_ids.setdefault(entry[2], []).append(candidate_id)
+        
+        with self._lock:
+            self._all = ids_bitmap(list(entries))
+            self._skills = {skill: ids_bitmap(ids) for skill, ids in skill_ids.items()}
+            self._skill_sizes = {skill: len(ids) for skill, ids in skill_ids.items()}
+            self._skill_ids = {
+                skill: np.array(ids, dtype=np.int64) for skill, ids in skill_ids.items() if len(ids) <= SPARSE_SKILL_SIZE
+            }
+            self._skill_names = names
+            self._experience = {year: ids_bitmap(ids) for year, ids in year_ids.items()}
+            self._education = {level: ids_bitmap(ids) for level, ids in level_ids.items()}
+            self._entries = entries
+        print(f"🧮 Candidate bitmap index built ({len(rows)} candidates, {len(skill_ids)} skills)")
+    
+    def _entry(self, skills: List[str], experience_years: Optional[int], education_level: Optional[str],
+               names: Dict[str, str]) -> Tuple[List[str], int, str]:
+        """Canonical skills, experience bucket and education level a candidate is indexed under"""
+        canonical_skills = []
+        for skill in skills:
+            canonical = normalize_skill(skill)
+            if canonical and canonical not in canonical_skills:
+                canonical_skills.append(canonical)
+                names.setdefault(canonical, str(skill).strip())
+        year = min(max(0, int(experience_years or 0)), EXPERIENCE_YEAR_CAP)
+        level = (education_level or '').strip().lower()
+        return canonical_skills, year, level
+    
+    def _add(self, candidate_id: int, skills: List[str], experience_years: Optional[int], education_level: Optional[str]):
+        """Set a candidate's bits (lock held)"""
+        bit = 1 << candidate_id
+        canonical_skills, year, level = self._entry(skills, experience_years, education_level, self._skill_names)
+        for skill in canonical_skills:
+            self._skills[skill] = self._skills.get(skill, 0) | bit
+            self._skill_ids.pop(skill, None)
+            self._skill_sizes[skill] = self._skill_sizes.get(skill, 0) + 1
+        self._experience[year] = self._experience.get(year, 0) | bit
+        if level:
+            self._education[level] = self._education.get(level, 0) | bit
+        self._all |= bit
+        self._entries[candidate_id] = (canonical_skills, year, level)
+    
+    def _remove(self, candidate_id: int):
+        """Clear a candidate's bits (lock held)"""
+        entry = self._entries.pop(candidate_id, None)
+        if entry is None:
+            return
+        mask = ~(1 << candidate_id)
+        skills, year, level = entry
+        for skill in skills:
+            self._skills[skill] &= mask
+            self._skill_sizes[skill] -= 1
+            self._skill_ids.pop(skill, None)
+            if not self._skill_sizes[skill]:
+                del self._skills[skill], self._skill_sizes[skill]
+                self._skill_names.pop(skill, None)
+        self._experience[year] &= mask
+        if level:
+            self._education[level] &= mask
+            if not self._education[level]:
+                del self._education[level]
+        self._all &= mask
+    
+    def update_candidate(self, candidate_id: int):
+        """Re-index a created or edited candidate from its stored row"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT skills, experience_years, education_level FROM candidates WHERE id = ?', (candidate_id,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        with self._lock:
+            self._remove(candidate_id)
+            if row:
+                self._add(candidate_id, parse_skills(row[0]), row[1], row[2])
+    
+    def remove_candidate(self, candidate_id: int):
+        """Drop a deleted candidate from the index"""
+        with self._lock:
+            self._remove(candidate_id)
+    
+    def _experience_bitmap(self, min_years: Optional[int], max_years: Optional[int]) -> int:
+        """Union of the experience year buckets within a range (lock held)"""
+        low = max(0, min_years or 0)
+        high = EXPERIENCE_YEAR_CAP if max_years is None else min(max_years, EXPERIENCE_YEAR_CAP)
+        bitmap = 0
+        for year in range(low, high + 1):
+            bitmap |= self._experience.get(year, 0)
+        return bitmap
+    
+    def _facets(self, matches: int, ids: np.ndarray, facet_limit: int) -> Dict:
+        """Skill, experience and education counts over the matches (lock held)"""
+        if len(ids) <= FACET_SCAN_LIMIT:
+            skill_counts, year_counts, level_counts = Counter(), Counter(), Counter()
+            for candidate_id in ids.tolist():
+                skills, year, level = self._entries[candidate_id]
+                skill_counts.update(skills)
+                year_counts[year] += 1
+                if level:
+                    level_counts[level] += 1
+        else:
+            if matches == self._all:
+                count = popcount
+            else:
+                count = lambda bitmap: popcount(bitmap & matches)
+            match_mask = np.zeros(int(ids[-1]) + 1, dtype=bool)
+            match_mask[ids] = True
+            skill_counts = {}
+            best = []  # Min-heap of the facet_limit best counts so far
+            for skill in sorted(self._skill_sizes, key=self._skill_sizes.get, reverse=True):
+                if len(best) == facet_limit and self._skill_sizes[skill] < best[0]:
+                    break  # A skill's count over the matches is at most its size
+                skill_counts[skill] = (
+                    self._sparse_count(skill, match_mask) if self._skill_sizes[skill] <= SPARSE_SKILL_SIZE
+                    else count(self._skills[skill])
+                )
+                if len(best) < facet_limit:
+                    heapq.heappush(best, skill_counts[skill])
+                elif skill_counts[skill] > best[0]:
+                    heapq.heapreplace(best, skill_counts[skill])
+            year_counts = {year: count(bitmap) for year, bitmap in self._experience.items()}
+            level_counts = {level: count(bitmap) for level, bitmap in self._education.items()}
+        
+        top_skills = heapq.nsmallest(
+            facet_limit, ((-count, self._skill_names[skill]) for skill, count in skill_counts.items() if count)
+        )
+        return {
+            'skills': [{'skill': name, 'count': -negative_count} for negative_count, name in top_skills],
+            'experience': [
+                {
+                    'range': label,
+                    'count': sum(
+                        count for year, count in year_counts.items() if year >= low and (high is None or year <= high)
+                    )
+                }
+                for label, low, high in EXPERIENCE_FACETS
+            ],
+            'education_level': sorted(
+                [{'level': level, 'count': count} for level, count in level_counts.items() if count],
+                key=lambda item: (-item['count'], item['level'])
+            )
+        }
+    
+    def _sparse_count(self, skill: str, match_mask: np.ndarray) -> int:
+        """How many of a small skill's candidates are set in the match mask (lock held)"""
+        skill_ids = self._skill_ids.get(skill)
+        if skill_ids is None:
+            skill_ids = self._skill_ids[skill] = bitmap_ids(self._skills[skill])
+        return int(np.count_nonzero(match_mask[skill_ids[skill_ids < len(match_mask)]]))
+    
+    def search(self, must_have: Optional[List[str]] = None, nice_to_have: Optional[List[str]] = None,
+               exclude: Optional[List[str]] = None, min_experience: Optional[int] = None,
+               max_experience: Optional[int] = None, education_levels: Optional[List[str]] = None,
+               offset: int = 0, limit: int = 50, facet_limit: int = 20) -> Dict:
+        """Boolean skill/experience/education filter with facet counts over the matches
+        
+        Matches must have every must_have skill and no excluded skill, and
+        are ordered by how many nice_to_have skills they have, then by id.
+        """
+        if facet_limit < 1:
+            raise ValueError("facet_limit must be at least 1")
+        start = time.perf_counter()
+        nice_to_have = [normalize_skill(skill) for skill in nice_to_have or []]
+        with self._lock:
+            matches = self._all
+            for skill in must_have or []:
+                matches &= self._skills.get(normalize_skill(skill), 0)
+            for skill in exclude or []:
+                matches &= ~self._skills.get(normalize_skill(skill), 0)
+            if min_experience is not None or max_experience is not None:
+                matches &= self._experience_bitmap(min_experience, max_experience)
+            if education_levels:
+                levels = 0
+                for level in education_levels:
+                    levels |= self._education.get(level.strip().lower(), 0)
+                matches &= levels
+            
+            ids = bitmap_ids(matches)
+            nice_counts = np.zeros(len(ids), dtype=np.int64)
+            for skill in nice_to_have:
+                nice_counts += bitmap_contains(self._skills.get(skill, 0), ids)
+            
+            facets = self._facets(matches, ids, facet_limit)
+        
+        order = np.lexsort((ids, -nice_counts))[offset:offset + limit]
+        return {
+            'total': len(ids),
+            'offset': offset,
+            'limit': limit,
+            'results': [
+                {'candidate_id': int(ids[row]), 'nice_to_have_matched': int(nice_counts[row])} for row in order
+            ],
+            'facets': facets,
+            'query_ms': round((time.perf_counter() - start) * 1000, 3)
+        }
+
+# Initialize candidate bitmap index instance
+candidate_index = CandidateBitmapIndex() 
\ No newline at end of file
@@ -46,6 +46,62 @@ class Config:
     OLLAMA_MODEL: str = env_config('OLLAMA_MODEL', default='llama2')
     LOCAL_AI_ENABLED: bool = env_config('LOCAL_AI_ENABLED', default='True').lower() == 'true'
     
+    # Analytics Configuration
+    ANALYTICS_CACHE_TTL: int = env_config('ANALYTICS_CACHE_TTL', default=60, cast=int)  # Seconds, 0 disables caching
+    
+    # Job Similarity Configuration
+    JOB_SIMILARITY_TOP_N: int = env_config('JOB_SIMILARITY_TOP_N', default=10, cast=int)
+    JOB_SIMILARITY_MIN_SCORE: float = env_config('JOB_SIMILARITY_MIN_SCORE', default=0.35, cast=float)
+    JOB_SIMILARITY_EMBEDDING_WEIGHT: float = env_config('JOB_SIMILARITY_EMBEDDING_WEIGHT', default=0.7, cast=float)  # Remainder goes to skill overlap
+    
+    # Two-stage Candidate Retrieval Configuration
+    RETRIEVAL_TOP_N: int = env_config('RETRIEVAL_TOP_N', default=100, cast=int)  # Stage one survivors given semantic + MCP scoring
+    RETRIEVAL_MIN_SKILL_OVERLAP: int = env_config('RETRIEVAL_MIN_SKILL_OVERLAP', default=1, cast=int)  # Exact job skill matches, 0 disables
+    RETRIEVAL_MAX_EXPERIENCE_GAP: int = env_config('RETRIEVAL_MAX_EXPERIENCE_GAP', default=5, cast=int)  # Years below the requirement
+    RETRIEVAL_MIN_EDUCATION_RATIO: float = env_config('RETRIEVAL_MIN_EDUCATION_RATIO', default=0.0, cast=float)  # 0 disables
+    
+    # Hybrid (BM25 + embedding) Retrieval Configuration, overridable per job
+    HYBRID_RRF_K: int = env_config('HYBRID_RRF_K', default=60, cast=int)  # Reciprocal-rank fusion damping
+    HYBRID_DEPTH: int = env_config('HYBRID_DEPTH', default=200, cast=int)  # Candidates each ranking contributes to the fusion
+    HYBRID_LEXICAL_WEIGHT: float = env_config('HYBRID_LEXICAL_WEIGHT', default=1.0, cast=float)
+    HYBRID_SEMANTIC_WEIGHT: float = env_config('HYBRID_SEMANTIC_WEIGHT', default=1.0, cast=float)
+    HYBRID_MAX_QUERY_TERMS: int = env_config('HYBRID_MAX_QUERY_TERMS', default=64, cast=int)  # Job words sent to BM25
+    
+    # Full Score Matrix Configuration
+    SCORE_MATRIX_CHUNK_SIZE: int = env_config('SCORE_MATRIX_CHUNK_SIZE', default=500, cast=int)  # Candidates scored against all jobs per bulk write
+    SCORE_MATRIX_LEASE_SECONDS: float = env_config('SCORE_MATRIX_LEASE_SECONDS', default=600.0, cast=float)  # A running run without a chunk written for this long can be resumed elsewhere
+    
+    # Near-duplicate Candidate Detection Configuration
+    DUPLICATE_THRESHOLD: float = env_config('DUPLICATE_THRESHOLD', default=0.7, cast=float)  # Estimated resume Jaccard similarity (word 3-grams)
+    MINHASH_PERMUTATIONS: int = env_config('MINHASH_PERMUTATIONS', default=128, cast=int)  # Signature length; changing it re-signs every resume
+    MINHASH_BANDS: int = env_config('MINHASH_BANDS', default=32, cast=int)  # LSH bands of permutations / bands rows each
+    
+    # Talent Pool Clustering Configuration
+    TALENT_POOL_COUNT: int = env_config('TALENT_POOL_COUNT', default=12, cast=int)  # k-means clusters over candidate resume embeddings
+    TALENT_POOL_BATCH_SIZE: int = env_config('TALENT_POOL_BATCH_SIZE', default=1024, cast=int)  # Candidates per mini-batch and per page read
+    TALENT_POOL_REFIT_SECONDS: float = env_config('TALENT_POOL_REFIT_SECONDS', default=900.0, cast=float)  # Background refit interval, when candidates changed
+    
+    # Embedding Model Configuration
+    EMBEDDING_MODEL: str = env_config('EMBEDDING_MODEL', default='all-MiniLM-L6-v2')  # Only used while no model is active in the embedding_models registry
+    EMBEDDING_MODEL_FORCE: bool = env_config('EMBEDDING_MODEL_FORCE', default='False').lower() == 'true'  # Load EMBEDDING_MODEL and make it active even if the registry names another
+    EMBEDDING_FALLBACK_MODEL: str = env_config('EMBEDDING_FALLBACK_MODEL', default='')  # Loaded if the model fails to load; empty to fail instead
+    EMBEDDING_SWAP_BATCH_SIZE: int = env_config('EMBEDDING_SWAP_BATCH_SIZE', default=256, cast=int)  # Entities re-embedded per batch during a model swap
+    EMBEDDING_MODEL_SYNC_SECONDS: float = env_config('EMBEDDING_MODEL_SYNC_SECONDS', default=30.0, cast=float)  # How often workers check for a swapped model
+    
+    # Embedding File Configuration
+    EMBEDDING_FILE_DIR: str = env_config('EMBEDDING_FILE_DIR', default='embedding_files')
+    EMBEDDING_FILE_DTYPE: str = env_config('EMBEDDING_FILE_DTYPE', default='int8')  # int8 (4x smaller than float32) or float16
+    EMBEDDING_RESCORE: bool = env_config('EMBEDDING_RESCORE', default='True').lower() == 'true'  # Re-score the approximate top-k with exact vectors
+    EMBEDDING_RESCORE_OVERSAMPLE: int = env_config('EMBEDDING_RESCORE_OVERSAMPLE', default=4, cast=int)  # Approximate matches re-scored per result
+    
+    # MCP Configuration
+    MCP_CONTEXT_CACHE_SIZE: int = env_config('MCP_CONTEXT_CACHE_SIZE', default=256, cast=int)  # Jobs, 0 disables caching
+    MCP_CONTEXT_REFRESH_SECONDS: float = env_config('MCP_CONTEXT_REFRESH_SECONDS', default=5.0, cast=float)
+    MCP_FEEDBACK_BATCH_SIZE: int = env_config('MCP_FEEDBACK_BATCH_SIZE', default=20, cast=int)
+    MCP_FEEDBACK_FLUSH_SECONDS: float = env_config('MCP_FEEDBACK_FLUSH_SECONDS', default=2.0, cast=float)
+    WEIGHT_PROFILE_REFRESH_SECONDS: float = env_config('WEIGHT_PROFILE_REFRESH_SECONDS', default=5.0, cast=float)  # Active profile re-check interval
+    SHADOW_QUEUE_SIZE: int = env_config('SHADOW_QUEUE_SIZE', default=1000, cast=int)  # Shadow tasks beyond this are dropped
+    
     @classmethod
     def is_email_configured(cls) -> bool:
         """Check if email is properly configured"""
@@ -1,8 +1,78 @@
 import sqlite3
 import json
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional, Tuple
 import os
+from sketches import sketch_store, SpaceSavingSketch, CountMinSketch, KLLSketch, ScoreMomentsSketch
+from text_index import create_text_index_tables, index_document, unindex_document, compress_text, decompress_text
+
+# Streaming skill sketches maintained by the write paths
+SKILL_DEMAND_SKETCH = 'job_skill_demand'       # Space-Saving, one bucket per job creation day
+SKILL_SUPPLY_SKETCH = 'candidate_skill_supply'  # Count-Min, single all-time bucket
+SKILL_SUPPLY_BUCKET = 'all'
+SKILL_SKETCH_CAPACITY = 200
+SCORE_QUANTILES_SKETCH = 'score_quantiles'      # KLL over final_score, one bucket per candidate creation day
+SCORE_MOMENTS_SKETCH = 'score_moments'          # Moments + score bands, same bucketing
+SCORE_COMPONENTS = ('skills', 'experience', 'education', 'semantic')
+# Version of the scoring logic stamped on score rows; bump it to have every stored score recomputed
+SCORER_VERSION = 1
+
+# A stored score is stale once the candidate, job, scoring logic or active weight profile changed after it was
+# computed, or it was computed with another embedding model than the one serving (the condition's one ? parameter)
+STALE_SCORE_CONDITION = '''(
+    cs.candidate_version IS NOT c.version OR
+    cs.job_version IS NOT j.version OR
+    cs.scorer_version IS NOT {scorer_version} OR
+    cs.weight_profile_version IS NOT COALESCE(
+        (SELECT version FROM weight_profiles WHERE is_active = 1), cs.weight_profile_version
+    ) OR
+    cs.embedding_model IS NOT ?
+)'''.format(scorer_version=SCORER_VERSION)
+
+# Insert-or-replace of one candidate_scores row, shared by the per-job and bulk write paths
+UPSERT_SCORE_SQL = '''
+    INSERT INTO candidate_scores (candidate_id, job_id, match_score, 
+                                experience_score, education_score, final_score,
+                                matched_skills, missing_skills, weight_profile_version,
+                                skills_component, experience_component,
+                                education_component, semantic_component,
+                                candidate_version, job_version, scorer_version, embedding_model)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(candidate_id, job_id) DO UPDATE SET
+        match_score = excluded.match_score,
+        experience_score = excluded.experience_score,
+        education_score = excluded.education_score,
+        final_score = excluded.final_score,
+        matched_skills = excluded.matched_skills,
+        missing_skills = excluded.missing_skills,
+        weight_profile_version = excluded.weight_profile_version,
+        skills_component = excluded.skills_component,
+        experience_component = excluded.experience_component,
+        education_component = excluded.education_component,
+        semantic_component = excluded.semantic_component,
+        candidate_version = excluded.candidate_version,
+        job_version = excluded.job_version,
+        scorer_version = excluded.scorer_version,
+        embedding_model = excluded.embedding_model
+'''
+
+def score_sketch_name(base_name: str, job_id: Optional[int] = None) -> str:
+    """Name of the global (job_id=None) or per-job variant of a score sketch"""
+    return base_name if job_id is None else f"{base_name}:job:{job_id}"
+
+def parse_skills(value) -> List[str]:
+    """Parse a skills column (JSON list or comma-separated string) into a list"""
+    if not value:
+        return []
+    if isinstance(value, list):
+        return value
+    try:
+        skills = json.loads(value)
+        if isinstance(skills, list):
+            return [str(skill) for skill in skills]
+    except (TypeError, ValueError):
+        pass
+    return [skill.strip() for skill in str(value).split(',') if skill.strip()]
 
 class Database:
     def __init__(self, db_path: str = "hiring_assistant.db"):
@@ -103,13 +173,430 @@ class Database:
             )
         ''')
         
+        # Data versions table (bumped by every write, used for cache invalidation)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS data_versions (
+                scope TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        # Persisted streaming sketches (skill demand/supply), bucketed by day
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS analytics_sketches (
+                sketch_name TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (sketch_name, bucket)
+            )
+        ''')
+        
+        # Stored sentence embeddings, one row per entity and embedding model
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                entity_type TEXT NOT NULL,
+                entity_id INTEGER NOT NULL,
+                model_name TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (entity_type, entity_id, model_name)
+            )
+        ''')
+        
+        # Top-N similar jobs per job (embedding + skill overlap)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS job_similarity (
+                job_id INTEGER NOT NULL,
+                similar_job_id INTEGER NOT NULL,
+                similarity REAL NOT NULL,
+                PRIMARY KEY (job_id, similar_job_id)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_job_similarity_similar ON job_similarity(similar_job_id)')
+        
+        # Full candidate x job score matrix runs; a run resumes after last_candidate_id
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS score_matrix_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                status TEXT NOT NULL,
+                chunk_size INTEGER NOT NULL,
+                total_candidates INTEGER NOT NULL DEFAULT 0,
+                total_jobs INTEGER NOT NULL DEFAULT 0,
+                processed_candidates INTEGER NOT NULL DEFAULT 0,
+                last_candidate_id INTEGER NOT NULL DEFAULT 0,
+                pairs_written INTEGER NOT NULL DEFAULT 0,
+                weight_profile_version INTEGER,
+                error TEXT,
+                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+        # Worker holding a running run's lease; updated_at is its heartbeat
+        self._ensure_column(cursor, 'score_matrix_runs', 'lease_owner', 'TEXT')
+        # Embedding model the run's scores are computed with; a resume must use the same one
+        self._ensure_column(cursor, 'score_matrix_runs', 'embedding_model', 'TEXT')
+        
+        # Talent pools: k-means centroids over candidate resume embeddings, refit in the background
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS talent_pools (
+                id INTEGER PRIMARY KEY,
+                label TEXT NOT NULL,
+                centroid BLOB NOT NULL,
+                top_skills TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                data_version INTEGER NOT NULL,
+                fitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Embedding model registry: the active model, and models being (or once) built by a model swap
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS embedding_models (
+                model_name TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                source_model TEXT,
+                total_vectors INTEGER NOT NULL DEFAULT 0,
+                checked_vectors INTEGER NOT NULL DEFAULT 0,
+                encoded_vectors INTEGER NOT NULL DEFAULT 0,
+                passes INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                activated_at TIMESTAMP
+            )
+        ''')
+        
+        # Per-job overrides of the hybrid retriever settings (NULL keeps the configured default)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS job_retrieval_settings (
+                job_id INTEGER PRIMARY KEY,
+                lexical_weight REAL,
+                semantic_weight REAL,
+                rrf_k INTEGER,
+                depth INTEGER,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (job_id) REFERENCES job_descriptions (id)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_candidate_scores_job ON candidate_scores(job_id)')
+        
+        # Versioned scoring weight profiles (exactly one active)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS weight_profiles (
+                version INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                weights TEXT NOT NULL,
+                is_active INTEGER NOT NULL DEFAULT 0,
+                is_shadow INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                activated_at TIMESTAMP
+            )
+        ''')
+        self._ensure_column(cursor, 'weight_profiles', 'is_shadow', 'INTEGER NOT NULL DEFAULT 0')
+        self._ensure_column(cursor, 'candidate_scores', 'weight_profile_version', 'INTEGER')
+        # RAG match components (0-100), kept for what-if re-ranking
+        for component in SCORE_COMPONENTS:
+            self._ensure_column(cursor, 'candidate_scores', f'{component}_component', 'REAL')
+        
+        # Edit counters, and the versions each score was computed from
+        self._ensure_column(cursor, 'candidates', 'version', 'INTEGER NOT NULL DEFAULT 1')
+        self._ensure_column(cursor, 'job_descriptions', 'version', 'INTEGER NOT NULL DEFAULT 1')
+        self._ensure_column(cursor, 'candidate_scores', 'candidate_version', 'INTEGER')
+        self._ensure_column(cursor, 'candidate_scores', 'job_version', 'INTEGER')
+        self._ensure_column(cursor, 'candidate_scores', 'scorer_version', 'INTEGER')
+        self._ensure_column(cursor, 'candidate_scores', 'embedding_model', 'TEXT')
+        
+        # Near-duplicate flag: the original of the candidate's duplicate group, and the resume similarity found
+        self._ensure_column(cursor, 'candidates', 'duplicate_of', 'INTEGER')
+        self._ensure_column(cursor, 'candidates', 'duplicate_similarity', 'REAL')
+        
+        # Talent pool (k-means cluster) each candidate is assigned to, and its cosine similarity to the centroid
+        self._ensure_column(cursor, 'candidates', 'talent_pool_id', 'INTEGER')
+        self._ensure_column(cursor, 'candidates', 'talent_pool_similarity', 'REAL')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_candidates_talent_pool ON candidates(talent_pool_id, talent_pool_similarity)')
+        
+        # One score row per (candidate, job); rescoring replaces it in place
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_candidate_scores_pair'")
+        dedupe_scores = cursor.fetchone() is None
+        if dedupe_scores:
+            cursor.execute('''
+                DELETE FROM candidate_scores WHERE id NOT IN (
+                    SELECT MAX(id) FROM candidate_scores GROUP BY candidate_id, job_id
+                )
+            ''')
+            dedupe_scores = cursor.rowcount > 0
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_candidate_scores_pair ON candidate_scores(candidate_id, job_id)
+        ''')
+        
+        # Shadow-profile scores stored next to the primary score for offline comparison
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS shadow_scores (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                request_id TEXT,
+                source TEXT NOT NULL,
+                candidate_id INTEGER NOT NULL,
+                job_id INTEGER NOT NULL,
+                primary_profile_version INTEGER,
+                primary_score REAL,
+                shadow_profile_version INTEGER NOT NULL,
+                shadow_score REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_shadow_scores_version ON shadow_scores(shadow_profile_version)')
+        
+        # MCP recruiter feedback (shared by all workers for rolling model metrics)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS mcp_feedback (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                request_id TEXT NOT NULL,
+                actual_outcome TEXT,
+                feedback_score REAL NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Fields changed by each candidate/job edit, keyed by the version the edit produced
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS field_changes (
+                entity_type TEXT NOT NULL,
+                entity_id INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                fields TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (entity_type, entity_id, version)
+            )
+        ''')
+        
+        # Text extracted from uploaded resumes, zlib-compressed
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS resume_texts (
+                candidate_id INTEGER PRIMARY KEY,
+                text BLOB NOT NULL,
+                text_length INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (candidate_id) REFERENCES candidates (id)
+            )
+        ''')
+        
+        # MinHash signatures of resume texts (uint32 arrays) for near-duplicate detection
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS resume_minhashes (
+                candidate_id INTEGER PRIMARY KEY,
+                signature BLOB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (candidate_id) REFERENCES candidates (id)
+            )
+        ''')
+        
+        # Full-text indexes over resume texts, job descriptions and messages
+        create_text_index_tables(cursor)
+        
         conn.commit()
+        
+        # Backfill sketches for databases created before they existed
+        cursor.execute('SELECT EXISTS(SELECT 1 FROM analytics_sketches WHERE sketch_name = ?)', (SKILL_SUPPLY_SKETCH,))
+        has_skill_sketches = cursor.fetchone()[0]
+        cursor.execute('SELECT EXISTS(SELECT 1 FROM job_descriptions) OR EXISTS(SELECT 1 FROM candidates)')
+        has_skill_data = cursor.fetchone()[0]
+        cursor.execute('SELECT EXISTS(SELECT 1 FROM analytics_sketches WHERE sketch_name = ?)', (SCORE_MOMENTS_SKETCH,))
+        has_score_sketches = cursor.fetchone()[0]
+        cursor.execute('SELECT EXISTS(SELECT 1 FROM candidate_scores)')
+        has_score_data = cursor.fetchone()[0]
         conn.close()
+        
+        if has_skill_data and not has_skill_sketches:
+            self.rebuild_skill_sketches()
+        if has_score_data and (dedupe_scores or not has_score_sketches):
+            self.rebuild_score_sketches()
     
     def get_connection(self):
         """Get database connection"""
         return sqlite3.connect(self.db_path)
     
+    def _ensure_column(self, cursor, table: str, column: str, definition: str):
+        """Add a column to an existing table if databases created before it lack it"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        if column not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    
+    def bump_data_version(self, cursor, *scopes: str):
+        """Bump the data version of the given scopes and the global scope.
+        
+        Must be called with the cursor of the write being versioned so the bump
+        commits (or rolls back) together with the data it describes.
+        """
+        for scope in ('global',) + scopes:
+            cursor.execute('''
+                INSERT INTO data_versions (scope, version) VALUES (?, 1)
+                ON CONFLICT(scope) DO UPDATE SET version = version + 1
+            ''', (scope,))
+    
+    def get_data_version(self, scope: str = 'global') -> int:
+        """Get the current data version for a scope"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT version FROM data_versions WHERE scope = ?', (scope,))
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else 0
+    
+    def get_data_versions(self) -> Dict[str, int]:
+        """Get the current data version of every scope"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT scope, version FROM data_versions')
+        versions = dict(cursor.fetchall())
+        conn.close()
+        return versions
+    
+    def _record_job_skill_demand(self, cursor, job_id: int):
+        """Fold a newly inserted job's skills into its day's demand sketch"""
+        cursor.execute('SELECT DATE(created_at), skills FROM job_descriptions WHERE id = ?', (job_id,))
+        row = cursor.fetchone()
+        if not row:
+            return
+        
+        sketch = sketch_store.load(cursor, SKILL_DEMAND_SKETCH, row[0]) or SpaceSavingSketch(SKILL_SKETCH_CAPACITY)
+        sketch.observe(parse_skills(row[1]))
+        sketch_store.save(cursor, SKILL_DEMAND_SKETCH, row[0], sketch)
+    
+    def _rebuild_job_skill_demand(self, cursor, day: str):
+        """Rebuild one day's demand sketch after a job from that day was edited or deleted"""
+        cursor.execute('SELECT skills FROM job_descriptions WHERE DATE(created_at) = ?', (day,))
+        rows = cursor.fetchall()
+        if not rows:
+            sketch_store.delete(cursor, SKILL_DEMAND_SKETCH, day)
+            return
+        
+        sketch = SpaceSavingSketch(SKILL_SKETCH_CAPACITY)
+        for row in rows:
+            sketch.observe(parse_skills(row[0]))
+        sketch_store.save(cursor, SKILL_DEMAND_SKETCH, day, sketch)
+    
+    def _update_skill_supply(self, cursor, old_skills: Optional[List[str]], new_skills: Optional[List[str]]):
+        """Apply a candidate insert (old=None), update, or delete (new=None) to the supply sketch"""
+        sketch = sketch_store.load(cursor, SKILL_SUPPLY_SKETCH, SKILL_SUPPLY_BUCKET) or CountMinSketch()
+        if old_skills is not None:
+            sketch.observe({skill.lower() for skill in old_skills}, sign=-1)
+        if new_skills is not None:
+            sketch.observe({skill.lower() for skill in new_skills}, sign=1)
+        sketch_store.save(cursor, SKILL_SUPPLY_SKETCH, SKILL_SUPPLY_BUCKET, sketch)
+    
+    def _record_score_distribution(self, cursor, candidate_id: int, job_id: int, final_score: Optional[float]):
+        """Fold a new score into the global and per-job distribution sketches for the candidate's day"""
+        if final_score is None:
+            return
+        cursor.execute('SELECT DATE(created_at) FROM candidates WHERE id = ?', (candidate_id,))
+        row = cursor.fetchone()
+        if not row:
+            return
+        
+        for scope in (None, job_id):
+            quantiles_name = score_sketch_name(SCORE_QUANTILES_SKETCH, scope)
+            moments_name = score_sketch_name(SCORE_MOMENTS_SKETCH, scope)
+            quantiles = sketch_store.load(cursor, quantiles_name, row[0]) or KLLSketch()
+            moments = sketch_store.load(cursor, moments_name, row[0]) or ScoreMomentsSketch()
+            quantiles.add(final_score)
+            moments.add(final_score)
+            sketch_store.save(cursor, quantiles_name, row[0], quantiles)
+            sketch_store.save(cursor, moments_name, row[0], moments)
+    
+    def _rebuild_score_distribution(self, cursor, day: str, job_id: Optional[int] = None):
+        """Rebuild one day's global (job_id=None) or per-job score sketches after scores were removed"""
+        query = '''
+            SELECT cs.final_score
+            FROM candidate_scores cs
+            JOIN candidates c ON cs.candidate_id = c.id
+            WHERE DATE(c.created_at) = ? AND cs.final_score IS NOT NULL
+        '''
+        params = [day]
+        if job_id is not None:
+            query += ' AND cs.job_id = ?'
+            params.append(job_id)
+        cursor.execute(query, params)
+        
+        quantiles = KLLSketch()
+        moments = ScoreMomentsSketch()
+        for row in cursor.fetchall():
+            quantiles.add(row[0])
+            moments.add(row[0])
+        
+        quantiles_name = score_sketch_name(SCORE_QUANTILES_SKETCH, job_id)
+        moments_name = score_sketch_name(SCORE_MOMENTS_SKETCH, job_id)
+        if moments.count == 0:
+            sketch_store.delete(cursor, quantiles_name, day)
+            sketch_store.delete(cursor, moments_name, day)
+        else:
+            sketch_store.save(cursor, quantiles_name, day, quantiles)
+            sketch_store.save(cursor, moments_name, day, moments)
+    
+    def rebuild_score_sketches(self):
+        """Rebuild all score distribution sketches from the candidate_scores table"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            DELETE FROM analytics_sketches
+            WHERE sketch_name IN (?, ?) OR sketch_name LIKE ? OR sketch_name LIKE ?
+        ''', (SCORE_QUANTILES_SKETCH, SCORE_MOMENTS_SKETCH,
+              f"{SCORE_QUANTILES_SKETCH}:job:%", f"{SCORE_MOMENTS_SKETCH}:job:%"))
+        
+        cursor.execute('''
+            SELECT DATE(c.created_at), cs.job_id, cs.final_score
+            FROM candidate_scores cs
+            JOIN candidates c ON cs.candidate_id = c.id
+            WHERE cs.final_score IS NOT NULL
+        ''')
+        
+        sketches = {}
+        for day, job_id, final_score in cursor.fetchall():
+            for scope in (None, job_id):
+                key = (scope, day)
+                if key not in sketches:
+                    sketches[key] = (KLLSketch(), ScoreMomentsSketch())
+                sketches[key][0].add(final_score)
+                sketches[key][1].add(final_score)
+        
+        for (scope, day), (quantiles, moments) in sketches.items():
+            sketch_store.save(cursor, score_sketch_name(SCORE_QUANTILES_SKETCH, scope), day, quantiles)
+            sketch_store.save(cursor, score_sketch_name(SCORE_MOMENTS_SKETCH, scope), day, moments)
+        
+        conn.commit()
+        conn.close()
+    
+    def rebuild_skill_sketches(self):
+        """Rebuild all skill demand/supply sketches from the jobs and candidates tables"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        sketch_store.delete(cursor, SKILL_DEMAND_SKETCH)
+        sketch_store.delete(cursor, SKILL_SUPPLY_SKETCH)
+        
+        demand_by_day = {}
+        cursor.execute('SELECT DATE(created_at), skills FROM job_descriptions')
+        for day, skills in cursor.fetchall():
+            if day not in demand_by_day:
+                demand_by_day[day] = SpaceSavingSketch(SKILL_SKETCH_CAPACITY)
+            demand_by_day[day].observe(parse_skills(skills))
+        
+        supply = CountMinSketch()
+        cursor.execute('SELECT skills FROM candidates')
+        for row in cursor.fetchall():
+            supply.observe({skill.lower() for skill in parse_skills(row[0])})
+        
+        for day, sketch in demand_by_day.items():
+            sketch_store.save(cursor, SKILL_DEMAND_SKETCH, day, sketch)
+        sketch_store.save(cursor, SKILL_SUPPLY_SKETCH, SKILL_SUPPLY_BUCKET, supply)
+        
+        conn.commit()
+        conn.close()
+    
     def insert_job_description(self, title: str, description: str, requirements: str = "", skills: str = "") -> int:
         """Insert a new job description"""
         conn = self.get_connection()
@@ -119,6 +606,9 @@ class Database:
             VALUES (?, ?, ?, ?)
         ''', (title, description, requirements, skills))
         job_id = cursor.lastrowid
+        self._record_job_skill_demand(cursor, job_id)
+        index_document(cursor, 'job', job_id, (title, description))
+        self.bump_data_version(cursor, 'jobs')
         conn.commit()
         conn.close()
         return job_id
@@ -145,20 +635,262 @@ class Database:
             candidate_data.get('video_intro_path', '')
         ))
         candidate_id = cursor.lastrowid
+        self._update_skill_supply(cursor, None, candidate_data.get('skills', []))
+        if candidate_data.get('resume_text'):
+            self._store_resume_text(cursor, candidate_id, candidate_data['resume_text'])
+        self.bump_data_version(cursor, 'candidates')
         conn.commit()
         conn.close()
         return candidate_id
     
-    def insert_candidate_score(self, score_data: Dict) -> int:
-        """Insert candidate score"""
+    def _store_resume_text(self, cursor, candidate_id: int, text: str):
+        """Store (or replace) a candidate's compressed resume text and re-index it"""
+        cursor.execute('SELECT text FROM resume_texts WHERE candidate_id = ?', (candidate_id,))
+        existing = cursor.fetchone()
+        if existing:
+            unindex_document(cursor, 'resume', candidate_id, (decompress_text(existing[0]),))
+        cursor.execute('''
+            INSERT INTO resume_texts (candidate_id, text, text_length) VALUES (?, ?, ?)
+            ON CONFLICT(candidate_id) DO UPDATE SET text = excluded.text, text_length = excluded.text_length
+        ''', (candidate_id, compress_text(text), len(text)))
+        index_document(cursor, 'resume', candidate_id, (text,))
+    
+    def save_resume_text(self, candidate_id: int, text: str):
+        """Store (or replace) a candidate's extracted resume text"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        self._store_resume_text(cursor, candidate_id, text)
+        conn.commit()
+        conn.close()
+    
+    def get_resume_texts(self, candidate_ids: List[int]) -> Dict[int, str]:
+        """Get the decompressed resume texts of candidates that have one"""
+        if not candidate_ids:
+            return {}
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT candidate_id, text FROM resume_texts
+            WHERE candidate_id IN ({', '.join('?' for _ in candidate_ids)})
+        ''', candidate_ids)
+        texts = {candidate_id: decompress_text(text) for candidate_id, text in cursor.fetchall()}
+        conn.close()
+        return texts
+    
+    def get_resume_minhashes(self) -> Dict[int, bytes]:
+        """Get every stored resume MinHash signature"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT candidate_id, signature FROM resume_minhashes')
+        signatures = dict(cursor.fetchall())
+        conn.close()
+        return signatures
+    
+    def get_unsigned_resume_ids(self) -> List[int]:
+        """Get the ids of candidates with a resume text but no MinHash signature, ascending"""
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT INTO candidate_scores (candidate_id, job_id, match_score, 
-                                        experience_score, education_score, final_score,
-                                        matched_skills, missing_skills)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+            SELECT rt.candidate_id FROM resume_texts rt
+            LEFT JOIN resume_minhashes rm ON rm.candidate_id = rt.candidate_id
+            WHERE rm.candidate_id IS NULL
+            ORDER BY rt.candidate_id
+        ''')
+        candidate_ids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return candidate_ids
+    
+    def save_resume_minhash(self, candidate_id: int, signature: bytes):
+        """Store (or replace) a candidate's resume MinHash signature"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO resume_minhashes (candidate_id, signature) VALUES (?, ?)
+            ON CONFLICT(candidate_id) DO UPDATE SET signature = excluded.signature
+        ''', (candidate_id, signature))
+        conn.commit()
+        conn.close()
+    
+    def mark_duplicate(self, candidate_id: int, original_id: int, similarity: Optional[float] = None) -> int:
+        """Flag a candidate (and any duplicates of it) as duplicates of original_id's group
+        
+        Duplicates are not scored, so the candidate's stored scores are
+        deleted. Returns the id the candidate now points at: the original of
+        original_id's group, which is original_id itself unless that is a
+        duplicate too.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT id, duplicate_of FROM candidates WHERE id IN (?, ?)', (candidate_id, original_id))
+            rows = dict(cursor.fetchall())
+            if candidate_id not in rows or original_id not in rows:
+                raise ValueError("Candidate not found")
+            root_id = rows[original_id] or original_id
+            if root_id == candidate_id:
+                raise ValueError("A candidate cannot be a duplicate of itself or of its own duplicates")
+            
+            cursor.execute('''
+                UPDATE candidates
+                SET duplicate_of = ?, duplicate_similarity = ?, talent_pool_id = NULL, talent_pool_similarity = NULL
+                WHERE id = ?
+            ''', (root_id, similarity, candidate_id))
+            cursor.execute('UPDATE candidates SET duplicate_of = ? WHERE duplicate_of = ?', (root_id, candidate_id))
+            
+            cursor.execute('SELECT DISTINCT job_id FROM candidate_scores WHERE candidate_id = ?', (candidate_id,))
+            scored_job_ids = [row[0] for row in cursor.fetchall()]
+            if scored_job_ids:
+                cursor.execute('DELETE FROM candidate_scores WHERE candidate_id = ?', (candidate_id,))
+                cursor.execute('SELECT DATE(created_at) FROM candidates WHERE id = ?', (candidate_id,))
+                created_day = cursor.fetchone()[0]
+                self._rebuild_score_distribution(cursor, created_day)
+                for scored_job_id in scored_job_ids:
+                    self._rebuild_score_distribution(cursor, created_day, scored_job_id)
+            self.bump_data_version(cursor, 'candidates', 'scores')
+            conn.commit()
+        finally:
+            conn.close()
+        return root_id
+    
+    def clear_duplicate(self, candidate_id: int) -> bool:
+        """Unflag a candidate as a duplicate, returning whether it was flagged"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE candidates SET duplicate_of = NULL, duplicate_similarity = NULL
+            WHERE id = ? AND duplicate_of IS NOT NULL
+        ''', (candidate_id,))
+        cleared = cursor.rowcount > 0
+        self.bump_data_version(cursor, 'candidates')
+        conn.commit()
+        conn.close()
+        return cleared
+    
+    def get_duplicate_ids(self, original_id: int) -> List[int]:
+        """Get the ids of the candidates flagged as duplicates of an original, ascending"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM candidates WHERE duplicate_of = ? ORDER BY id', (original_id,))
+        duplicate_ids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return duplicate_ids
+    
+    def get_duplicate_groups(self) -> List[Dict]:
+        """Get every duplicate group: its original and the candidates flagged as its duplicates"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, name, email, resume_path, duplicate_of, duplicate_similarity, created_at
+            FROM candidates
+            WHERE duplicate_of IS NOT NULL
+               OR id IN (SELECT duplicate_of FROM candidates WHERE duplicate_of IS NOT NULL)
+            ORDER BY id
+        ''')
+        rows = cursor.fetchall()
+        conn.close()
+        
+        groups = {}
+        for row in rows:
+            candidate = {
+                'id': row[0],
+                'name': row[1],
+                'email': row[2],
+                'resume_path': row[3],
+                'created_at': row[6]
+            }
+            if row[4] is None:
+                groups[row[0]] = {'original': candidate, 'duplicates': []}
+            else:
+                groups[row[4]]['duplicates'].append({**candidate, 'similarity': row[5]})
+        return list(groups.values())
+    
+    def get_job_retrieval_settings(self, job_id: int) -> Dict:
+        """Get the hybrid retriever settings a job overrides"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT lexical_weight, semantic_weight, rrf_k, depth FROM job_retrieval_settings WHERE job_id = ?
+        ''', (job_id,))
+        row = cursor.fetchone()
+        conn.close()
+        if not row:
+            return {}
+        names = ('lexical_weight', 'semantic_weight', 'rrf_k', 'depth')
+        return {name: value for name, value in zip(names, row) if value is not None}
+    
+    def save_job_retrieval_settings(self, job_id: int, settings: Dict):
+        """Replace a job's hybrid retriever overrides (missing keys fall back to the defaults)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO job_retrieval_settings (job_id, lexical_weight, semantic_weight, rrf_k, depth, updated_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(job_id) DO UPDATE SET
+                lexical_weight = excluded.lexical_weight,
+                semantic_weight = excluded.semantic_weight,
+                rrf_k = excluded.rrf_k,
+                depth = excluded.depth,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (job_id, settings.get('lexical_weight'), settings.get('semantic_weight'),
+              settings.get('rrf_k'), settings.get('depth')))
+        conn.commit()
+        conn.close()
+    
+    def insert_candidate_score(self, score_data: Dict) -> int:
+        """Insert or replace the score of a candidate for a job"""
+        return self.upsert_candidate_scores([score_data])[0]
+    
+    def upsert_candidate_scores(self, scores: List[Dict]) -> List[int]:
+        """Insert or replace candidate scores in one transaction, returning their row IDs
+        
+        Each score should carry the candidate_version, job_version and
+        embedding_model it was computed from; rows are stamped with the
+        current SCORER_VERSION.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        score_ids = []
+        replaced = set()  # (candidate day, job_id) whose distribution sketches need a rebuild
+        
+        for score_data in scores:
+            cursor.execute('''
+                SELECT DATE(c.created_at)
+                FROM candidate_scores cs
+                JOIN candidates c ON cs.candidate_id = c.id
+                WHERE cs.candidate_id = ? AND cs.job_id = ?
+            ''', (score_data['candidate_id'], score_data['job_id']))
+            existing = cursor.fetchone()
+            
+            cursor.execute(UPSERT_SCORE_SQL, self._score_params(score_data))
+            cursor.execute(
+                'SELECT id FROM candidate_scores WHERE candidate_id = ? AND job_id = ?',
+                (score_data['candidate_id'], score_data['job_id'])
+            )
+            score_ids.append(cursor.fetchone()[0])
+            
+            if existing:
+                replaced.add((existing[0], score_data['job_id']))
+            else:
+                self._record_score_distribution(
+                    cursor, score_data['candidate_id'], score_data['job_id'], score_data['final_score']
+                )
+        
+        # Sketches can't forget a replaced score, so rebuild the affected days
+        for day, job_id in replaced:
+            self._rebuild_score_distribution(cursor, day, job_id)
+        for day in {day for day, _ in replaced}:
+            self._rebuild_score_distribution(cursor, day)
+        
+        if scores:
+            self.bump_data_version(cursor, 'scores')
+        conn.commit()
+        conn.close()
+        return score_ids
+    
+    @staticmethod
+    def _score_params(score_data: Dict) -> Tuple:
+        """UPSERT_SCORE_SQL parameters of a score row"""
+        return (
             score_data['candidate_id'],
             score_data['job_id'],
             score_data['match_score'],
@@ -166,24 +898,226 @@ class Database:
             score_data['education_score'],
             score_data['final_score'],
             json.dumps(score_data.get('matched_skills', [])),
-            json.dumps(score_data.get('missing_skills', []))
-        ))
-        score_id = cursor.lastrowid
+            json.dumps(score_data.get('missing_skills', [])),
+            score_data.get('weight_profile_version'),
+            *(score_data.get('components', {}).get(component) for component in SCORE_COMPONENTS),
+            score_data.get('candidate_version'),
+            score_data.get('job_version'),
+            SCORER_VERSION,
+            score_data.get('embedding_model')
+        )
+    
+    def bulk_upsert_candidate_scores(self, scores: Iterable[Dict]) -> int:
+        """Insert or replace many candidate scores with one executemany, returning the row count
+        
+        `scores` may be a generator; rows are consumed as they are written.
+        Unlike upsert_candidate_scores, score distribution sketches are not
+        maintained row by row; callers rebuild them (rebuild_score_sketches)
+        once the bulk write is done.
+        """
+        written = 0
+        
+        def params():
+            nonlocal written
+            for score_data in scores:
+                written += 1
+                yield self._score_params(score_data)
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany(UPSERT_SCORE_SQL, params())
+        if written:
+            self.bump_data_version(cursor, 'scores')
+        conn.commit()
+        conn.close()
+        return written
+    
+    def create_score_matrix_run(self, chunk_size: int, total_candidates: int, total_jobs: int,
+                                weight_profile_version: Optional[int], lease_owner: str,
+                                lease_seconds: float) -> Optional[int]:
+        """Record a new full score matrix run leased to lease_owner, or None while another run holds a live lease"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO score_matrix_runs (status, chunk_size, total_candidates, total_jobs, weight_profile_version, lease_owner)
+            SELECT 'running', ?, ?, ?, ?, ?
+            WHERE NOT EXISTS (
+                SELECT 1 FROM score_matrix_runs WHERE status = 'running' AND updated_at >= datetime('now', ?)
+            )
+        ''', (chunk_size, total_candidates, total_jobs, weight_profile_version, lease_owner, f'-{lease_seconds} seconds'))
+        run_id = cursor.lastrowid if cursor.rowcount else None
+        conn.commit()
+        conn.close()
+        return run_id
+    
+    def claim_score_matrix_run(self, run_id: int, lease_owner: str, lease_seconds: float) -> bool:
+        """Lease a failed run, or a running one whose heartbeat expired, to lease_owner
+        
+        Fails while any run (this one included) holds a live lease, so two
+        workers never score at once.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE score_matrix_runs SET status = 'running', error = NULL, lease_owner = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status IN ('running', 'failed') AND NOT EXISTS (
+                SELECT 1 FROM score_matrix_runs WHERE status = 'running' AND updated_at >= datetime('now', ?)
+            )
+        ''', (lease_owner, run_id, f'-{lease_seconds} seconds'))
+        claimed = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return claimed
+    
+    def update_score_matrix_run(self, run_id: int, lease_owner: Optional[str] = None, **fields) -> bool:
+        """Update a score matrix run's status or progress counters, renewing its lease
+        
+        With lease_owner, only updates the run while that worker still holds
+        its lease, returning whether it did.
+        """
+        allowed = {
+            'status', 'total_candidates', 'total_jobs', 'processed_candidates', 'last_candidate_id',
+            'pairs_written', 'weight_profile_version', 'embedding_model', 'error', 'finished_at'
+        }
+        unknown = set(fields) - allowed
+        if unknown:
+            raise ValueError(f"Unknown score matrix run fields: {sorted(unknown)}")
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        assignments = ''.join(f'{name} = ?, ' for name in fields)
+        owner_condition = ' AND lease_owner = ?' if lease_owner is not None else ''
+        cursor.execute(f'''
+            UPDATE score_matrix_runs SET {assignments}updated_at = CURRENT_TIMESTAMP WHERE id = ?{owner_condition}
+        ''', (*fields.values(), run_id, *([lease_owner] if lease_owner is not None else [])))
+        updated = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return updated
+    
+    def get_score_matrix_runs(self, run_id: Optional[int] = None, limit: int = 20,
+                              lease_seconds: Optional[float] = None) -> List[Dict]:
+        """Get one score matrix run, or the most recent ones
+        
+        With lease_seconds, each run's lease_expired is whether it is
+        running without a heartbeat in the last lease_seconds.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        expired = (
+            f"status = 'running' AND updated_at < datetime('now', '-{float(lease_seconds)} seconds')"
+            if lease_seconds is not None else '0'
+        )
+        if run_id is not None:
+            cursor.execute(f'SELECT *, {expired} AS lease_expired FROM score_matrix_runs WHERE id = ?', (run_id,))
+        else:
+            cursor.execute(f'SELECT *, {expired} AS lease_expired FROM score_matrix_runs ORDER BY id DESC LIMIT ?', (limit,))
+        columns = [column[0] for column in cursor.description]
+        runs = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        for run in runs:
+            run['lease_expired'] = bool(run['lease_expired'])
+        conn.close()
+        return runs
+    
+    def get_active_embedding_model(self) -> Optional[str]:
+        """Name of the embedding model the last swap activated, if any"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT model_name FROM embedding_models WHERE status = 'active'")
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else None
+    
+    def save_embedding_model(self, model_name: str, **fields):
+        """Register an embedding model, or update its status or build progress"""
+        allowed = {
+            'status', 'source_model', 'total_vectors', 'checked_vectors', 'encoded_vectors', 'passes', 'error'
+        }
+        unknown = set(fields) - allowed
+        if unknown:
+            raise ValueError(f"Unknown embedding model fields: {sorted(unknown)}")
+        if fields.get('status') == 'active':
+            raise ValueError("Use activate_embedding_model to make a model active")
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT OR IGNORE INTO embedding_models (model_name, status) VALUES (?, ?)",
+            (model_name, fields.get('status', 'registered'))
+        )
+        if fields:
+            assignments = ', '.join(f'{name} = ?' for name in fields)
+            cursor.execute(f'''
+                UPDATE embedding_models SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE model_name = ?
+            ''', (*fields.values(), model_name))
         conn.commit()
         conn.close()
-        return score_id
     
-    def get_candidates_with_scores(self, job_id: int) -> List[Dict]:
-        """Get all candidates with their scores for a specific job"""
+    def activate_embedding_model(self, model_name: str):
+        """Make a model the active one, retiring the previous, in one transaction"""
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT c.*, cs.match_score, cs.experience_score, cs.education_score, 
-                   cs.final_score, cs.matched_skills, cs.missing_skills
+            UPDATE embedding_models SET status = 'retired', updated_at = CURRENT_TIMESTAMP
+            WHERE status = 'active' AND model_name != ?
+        ''', (model_name,))
+        cursor.execute('''
+            INSERT INTO embedding_models (model_name, status, activated_at) VALUES (?, 'active', CURRENT_TIMESTAMP)
+            ON CONFLICT(model_name) DO UPDATE SET
+                status = 'active',
+                error = NULL,
+                updated_at = CURRENT_TIMESTAMP,
+                activated_at = CURRENT_TIMESTAMP
+        ''', (model_name,))
+        # Stored scores of the previous model are stale from now on (STALE_SCORE_CONDITION)
+        self.bump_data_version(cursor, 'scores')
+        conn.commit()
+        conn.close()
+    
+    def get_embedding_models(self) -> List[Dict]:
+        """Registered embedding models with their stored vector count and dimension, the active one first"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT model_name, COUNT(*), MAX(dim) FROM embeddings GROUP BY model_name')
+        stored = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+        cursor.execute('''
+            SELECT * FROM embedding_models ORDER BY status = 'active' DESC, updated_at DESC, model_name
+        ''')
+        columns = [column[0] for column in cursor.description]
+        models = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        conn.close()
+        registered = {model['model_name'] for model in models}
+        # Vectors left by models that predate the registry (or a fallback) are listed too
+        models.extend({'model_name': name, 'status': 'unregistered'} for name in sorted(stored) if name not in registered)
+        for model in models:
+            model['stored_vectors'], model['dim'] = stored.get(model['model_name'], (0, None))
+        return models
+    
+    def delete_embedding_model(self, model_name: str) -> int:
+        """Delete a model's stored embeddings and registry entry, returning how many vectors were deleted"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM embeddings WHERE model_name = ?', (model_name,))
+        deleted = cursor.rowcount
+        cursor.execute('DELETE FROM embedding_models WHERE model_name = ?', (model_name,))
+        conn.commit()
+        conn.close()
+        return deleted
+    
+    def get_candidates_with_scores(self, job_id: int, embedding_model: str) -> List[Dict]:
+        """Get all candidates with their scores for a specific job, flagging scores stale for the serving embedding model"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT c.id, c.name, c.email, c.phone, c.skills, c.experience_years, c.education_level,
+                   c.education_score, c.resume_path, c.github_url, c.video_intro_path, c.created_at,
+                   cs.match_score, cs.experience_score, cs.education_score, 
+                   cs.final_score, cs.matched_skills, cs.missing_skills, cs.weight_profile_version,
+                   c.version, cs.id IS NOT NULL AND {STALE_SCORE_CONDITION}
             FROM candidates c
+            LEFT JOIN job_descriptions j ON j.id = ?
             LEFT JOIN candidate_scores cs ON c.id = cs.candidate_id AND cs.job_id = ?
+            WHERE c.duplicate_of IS NULL
             ORDER BY cs.final_score DESC
-        ''', (job_id,))
+        ''', (embedding_model, job_id, job_id))
         
         candidates = []
         for row in cursor.fetchall():
@@ -204,13 +1138,116 @@ class Database:
                 'experience_score': row[13],
                 'final_score': row[15],
                 'matched_skills': json.loads(row[16]) if row[16] else [],
-                'missing_skills': json.loads(row[17]) if row[17] else []
+                'missing_skills': json.loads(row[17]) if row[17] else [],
+                'weight_profile_version': row[18],
+                'version': row[19],
+                'score_stale': bool(row[20])
             }
             candidates.append(candidate)
         
         conn.close()
         return candidates
     
+    def get_pairs_to_score(self, embedding_model: str, candidate_id: Optional[int] = None,
+                           job_id: Optional[int] = None, limit: int = 500) -> List[Tuple[int, int]]:
+        """Get (candidate_id, job_id) pairs with a missing or stale score, grouped by job
+        
+        Scores computed with another embedding model than embedding_model
+        are stale. Candidates flagged as near-duplicates are not scored.
+        """
+        conditions = [f'(cs.id IS NULL OR {STALE_SCORE_CONDITION})', 'c.duplicate_of IS NULL']
+        params = [embedding_model]
+        if candidate_id is not None:
+            conditions.append('c.id = ?')
+            params.append(candidate_id)
+        if job_id is not None:
+            conditions.append('j.id = ?')
+            params.append(job_id)
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT c.id, j.id
+            FROM job_descriptions j
+            CROSS JOIN candidates c
+            LEFT JOIN candidate_scores cs ON cs.candidate_id = c.id AND cs.job_id = j.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY j.id, c.id
+            LIMIT ?
+        ''', (*params, limit))
+        pairs = cursor.fetchall()
+        conn.close()
+        return pairs
+    
+    def get_stored_scores(self, job_id: int, candidate_ids: List[int]) -> Dict[int, Dict]:
+        """Get the stored score rows of candidates for a job, with the versions they were computed from"""
+        if not candidate_ids:
+            return {}
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT candidate_id, candidate_version, job_version, scorer_version,
+                   matched_skills, missing_skills, {', '.join(f'{c}_component' for c in SCORE_COMPONENTS)},
+                   embedding_model, weight_profile_version
+            FROM candidate_scores
+            WHERE job_id = ? AND candidate_id IN ({', '.join('?' for _ in candidate_ids)})
+        ''', (job_id, *candidate_ids))
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return {
+            row[0]: {
+                'candidate_version': row[1],
+                'job_version': row[2],
+                'scorer_version': row[3],
+                'matched_skills': json.loads(row[4]) if row[4] else [],
+                'missing_skills': json.loads(row[5]) if row[5] else [],
+                'components': dict(zip(SCORE_COMPONENTS, row[6:6 + len(SCORE_COMPONENTS)])),
+                'embedding_model': row[6 + len(SCORE_COMPONENTS)],
+                'weight_profile_version': row[7 + len(SCORE_COMPONENTS)]
+            }
+            for row in rows
+        }
+    
+    def restamp_scores(self, stamps: List[Tuple[int, int, int, int]]):
+        """Mark stored scores as computed from newer versions: (candidate_version, job_version, candidate_id, job_id)"""
+        if not stamps:
+            return
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            UPDATE candidate_scores SET candidate_version = ?, job_version = ?
+            WHERE candidate_id = ? AND job_id = ?
+        ''', stamps)
+        self.bump_data_version(cursor, 'scores')
+        conn.commit()
+        conn.close()
+    
+    def _record_field_changes(self, cursor, entity_type: str, entity_id: int, old: Dict, new: Dict):
+        """Log which fields an edit changed, under the version the edit produced"""
+        changed = sorted(field for field in new if old.get(field) != new[field])
+        table = 'candidates' if entity_type == 'candidate' else 'job_descriptions'
+        cursor.execute(f'SELECT version FROM {table} WHERE id = ?', (entity_id,))
+        cursor.execute('''
+            INSERT OR REPLACE INTO field_changes (entity_type, entity_id, version, fields) VALUES (?, ?, ?, ?)
+        ''', (entity_type, entity_id, cursor.fetchone()[0], json.dumps(changed)))
+    
+    def get_field_changes(self, entity_type: str, entity_ids: List[int]) -> Dict[int, Dict[int, List[str]]]:
+        """Get the logged field changes of entities: entity_id -> {version: changed fields}"""
+        if not entity_ids:
+            return {}
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT entity_id, version, fields FROM field_changes
+            WHERE entity_type = ? AND entity_id IN ({', '.join('?' for _ in entity_ids)})
+        ''', (entity_type, *entity_ids))
+        changes = {}
+        for entity_id, version, fields in cursor.fetchall():
+            changes.setdefault(entity_id, {})[version] = json.loads(fields)
+        conn.close()
+        return changes
+    
     def get_job_description(self, job_id: int) -> Optional[Dict]:
         """Get job description by ID"""
         conn = self.get_connection()
@@ -226,7 +1263,8 @@ class Database:
                 'description': row[2],
                 'requirements': row[3],
                 'skills': row[4],
-                'created_at': row[5]
+                'created_at': row[5],
+                'version': row[6]
             }
         return None
     
@@ -246,7 +1284,8 @@ class Database:
                 'description': row[2],
                 'requirements': row[3],
                 'skills': row[4],
-                'created_at': row[5]
+                'created_at': row[5],
+                'version': row[6]
             })
         return jobs
     
@@ -259,6 +1298,7 @@ class Database:
             VALUES (?, ?)
         ''', (slot_datetime, interviewer_name))
         slot_id = cursor.lastrowid
+        self.bump_data_version(cursor, 'slots')
         conn.commit()
         conn.close()
         return slot_id
@@ -307,6 +1347,7 @@ class Database:
         cursor.execute('UPDATE available_slots SET is_booked = TRUE WHERE id = ?', (slot_id,))
         
         interview_id = cursor.lastrowid
+        self.bump_data_version(cursor, 'interviews', 'slots')
         conn.commit()
         conn.close()
         return interview_id
@@ -320,6 +1361,8 @@ class Database:
             VALUES (?, ?, ?, ?)
         ''', (candidate_id, message_type, subject, content))
         message_id = cursor.lastrowid
+        index_document(cursor, 'message', message_id, (subject, content))
+        self.bump_data_version(cursor, 'messages')
         conn.commit()
         conn.close()
         return message_id
@@ -345,20 +1388,89 @@ class Database:
                 'resume_path': row[8],
                 'github_url': row[9],
                 'video_intro_path': row[10],
-                'created_at': row[11]
+                'created_at': row[11],
+                'version': row[12],
+                'duplicate_of': row[13],
+                'duplicate_similarity': row[14],
+                'talent_pool_id': row[15],
+                'talent_pool_similarity': row[16]
             }
         return None
 
+    def get_candidates_for_scoring(self, candidate_ids: Optional[List[int]] = None,
+                                   min_experience: Optional[int] = None,
+                                   max_experience: Optional[int] = None,
+                                   education_level: Optional[str] = None,
+                                   skills: Optional[List[str]] = None,
+                                   include_duplicates: bool = False) -> List[Dict]:
+        """Get the scoring fields of candidates matching explicit IDs and/or filters
+        
+        Candidates flagged as near-duplicates are left out unless
+        include_duplicates is set.
+        """
+        conditions = [] if include_duplicates else ['duplicate_of IS NULL']
+        params = []
+        if candidate_ids is not None:
+            if not candidate_ids:
+                return []
+            conditions.append(f"id IN ({', '.join('?' for _ in candidate_ids)})")
+            params.extend(candidate_ids)
+        if min_experience is not None:
+            conditions.append('experience_years >= ?')
+            params.append(min_experience)
+        if max_experience is not None:
+            conditions.append('experience_years <= ?')
+            params.append(max_experience)
+        if education_level:
+            conditions.append('LOWER(education_level) = LOWER(?)')
+            params.append(education_level)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT id, name, email, skills, experience_years, education_level, education_score, version
+            FROM candidates
+            {where}
+            ORDER BY id
+        ''', params)
+        rows = cursor.fetchall()
+        conn.close()
+        
+        required = {skill.lower() for skill in skills or []}
+        candidates = []
+        for row in rows:
+            candidate_skills = parse_skills(row[3])
+            if required and not required.issubset(skill.lower() for skill in candidate_skills):
+                continue
+            candidates.append({
+                'id': row[0],
+                'name': row[1],
+                'email': row[2],
+                'skills': candidate_skills,
+                'experience_years': row[4],
+                'education_level': row[5],
+                'education_score': row[6],
+                'version': row[7]
+            })
+        return candidates
+
     def update_candidate(self, candidate_id: int, candidate_data: Dict) -> bool:
         """Update candidate information"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
         try:
+            cursor.execute('''
+                SELECT skills, name, email, phone, experience_years, education_level, education_score, github_url
+                FROM candidates WHERE id = ?
+            ''', (candidate_id,))
+            existing = cursor.fetchone()
+            
             cursor.execute('''
                 UPDATE candidates 
                 SET name = ?, email = ?, phone = ?, skills = ?, experience_years = ?, 
-                    education_level = ?, education_score = ?, github_url = ?
+                    education_level = ?, education_score = ?, github_url = ?, version = version + 1
                 WHERE id = ?
             ''', (
                 candidate_data.get('name', ''),
@@ -371,8 +1483,30 @@ class Database:
                 candidate_data.get('github_url', ''),
                 candidate_id
             ))
-            conn.commit()
             success = cursor.rowcount > 0
+            if success:
+                self._update_skill_supply(cursor, parse_skills(existing[0]), candidate_data.get('skills', []))
+                self._record_field_changes(cursor, 'candidate', candidate_id, {
+                    'skills': parse_skills(existing[0]),
+                    'name': existing[1],
+                    'email': existing[2],
+                    'phone': existing[3],
+                    'experience_years': existing[4],
+                    'education_level': existing[5],
+                    'education_score': existing[6],
+                    'github_url': existing[7]
+                }, {
+                    'skills': parse_skills(candidate_data.get('skills', [])),
+                    'name': candidate_data.get('name', ''),
+                    'email': candidate_data.get('email', ''),
+                    'phone': candidate_data.get('phone', ''),
+                    'experience_years': candidate_data.get('experience_years', 0),
+                    'education_level': candidate_data.get('education_level', ''),
+                    'education_score': candidate_data.get('education_score', 0.0),
+                    'github_url': candidate_data.get('github_url', '')
+                })
+            self.bump_data_version(cursor, 'candidates')
+            conn.commit()
         except Exception as e:
             print(f"Error updating candidate: {e}")
             success = False
@@ -387,15 +1521,49 @@ class Database:
         cursor = conn.cursor()
         
         try:
+            cursor.execute('SELECT skills, DATE(created_at) FROM candidates WHERE id = ?', (candidate_id,))
+            existing = cursor.fetchone()
+            cursor.execute('SELECT DISTINCT job_id FROM candidate_scores WHERE candidate_id = ?', (candidate_id,))
+            scored_job_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute('SELECT id, subject, content FROM messages WHERE candidate_id = ?', (candidate_id,))
+            messages = cursor.fetchall()
+            cursor.execute('SELECT text FROM resume_texts WHERE candidate_id = ?', (candidate_id,))
+            resume_text = cursor.fetchone()
+            
             # Delete related records first
             cursor.execute('DELETE FROM candidate_scores WHERE candidate_id = ?', (candidate_id,))
             cursor.execute('DELETE FROM interview_schedules WHERE candidate_id = ?', (candidate_id,))
             cursor.execute('DELETE FROM messages WHERE candidate_id = ?', (candidate_id,))
+            cursor.execute('DELETE FROM resume_texts WHERE candidate_id = ?', (candidate_id,))
+            cursor.execute('DELETE FROM resume_minhashes WHERE candidate_id = ?', (candidate_id,))
+            for message_id, subject, content in messages:
+                unindex_document(cursor, 'message', message_id, (subject, content))
+            if resume_text:
+                unindex_document(cursor, 'resume', candidate_id, (decompress_text(resume_text[0]),))
+            cursor.execute("DELETE FROM field_changes WHERE entity_type = 'candidate' AND entity_id = ?", (candidate_id,))
+            cursor.execute('''
+                DELETE FROM embeddings WHERE entity_type IN ('candidate', 'candidate_profile') AND entity_id = ?
+            ''', (candidate_id,))
             
             # Delete candidate
             cursor.execute('DELETE FROM candidates WHERE id = ?', (candidate_id,))
-            conn.commit()
             success = cursor.rowcount > 0
+            if success:
+                self._update_skill_supply(cursor, parse_skills(existing[0]), None)
+                # The earliest remaining duplicate becomes the original of a deleted original's group
+                cursor.execute('SELECT MIN(id) FROM candidates WHERE duplicate_of = ?', (candidate_id,))
+                successor_id = cursor.fetchone()[0]
+                if successor_id is not None:
+                    cursor.execute(
+                        'UPDATE candidates SET duplicate_of = NULL, duplicate_similarity = NULL WHERE id = ?', (successor_id,)
+                    )
+                    cursor.execute('UPDATE candidates SET duplicate_of = ? WHERE duplicate_of = ?', (successor_id, candidate_id))
+                if scored_job_ids:
+                    self._rebuild_score_distribution(cursor, existing[1])
+                    for scored_job_id in scored_job_ids:
+                        self._rebuild_score_distribution(cursor, existing[1], scored_job_id)
+            self.bump_data_version(cursor, 'candidates', 'scores', 'interviews', 'messages')
+            conn.commit()
         except Exception as e:
             print(f"Error deleting candidate: {e}")
             success = False
@@ -410,9 +1578,14 @@ class Database:
         cursor = conn.cursor()
         
         try:
+            cursor.execute('''
+                SELECT DATE(created_at), title, description, requirements, skills FROM job_descriptions WHERE id = ?
+            ''', (job_id,))
+            existing = cursor.fetchone()
+            
             cursor.execute('''
                 UPDATE job_descriptions 
-                SET title = ?, description = ?, requirements = ?, skills = ?
+                SET title = ?, description = ?, requirements = ?, skills = ?, version = version + 1
                 WHERE id = ?
             ''', (
                 job_data.get('title', ''),
@@ -421,8 +1594,24 @@ class Database:
                 job_data.get('skills', ''),
                 job_id
             ))
-            conn.commit()
             success = cursor.rowcount > 0
+            if success:
+                self._rebuild_job_skill_demand(cursor, existing[0])
+                unindex_document(cursor, 'job', job_id, (existing[1], existing[2]))
+                index_document(cursor, 'job', job_id, (job_data.get('title', ''), job_data.get('description', '')))
+                self._record_field_changes(cursor, 'job', job_id, {
+                    'title': existing[1],
+                    'description': existing[2],
+                    'requirements': existing[3],
+                    'skills': parse_skills(existing[4])
+                }, {
+                    'title': job_data.get('title', ''),
+                    'description': job_data.get('description', ''),
+                    'requirements': job_data.get('requirements', ''),
+                    'skills': parse_skills(job_data.get('skills', ''))
+                })
+            self.bump_data_version(cursor, 'jobs')
+            conn.commit()
         except Exception as e:
             print(f"Error updating job description: {e}")
             success = False
@@ -437,14 +1626,34 @@ class Database:
         cursor = conn.cursor()
         
         try:
+            cursor.execute('SELECT DATE(created_at), title, description FROM job_descriptions WHERE id = ?', (job_id,))
+            existing = cursor.fetchone()
+            cursor.execute('''
+                SELECT DISTINCT DATE(c.created_at)
+                FROM candidate_scores cs
+                JOIN candidates c ON cs.candidate_id = c.id
+                WHERE cs.job_id = ?
+            ''', (job_id,))
+            scored_days = [row[0] for row in cursor.fetchall()]
+            
             # Delete related records first
             cursor.execute('DELETE FROM candidate_scores WHERE job_id = ?', (job_id,))
             cursor.execute('DELETE FROM interview_schedules WHERE job_id = ?', (job_id,))
+            cursor.execute("DELETE FROM field_changes WHERE entity_type = 'job' AND entity_id = ?", (job_id,))
+            cursor.execute('DELETE FROM job_retrieval_settings WHERE job_id = ?', (job_id,))
             
             # Delete job description
             cursor.execute('DELETE FROM job_descriptions WHERE id = ?', (job_id,))
-            conn.commit()
             success = cursor.rowcount > 0
+            if success:
+                self._rebuild_job_skill_demand(cursor, existing[0])
+                unindex_document(cursor, 'job', job_id, (existing[1], existing[2]))
+                sketch_store.delete(cursor, score_sketch_name(SCORE_QUANTILES_SKETCH, job_id))
+                sketch_store.delete(cursor, score_sketch_name(SCORE_MOMENTS_SKETCH, job_id))
+                for day in scored_days:
+                    self._rebuild_score_distribution(cursor, day)
+            self.bump_data_version(cursor, 'jobs', 'scores', 'interviews')
+            conn.commit()
         except Exception as e:
             print(f"Error deleting job description: {e}")
             success = False
@@ -0,0 +1,194 @@
+import re
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from database import db
+from config import config
+
+# h(x) = (a * x + b) mod (2^61 - 1), truncated to 32 bits; a, b < 2^31 and 32-bit x keep a * x + b inside uint64
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+# Fixed so that signatures stored by earlier runs stay comparable
+MINHASH_SEED = 1729
+SHINGLE_WORDS = 3
+# Shingles hashed per step when signing, bounding the (shingles x permutations) working array
+SHINGLE_BATCH = 4096
+# Resume texts loaded per query when signing at startup
+SIGN_BATCH = 500
+
+WORD_PATTERN = re.compile(r'\w+')
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """32-bit hashes of the distinct word 3-grams of a text (of its words, if it has fewer)"""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        shingles = set(words)
+    else:
+        shingles = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return np.array([zlib.crc32(shingle.encode('utf-8')) for shingle in shingles], dtype=np.uint64)
+
+class DuplicateDetector:
+    """Near-duplicate resume detection with MinHash signatures and an LSH band index
+    
+    A resume's signature holds, for each of num_perm random hash functions,
+    the minimum hash over the resume's word 3-grams; the fraction of
+    positions on which two signatures agree estimates the Jaccard
+    similarity of their 3-gram sets. Signatures are cut into bands of
+    num_perm / bands values, and each band is a key into that band's bucket
+    dict. Only resumes sharing a whole band with a new one are compared to
+    it: likely for near-duplicates, rare for unrelated resumes. Checking an
+    upload is one signature plus a dict lookup per band, however many
+    candidates there are.
+    
+    A candidate is flagged as a duplicate of the most similar earlier
+    candidate at or above the threshold (of that candidate's original, if
+    it is itself a duplicate). Signatures are stored in resume_minhashes
+    and the buckets are rebuilt from them at startup.
+    """
+    
+    def __init__(self, threshold: float = 0.7, num_perm: int = 128, bands: int = 32):
+        if bands < 1 or num_perm % bands:
+            raise ValueError("MinHash permutations must be a multiple of the LSH band count")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.RandomState(MINHASH_SEED)
+        self._a = rng.randint(1, 1 << 31, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=num_perm).astype(np.uint64)
+        self._lock = threading.Lock()
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+    
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature of a text, or None if it has no words"""
+        hashes = shingle_hashes(text)
+        if not len(hashes):
+            return None
+        signature = np.full(self.num_perm, MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(hashes), SHINGLE_BATCH):
+            batch = hashes[start:start + SHINGLE_BATCH, None]
+            np.minimum(signature, (((batch * self._a + self._b) % MERSENNE_PRIME) & MAX_HASH).min(axis=0), out=signature)
+        return signature.astype(np.uint32)
+    
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+    
+    def _insert(self, candidate_id: int, signature: np.ndarray):
+        self._remove(candidate_id)
+        self._signatures[candidate_id] = signature
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(key, []).append(candidate_id)
+    
+    def _remove(self, candidate_id: int):
+        signature = self._signatures.pop(candidate_id, None)
+        if signature is None:
+            return
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            members = bucket[key]
+            members.remove(candidate_id)
+            if not members:
+                del bucket[key]
+    
+    def _similar(self, signature: np.ndarray, before_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(candidate id, estimated similarity) at or above the threshold, most similar first"""
+        candidate_ids = set()
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            candidate_ids.update(bucket.get(key, ()))
+        matches = []
+        for candidate_id in candidate_ids:
+            if before_id is not None and candidate_id >= before_id:
+                continue
+            similarity = float(np.count_nonzero(self._signatures[candidate_id] == signature)) / self.num_perm
+            if similarity >= self.threshold:
+                matches.append((candidate_id, similarity))
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches
+    
+    def check_candidate(self, candidate_id: int, resume_text: str) -> Optional[Dict]:
+        """Sign and index a candidate's resume, flagging it if it nearly duplicates an earlier one
+        
+        Returns the duplicate flag ({'duplicate_of', 'matched_candidate_id',
+        'similarity'}) or None.
+        """
+        signature = self.signature(resume_text or '')
+        if signature is None:
+            return None
+        with self._lock:
+            matches = self._similar(signature, before_id=candidate_id)
+            self._insert(candidate_id, signature)
+        db.save_resume_minhash(candidate_id, signature.tobytes())
+        if not matches:
+            return None
+        
+        matched_id, similarity = matches[0]
+        similarity = round(similarity, 4)
+        try:
+            original_id = db.mark_duplicate(candidate_id, matched_id, similarity)
+        except ValueError:
+            return None  # Matched candidate deleted meanwhile
+        return {'duplicate_of': original_id, 'matched_candidate_id': matched_id, 'similarity': similarity}
+    
+    def find_similar(self, candidate_id: int) -> List[Dict]:
+        """Candidates whose resumes are at or above the threshold of similarity to a candidate's"""
+        with self._lock:
+            signature = self._signatures.get(candidate_id)
+            if signature is None:
+                return []
+            matches = self._similar(signature)
+        return [
+            {'candidate_id': other_id, 'similarity': round(similarity, 4)}
+            for other_id, similarity in matches if other_id != candidate_id
+        ]
+    
+    def remove_candidate(self, candidate_id: int):
+        """Drop a deleted candidate from the index"""
+        with self._lock:
+            self._remove(candidate_id)
+    
+    def rebuild(self) -> Dict:
+        """Reload the index from stored signatures and sign resumes that have none
+        
+        Resumes stored before detection existed are checked oldest first, so
+        the earliest copy stays the original. Resumes signed under another
+        signature length are re-signed without being re-flagged.
+        """
+        stored = {
+            candidate_id: np.frombuffer(signature, dtype=np.uint32)
+            for candidate_id, signature in db.get_resume_minhashes().items()
+        }
+        resign_ids = sorted(candidate_id for candidate_id, signature in stored.items() if len(signature) != self.num_perm)
+        with self._lock:
+            self._signatures = {}
+            self._buckets = [{} for _ in range(self.bands)]
+            for candidate_id, signature in stored.items():
+                if len(signature) == self.num_perm:
+                    self._insert(candidate_id, signature)
+        
+        for start in range(0, len(resign_ids), SIGN_BATCH):
+            texts = db.get_resume_texts(resign_ids[start:start + SIGN_BATCH])
+            for candidate_id, text in texts.items():
+                signature = self.signature(text)
+                if signature is not None:
+                    with self._lock:
+                        self._insert(candidate_id, signature)
+                    db.save_resume_minhash(candidate_id, signature.tobytes())
+        
+        unsigned_ids = db.get_unsigned_resume_ids()
+        flagged = 0
+        for start in range(0, len(unsigned_ids), SIGN_BATCH):
+            batch = unsigned_ids[start:start + SIGN_BATCH]
+            texts = db.get_resume_texts(batch)
+            for candidate_id in batch:
+                if self.check_candidate(candidate_id, texts.get(candidate_id, '')):
+                    flagged += 1
+        
+        return {'indexed': len(self._signatures), 'resigned': len(resign_ids), 'signed': len(unsigned_ids), 'flagged': flagged}
+
+# Initialize duplicate detector instance
+duplicate_detector = DuplicateDetector(
+    threshold=config.DUPLICATE_THRESHOLD,
+    num_perm=config.MINHASH_PERMUTATIONS,
+    bands=config.MINHASH_BANDS
+) 
\ No newline at end of file
@@ -0,0 +1,395 @@
+import hashlib
+import os
+import struct
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from database import db
+from embeddings import embedding_store
+from ranking import top_k_rows
+from config import config
+
+# flock serialises appends across worker processes; without it (Windows) only threads are serialised
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+MAGIC = b'HSEMBED1'
+FORMAT_VERSION = 2
+# magic, format version, vector dtype code, dimension, committed length in bytes, blake2b digest of the model name
+FILE_HEADER = struct.Struct('<8sHHIQ32s8x')
+SEGMENT_MAGIC = b'SEG1'
+# magic, row count, padding to keep the id column 8-byte aligned
+SEGMENT_HEADER = struct.Struct('<4sI8x')
+DTYPES = {'int8': (1, np.int8), 'float16': (2, np.float16)}
+DTYPE_NAMES = {code: name for name, (code, _) in DTYPES.items()}
+# Rows dequantised per step of a scan, bounding the float32 working block
+SCAN_ROWS = 16384
+# Compact when an append leaves more segments than this, or this share of rows superseded or deleted
+MAX_SEGMENTS = 64
+MAX_DEAD_RATIO = 0.3
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantized vectors and their per-vector scale factors (vector ~= quantized * scale)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == 'float16':
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+    peak = np.abs(vectors).max(axis=1) if vectors.size else np.zeros(len(vectors), dtype=np.float32)
+    scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+    return np.clip(np.round(vectors / scales[:, None]), -127, 127).astype(np.int8), scales
+
+class EmbeddingFile:
+    """Append-only, memory-mapped file of one entity type's quantized embeddings
+    
+    Layout: a 64-byte header (magic, format version, vector dtype,
+    dimension, committed length, digest of the model name), then segments. An append
+    writes one segment: a 16-byte segment header with its row count, then
+    the rows' ids (int64), versions (uint32), scale factors (float32) and
+    vectors, each a contiguous block. int8 vectors store round(v / scale)
+    with scale = max|v| / 127; float16 vectors are stored as-is with scale
+    1. The header's committed length only moves past a segment once it is
+    fully written, so readers never see a partial one, and readers remap
+    when the inode, modification time or committed length changes.
+    
+    A later row for an id supersedes earlier ones, and a row with version 0
+    deletes the id. Every process maps the file read-only with np.memmap,
+    so the vectors sit once in the OS page cache instead of once per
+    worker. Only the id and version columns are read into memory, as the
+    id map. A scan dequantises SCAN_ROWS rows at a time, and a top-k query
+    can re-score an oversampled approximate top-k with the exact float32
+    vectors from the embeddings table.
+    
+    Appends hold an flock on a side lock file. An append that leaves too
+    many segments or dead rows compacts the file: live rows are rewritten
+    as one segment and swapped in with os.replace. Readers still on the old
+    mapping finish with it and remap on their next call.
+    """
+    
+    def __init__(self, path: str, entity_type: str, dtype: str = 'int8'):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported embedding file dtype '{dtype}' (use {' or '.join(DTYPES)})")
+        self.path = path
+        self.entity_type = entity_type
+        self.dtype = dtype
+        self._lock = threading.RLock()
+        self._identity = None  # (inode, mtime_ns, committed length) of the mapped file
+        self._header = None
+        self._segments: List[Dict] = []
+        self._row_ids = np.zeros(0, dtype=np.int64)
+        self._live = np.zeros(0, dtype=bool)
+        self._index = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint32))
+    
+    @staticmethod
+    def _model_key(model_name: str) -> bytes:
+        return hashlib.blake2b(model_name.encode('utf-8'), digest_size=32).digest()
+    
+    @staticmethod
+    def _parse_header(data) -> Optional[Dict]:
+        if len(data) < FILE_HEADER.size:
+            return None
+        magic, version, dtype_code, dim, length, model = FILE_HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION or dtype_code not in DTYPE_NAMES:
+            return None
+        return {'dtype': DTYPE_NAMES[dtype_code], 'dim': dim, 'length': length, 'model': model}
+    
+    def _matches(self, header: Optional[Dict], model_name: str, dim: Optional[int] = None) -> bool:
+        return (
+            header is not None and header['dtype'] == self.dtype and header['model'] == self._model_key(model_name)
+            and (dim is None or header['dim'] == dim)
+        )
+    
+    def _refresh(self, model_name: str) -> bool:
+        """Remap the file if it changed, returning whether it holds this model's vectors"""
+        with self._lock:
+            try:
+                with open(self.path, 'rb') as handle:
+                    stat = os.fstat(handle.fileno())
+                    header = self._parse_header(handle.read(FILE_HEADER.size))
+            except FileNotFoundError:
+                self._identity, self._header, self._segments = None, None, []
+                self._row_ids, self._live = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+                self._index = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint32))
+                return False
+            # The file size moves before the committed length does, so only the length marks a finished write
+            if (stat.st_ino, stat.st_mtime_ns, header and header['length']) != self._identity:
+                self._map(stat)
+            return self._matches(self._header, model_name)
+    
+    def _map(self, stat):
+        """Map the file and rebuild the segment views and the id map, up to its committed length"""
+        mapped = np.memmap(self.path, dtype=np.uint8, mode='r')
+        header = self._parse_header(mapped)
+        segments = []
+        if header:
+            _, vector_type = DTYPES[header['dtype']]
+            vector_bytes = header['dim'] * np.dtype(vector_type).itemsize
+            offset = FILE_HEADER.size
+            while offset + SEGMENT_HEADER.size <= header['length']:
+                magic, count = SEGMENT_HEADER.unpack_from(mapped, offset)
+                if magic != SEGMENT_MAGIC:
+                    break
+                start = offset + SEGMENT_HEADER.size
+                segments.append({
+                    'ids': np.frombuffer(mapped, dtype='<i8', count=count, offset=start),
+                    'versions': np.frombuffer(mapped, dtype='<u4', count=count, offset=start + 8 * count),
+                    'scales': np.frombuffer(mapped, dtype='<f4', count=count, offset=start + 12 * count),
+                    'vectors': np.frombuffer(
+                        mapped, dtype=vector_type, count=count * header['dim'], offset=start + 16 * count
+                    ).reshape(count, header['dim'])
+                })
+                offset += -(-(SEGMENT_HEADER.size + 16 * count + count * vector_bytes) // 8) * 8
+        
+        row_ids = np.concatenate([segment['ids'] for segment in segments]) if segments else np.zeros(0, dtype=np.int64)
+        versions = np.concatenate([segment['versions'] for segment in segments]) if segments else np.zeros(0, dtype=np.uint32)
+        # Latest row of each id: its first occurrence in the reversed rows
+        ids, reversed_rows = np.unique(row_ids[::-1], return_index=True)
+        rows = len(row_ids) - 1 - reversed_rows
+        alive = versions[rows] > 0
+        live = np.zeros(len(row_ids), dtype=bool)
+        live[rows[alive]] = True
+        
+        self._identity = (stat.st_ino, stat.st_mtime_ns, header and header['length'])
+        self._header = header
+        self._segments = segments
+        self._row_ids = row_ids
+        self._live = live
+        self._index = (ids[alive], rows[alive], versions[rows[alive]])
+    
+    def generation(self, model_name: str) -> Optional[Tuple[int, int]]:
+        """(inode, mtime_ns, committed length) of the file if it holds this model's vectors; changes with every write"""
+        with self._lock:
+            return self._identity if self._refresh(model_name) else None
+    
+    def live_versions(self, model_name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids (ascending) with a live vector for the model, and the version each was stored for"""
+        with self._lock:
+            if not self._refresh(model_name):
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint32)
+            return self._index[0], self._index[2]
+    
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock for writers, held on a side file that outlives os.replace of the data file"""
+        with self._lock:
+            if not FCNTL_AVAILABLE:
+                yield
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _header_bytes(self, model_name: str, dim: int, length: int) -> bytes:
+        return FILE_HEADER.pack(MAGIC, FORMAT_VERSION, DTYPES[self.dtype][0], dim, length, self._model_key(model_name))
+    
+    @staticmethod
+    def _segment_bytes(ids: np.ndarray, versions: np.ndarray, scales: np.ndarray, vectors: np.ndarray) -> bytes:
+        body = b''.join([
+            SEGMENT_HEADER.pack(SEGMENT_MAGIC, len(ids)),
+            np.asarray(ids, dtype='<i8').tobytes(),
+            np.asarray(versions, dtype='<u4').tobytes(),
+            np.asarray(scales, dtype='<f4').tobytes(),
+            np.ascontiguousarray(vectors).tobytes()
+        ])
+        return body + b'\0' * (-len(body) % 8)
+    
+    def _write_file(self, model_name: str, dim: int, segment: bytes = b''):
+        """Atomically replace the file with a header and at most one segment"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as handle:
+            handle.write(self._header_bytes(model_name, dim, FILE_HEADER.size + len(segment)))
+            handle.write(segment)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temp_path, self.path)
+    
+    def append(self, model_name: str, ids: Sequence[int], versions: Sequence[int], vectors: np.ndarray):
+        """Append (or supersede) vectors as one segment, starting a new file if the model or format changed"""
+        if not len(ids):
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        quantized, scales = quantize(vectors, self.dtype)
+        segment = self._segment_bytes(np.asarray(ids), np.asarray(versions), scales, quantized)
+        with self._file_lock():
+            header = None
+            if os.path.exists(self.path):
+                with open(self.path, 'rb') as handle:
+                    header = self._parse_header(handle.read(FILE_HEADER.size))
+            if not self._matches(header, model_name, vectors.shape[1]):
+                self._write_file(model_name, vectors.shape[1], segment)
+            else:
+                with open(self.path, 'r+b') as handle:
+                    handle.seek(header['length'])
+                    handle.write(segment)
+                    handle.truncate()
+                    handle.flush()
+                    os.fsync(handle.fileno())
+                    handle.seek(0)
+                    handle.write(self._header_bytes(model_name, header['dim'], header['length'] + len(segment)))
+            self._refresh(model_name)
+            dead = len(self._row_ids) - len(self._index[0])
+            if len(self._segments) > MAX_SEGMENTS or dead > MAX_DEAD_RATIO * len(self._row_ids):
+                self._compact(model_name)
+    
+    def remove(self, model_name: str, ids: Sequence[int]):
+        """Delete ids by appending version-0 rows"""
+        with self._lock:
+            if not len(ids) or not self._refresh(model_name):
+                return
+            dim = self._header['dim']
+        self.append(model_name, ids, np.zeros(len(ids), dtype=np.uint32), np.zeros((len(ids), dim), dtype=np.float32))
+    
+    def _compact(self, model_name: str):
+        """Rewrite the live rows as a single segment (caller holds the file lock)"""
+        if not self._refresh(model_name):
+            return
+        ids, rows, versions = self._index
+        order = np.argsort(rows)
+        ids, rows, versions = ids[order], rows[order], versions[order]
+        scales = np.zeros(len(rows), dtype=np.float32)
+        vectors = np.zeros((len(rows), self._header['dim']), dtype=DTYPES[self.dtype][1])
+        position, offset = 0, 0
+        for segment in self._segments:
+            count = len(segment['ids'])
+            taken = rows[(rows >= offset) & (rows < offset + count)] - offset
+            scales[position:position + len(taken)] = segment['scales'][taken]
+            vectors[position:position + len(taken)] = segment['vectors'][taken]
+            position += len(taken)
+            offset += count
+        self._write_file(model_name, self._header['dim'], self._segment_bytes(ids, versions, scales, vectors))
+        self._refresh(model_name)
+    
+    def compact(self, model_name: str):
+        """Rewrite the file with only its live rows"""
+        with self._file_lock():
+            self._compact(model_name)
+    
+    def search(self, model_name: str, query: np.ndarray, k: int, rescore: bool = True,
+               oversample: int = 4) -> List[Tuple[int, float]]:
+        """Top-k (id, dot product) pairs for a query vector, best first
+        
+        Scores come from the dequantised vectors. With `rescore`, the best
+        k * oversample are re-scored with their exact float32 vectors from
+        the embeddings table before the top k are taken.
+        """
+        with self._lock:
+            if not self._refresh(model_name):
+                return []
+            segments, row_ids, live = self._segments, self._row_ids, self._live
+            live_count = len(self._index[0])
+        if not live_count or k < 1:
+            return []
+        
+        query = np.asarray(query, dtype=np.float32)
+        wanted = min(live_count, k * oversample if rescore else k)
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0, dtype=np.float32)
+        offset = 0
+        for segment in segments:
+            count = len(segment['ids'])
+            for start in range(0, count, SCAN_ROWS):
+                end = min(count, start + SCAN_ROWS)
+                mask = live[offset + start:offset + end]
+                if not mask.any():
+                    continue
+                scores = (segment['vectors'][start:end].astype(np.float32) @ query) * segment['scales'][start:end]
+                candidates = np.flatnonzero(mask)
+                taken = candidates[top_k_rows(scores[candidates], wanted)]
+                best_rows = np.concatenate([best_rows, offset + start + taken])
+                best_scores = np.concatenate([best_scores, scores[taken]])
+                if len(best_rows) > 4 * wanted:
+                    keep = top_k_rows(best_scores, wanted)
+                    best_rows, best_scores = best_rows[keep], best_scores[keep]
+            offset += count
+        keep = top_k_rows(best_scores, wanted)
+        matches = [(int(row_ids[row]), float(best_scores[position])) for row, position in zip(best_rows[keep], keep)]
+        
+        if rescore:
+            conn = db.get_connection()
+            exact = embedding_store.load_vectors(
+                conn.cursor(), self.entity_type, [entity_id for entity_id, _ in matches], model_name
+            )
+            conn.close()
+            matches = [
+                (entity_id, float(exact[entity_id] @ query) if entity_id in exact else score)
+                for entity_id, score in matches
+            ]
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches[:k]
+    
+    def stats(self, model_name: str) -> Dict:
+        """Size and layout of the file"""
+        with self._lock:
+            current = self._refresh(model_name)
+            header = self._header or {}
+            live = len(self._index[0]) if current else 0
+            return {
+                'path': self.path,
+                'current': current,
+                'dtype': header.get('dtype'),
+                'dim': header.get('dim'),
+                'segments': len(self._segments),
+                'rows': len(self._row_ids),
+                'live_vectors': live,
+                'file_bytes': header.get('length') or 0,
+                'float32_bytes': live * (header.get('dim') or 0) * 4
+            }
+
+class EmbeddingFileSet:
+    """One EmbeddingFile per embedding model for an entity type, named <entity_type>.<model digest>.emb
+    
+    Workers serving different models (mid-swap, or before they sync) each
+    keep their own file instead of resetting a shared one back and forth.
+    """
+    
+    def __init__(self, directory: str, entity_type: str, dtype: str = 'int8'):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported embedding file dtype '{dtype}' (use {' or '.join(DTYPES)})")
+        self.directory = directory
+        self.entity_type = entity_type
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        self._files: Dict[str, EmbeddingFile] = {}
+    
+    def path(self, model_name: str) -> str:
+        digest = hashlib.blake2b(model_name.encode('utf-8'), digest_size=8).hexdigest()
+        return os.path.join(self.directory, f"{self.entity_type}.{digest}.emb")
+    
+    def get(self, model_name: str) -> EmbeddingFile:
+        """The model's file"""
+        with self._lock:
+            if model_name not in self._files:
+                self._files[model_name] = EmbeddingFile(self.path(model_name), self.entity_type, self.dtype)
+            return self._files[model_name]
+    
+    def delete(self, model_name: str) -> bool:
+        """Delete a model's file, returning whether there was one"""
+        embedding_file = self.get(model_name)
+        with embedding_file._file_lock():
+            try:
+                os.remove(embedding_file.path)
+            except FileNotFoundError:
+                return False
+        with self._lock:
+            self._files.pop(model_name, None)
+        return True
+
+# Initialize candidate embedding files instance
+candidate_embedding_files = EmbeddingFileSet(config.EMBEDDING_FILE_DIR, 'candidate', dtype=config.EMBEDDING_FILE_DTYPE)
+
+if __name__ == "__main__":
+    # Layout of the serving model's candidate embedding file, optionally compacting it first:
+    #   python embedding_file.py [--compact]
+    model_name = embedding_store.model_name
+    if '--compact' in sys.argv[1:]:
+        candidate_embedding_files.get(model_name).compact(model_name)
+    for key, value in candidate_embedding_files.get(model_name).stats(model_name).items():
+        print(f"{key}: {value}") 
\ No newline at end of file
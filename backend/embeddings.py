@@ -0,0 +1,150 @@
+import hashlib
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from matcher import rag_matcher
+
+class EmbeddingStore:
+    """Sentence embeddings persisted in the embeddings table
+    
+    Vectors are L2-normalised float32, keyed by entity and model name, and
+    only re-encoded when the hash of the source text changes. Methods take
+    the caller's cursor so embeddings commit with the work that needs them.
+    
+    The store follows the matcher's model, which a model swap can change at
+    any time. Work that compares vectors from several calls uses pinned(),
+    a store that keeps the model of the moment it was pinned.
+    """
+    
+    def __init__(self, matcher=rag_matcher, active: Optional[Tuple] = None):
+        self.matcher = matcher
+        self._active = active
+    
+    @property
+    def active(self) -> Tuple:
+        """(model, model name) this store encodes and looks up with"""
+        return self._active or self.matcher.active
+    
+    @property
+    def model_name(self) -> str:
+        """Name of the embedding model this store uses"""
+        return self.active[1]
+    
+    def pinned(self) -> 'EmbeddingStore':
+        """A store fixed to the current model, for vectors that will be compared with each other"""
+        return EmbeddingStore(self.matcher, active=self.active)
+    
+    @staticmethod
+    def job_text(job_data: Dict) -> str:
+        """Text embedded for a job (the description the matcher compares resumes against)"""
+        return job_data.get('description') or ''
+    
+    @staticmethod
+    def candidate_text(resume_text: Optional[str], skills: List[str], education_level: Optional[str]) -> str:
+        """Text embedded for a candidate: the resume, or skills and education when there is none"""
+        return resume_text or f"{' '.join(skills)} {education_level or ''}".strip()
+    
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """Stable digest of the embedded text"""
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+    
+    @staticmethod
+    def _encode(model, texts: List[str]) -> np.ndarray:
+        vectors = model.encode(texts, normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts into a (len(texts), dim) matrix of unit vectors"""
+        return self._encode(self.active[0], texts)
+    
+    def _stored(self, cursor, entity_type: str, model_name: str, entity_ids) -> Dict[int, Tuple[str, bytes]]:
+        placeholders = ', '.join('?' for _ in entity_ids)
+        cursor.execute(f'''
+            SELECT entity_id, text_hash, vector FROM embeddings
+            WHERE entity_type = ? AND model_name = ? AND entity_id IN ({placeholders})
+        ''', (entity_type, model_name, *entity_ids))
+        return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+    
+    def stale_ids(self, cursor, entity_type: str, texts: Dict[int, str]) -> List[int]:
+        """Ids of the given entities that have no stored embedding of their current text"""
+        if not texts:
+            return []
+        stored = self._stored(cursor, entity_type, self.model_name, texts)
+        return [
+            entity_id for entity_id, text in texts.items()
+            if entity_id not in stored or stored[entity_id][0] != self.text_hash(text)
+        ]
+    
+    def get_many(self, cursor, entity_type: str, texts: Dict[int, str]) -> Dict[int, np.ndarray]:
+        """Return embeddings for the given entities, batch-encoding missing or stale ones"""
+        if not texts:
+            return {}
+        
+        # Read once: every vector returned comes from the same model, even if a swap lands meanwhile
+        model, model_name = self.active
+        stored = self._stored(cursor, entity_type, model_name, texts)
+        
+        vectors = {}
+        stale = []
+        for entity_id, text in texts.items():
+            digest = self.text_hash(text)
+            if entity_id in stored and stored[entity_id][0] == digest:
+                vectors[entity_id] = np.frombuffer(stored[entity_id][1], dtype=np.float32)
+            else:
+                stale.append((entity_id, digest, text))
+        
+        if stale:
+            encoded = self._encode(model, [text for _, _, text in stale])
+            for (entity_id, digest, _), vector in zip(stale, encoded):
+                self.save(cursor, entity_type, entity_id, digest, vector, model_name)
+                vectors[entity_id] = vector
+        
+        return vectors
+    
+    def save(self, cursor, entity_type: str, entity_id: int, text_hash: str, vector: np.ndarray,
+             model_name: Optional[str] = None):
+        """Insert or replace an entity's embedding for the given (by default this store's) model"""
+        vector = np.asarray(vector, dtype=np.float32)
+        cursor.execute('''
+            INSERT INTO embeddings (entity_type, entity_id, model_name, text_hash, dim, vector, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(entity_type, entity_id, model_name) DO UPDATE SET
+                text_hash = excluded.text_hash,
+                dim = excluded.dim,
+                vector = excluded.vector,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (entity_type, entity_id, model_name or self.model_name, text_hash, vector.shape[0], vector.tobytes()))
+    
+    def load_vectors(self, cursor, entity_type: str, entity_ids: List[int],
+                     model_name: Optional[str] = None) -> Dict[int, np.ndarray]:
+        """Load the stored embeddings of the given entities (those that have one) for the given model"""
+        vectors = {}
+        for start in range(0, len(entity_ids), 500):
+            chunk = entity_ids[start:start + 500]
+            cursor.execute(f'''
+                SELECT entity_id, vector FROM embeddings
+                WHERE entity_type = ? AND model_name = ? AND entity_id IN ({', '.join('?' for _ in chunk)})
+            ''', (entity_type, model_name or self.model_name, *chunk))
+            vectors.update((row[0], np.frombuffer(row[1], dtype=np.float32)) for row in cursor.fetchall())
+        return vectors
+    
+    def load_matrix(self, cursor, entity_type: str) -> Tuple[List[int], np.ndarray]:
+        """Load every stored embedding of an entity type as (ids, matrix)"""
+        cursor.execute('''
+            SELECT entity_id, vector FROM embeddings
+            WHERE entity_type = ? AND model_name = ?
+            ORDER BY entity_id
+        ''', (entity_type, self.model_name))
+        rows = cursor.fetchall()
+        if not rows:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        ids = [row[0] for row in rows]
+        matrix = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+        return ids, matrix
+    
+    def delete(self, cursor, entity_type: str, entity_id: int):
+        """Delete an entity's embeddings for all models"""
+        cursor.execute('DELETE FROM embeddings WHERE entity_type = ? AND entity_id = ?', (entity_type, entity_id))
+
+# Initialize embedding store instance
+embedding_store = EmbeddingStore() 
\ No newline at end of file
@@ -0,0 +1,174 @@
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+from database import db
+from text_index import (
+    TEXT_INDEXES, FTS5_AVAILABLE, build_match_query, query_terms, make_snippet,
+    index_document, clear_text_index, decompress_text
+)
+
+class FullTextSearch:
+    """Ranked full-text search over resume texts, job descriptions and messages
+    
+    Matching and BM25 ranking run in SQLite FTS5 tables that the write
+    paths keep current. The tables are contentless, so snippets are cut
+    from the source text of the returned page only; resume texts are only
+    decompressed for results actually shown.
+    """
+    
+    # BM25 weight per indexed column: job titles and message subjects count double
+    COLUMN_WEIGHTS = {'resume': (1.0,), 'job': (2.0, 1.0), 'message': (2.0, 1.0)}
+    
+    def search(self, query: str, doc_types: Optional[List[str]] = None, match_all: bool = True,
+               offset: int = 0, limit: int = 20, snippet_width: int = 160) -> Dict:
+        """Search the given document types (all by default), best matches first"""
+        if not FTS5_AVAILABLE:
+            raise RuntimeError("Full-text search is unavailable: SQLite was built without FTS5")
+        terms = query_terms(query)
+        if not terms:
+            raise ValueError("Search query is empty")
+        doc_types = doc_types or list(TEXT_INDEXES)
+        unknown = set(doc_types) - set(TEXT_INDEXES)
+        if unknown:
+            raise ValueError(f"Unknown document types: {sorted(unknown)}; expected {list(TEXT_INDEXES)}")
+        
+        start = time.perf_counter()
+        match = build_match_query(terms, match_all)
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        totals = {}
+        hits = []
+        for doc_type in doc_types:
+            table = TEXT_INDEXES[doc_type]['table']
+            bm25 = f"bm25({table}, {', '.join(str(w) for w in self.COLUMN_WEIGHTS[doc_type])})"
+            cursor.execute(f'SELECT COUNT(*) FROM {table} WHERE {table} MATCH ?', (match,))
+            totals[doc_type] = cursor.fetchone()[0]
+            # Every type's best offset + limit hits are enough to cut the merged page
+            cursor.execute(f'''
+                SELECT rowid, {bm25} FROM {table} WHERE {table} MATCH ? ORDER BY {bm25} LIMIT ?
+            ''', (match, offset + limit))
+            hits.extend((score, doc_type, rowid) for rowid, score in cursor.fetchall())
+        conn.close()
+        
+        hits.sort()  # BM25 is lower for better matches
+        page = hits[offset:offset + limit]
+        return {
+            'query': query,
+            'match': match,
+            'total': sum(totals.values()),
+            'totals': totals,
+            'offset': offset,
+            'limit': limit,
+            'results': self._describe(page, terms, snippet_width),
+            'query_ms': round((time.perf_counter() - start) * 1000, 2)
+        }
+    
+    def _describe(self, page: List[Tuple[float, str, int]], terms: List[str], snippet_width: int) -> List[Dict]:
+        """Titles and snippets of a page of hits, reading only those documents"""
+        ids = {doc_type: [doc_id for _, hit_type, doc_id in page if hit_type == doc_type] for doc_type in TEXT_INDEXES}
+        documents = {}
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        if ids['resume']:
+            cursor.execute(f'''
+                SELECT c.id, c.name, r.text FROM candidates c JOIN resume_texts r ON r.candidate_id = c.id
+                WHERE c.id IN ({', '.join('?' for _ in ids['resume'])})
+            ''', ids['resume'])
+            for candidate_id, name, text in cursor.fetchall():
+                documents[('resume', candidate_id)] = {
+                    'candidate_id': candidate_id, 'title': name, 'text': decompress_text(text)
+                }
+        if ids['job']:
+            cursor.execute(f'''
+                SELECT id, title, description FROM job_descriptions WHERE id IN ({', '.join('?' for _ in ids['job'])})
+            ''', ids['job'])
+            for job_id, title, description in cursor.fetchall():
+                documents[('job', job_id)] = {'job_id': job_id, 'title': title, 'text': description}
+        if ids['message']:
+            cursor.execute(f'''
+                SELECT id, candidate_id, message_type, subject, content, sent_at FROM messages
+                WHERE id IN ({', '.join('?' for _ in ids['message'])})
+            ''', ids['message'])
+            for message_id, candidate_id, message_type, subject, content, sent_at in cursor.fetchall():
+                documents[('message', message_id)] = {
+                    'candidate_id': candidate_id, 'message_type': message_type,
+                    'sent_at': sent_at, 'title': subject, 'text': content
+                }
+        conn.close()
+        
+        results = []
+        for score, doc_type, doc_id in page:
+            document = documents.get((doc_type, doc_id))
+            if document is None:
+                continue  # Deleted after the match query ran
+            text = document.pop('text')
+            results.append({
+                'type': doc_type,
+                'id': doc_id,
+                'score': round(-score, 4),
+                **document,
+                'snippet': make_snippet(text, terms, snippet_width)
+            })
+        return results
+    
+    def backfill(self, extract_resumes: bool = True) -> Dict:
+        """Rebuild every full-text index from the source tables
+        
+        With `extract_resumes`, candidates uploaded before resume texts were
+        stored get their text extracted once from the uploaded file.
+        """
+        if not FTS5_AVAILABLE:
+            raise RuntimeError("Full-text search is unavailable: SQLite was built without FTS5")
+        stats = {'resumes_extracted': 0, 'resumes_unreadable': 0}
+        if extract_resumes:
+            from resume_parser import resume_parser  # PDF extraction is only needed here
+            
+            conn = db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT c.id, c.resume_path FROM candidates c
+                LEFT JOIN resume_texts r ON r.candidate_id = c.id
+                WHERE r.candidate_id IS NULL AND c.resume_path IS NOT NULL AND c.resume_path != ''
+            ''')
+            missing = cursor.fetchall()
+            conn.close()
+            for candidate_id, resume_path in missing:
+                try:
+                    text = resume_parser.extract_text(resume_path)
+                except (OSError, ValueError) as e:
+                    print(f"Could not extract resume text of candidate {candidate_id}: {e}")
+                    text = ''
+                if text.strip():
+                    db.save_resume_text(candidate_id, text)
+                    stats['resumes_extracted'] += 1
+                else:
+                    stats['resumes_unreadable'] += 1
+        
+        sources = {
+            'resume': 'SELECT candidate_id, text FROM resume_texts',
+            'job': 'SELECT id, title, description FROM job_descriptions',
+            'message': 'SELECT id, subject, content FROM messages'
+        }
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        for doc_type, source in sources.items():
+            clear_text_index(cursor, doc_type)
+            rows = conn.execute(source).fetchall()
+            for doc_id, *values in rows:
+                if doc_type == 'resume':
+                    values = [decompress_text(values[0])]
+                index_document(cursor, doc_type, doc_id, values)
+            stats[f'{doc_type}s_indexed'] = len(rows)
+        conn.commit()
+        conn.close()
+        return stats
+
+# Initialize full-text search instance
+full_text_search = FullTextSearch()
+
+if __name__ == "__main__":
+    # One-off backfill for rows written before full-text indexing existed:
+    #   python full_text_search.py [--skip-resume-files]
+    stats = full_text_search.backfill(extract_resumes='--skip-resume-files' not in sys.argv[1:])
+    for key, value in stats.items():
+        print(f"{key}: {value}") 
\ No newline at end of file
@@ -0,0 +1,297 @@
+import re
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from database import db, parse_skills
+from embeddings import embedding_store
+from matcher import rag_matcher
+from text_index import FTS5_AVAILABLE, build_match_query
+from embedding_file import candidate_embedding_files
+from config import config
+
+SETTING_NAMES = ('lexical_weight', 'semantic_weight', 'rrf_k', 'depth')
+
+# Words too common in job descriptions to say anything about a resume
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'have', 'in', 'is', 'it', 'of',
+    'on', 'or', 'our', 'that', 'the', 'this', 'to', 'we', 'will', 'with', 'you', 'your',
+    'experience', 'looking', 'required', 'requirements', 'skills', 'strong', 'team', 'work', 'years'
+}
+WORD_PATTERN = re.compile(r'[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|[a-z0-9]')
+# Re-encoded candidate vectors buffered per append to the embedding file
+FILE_APPEND_ROWS = 50000
+
+class HybridRetriever:
+    """Job-to-candidate retrieval fusing a BM25 ranking with an embedding ranking
+    
+    The lexical ranking runs the job's title, skills and description words
+    as an OR query against the resume full-text index, so it sees the whole
+    resume rather than just the parsed skills. The semantic ranking is the
+    cosine similarity of the stored job embedding with stored embeddings of
+    each candidate's resume text (parsed skills and education for candidates
+    without one). Each contributes its best `depth` candidates, fused by
+    reciprocal rank: score = sum(weight / (rrf_k + rank)).
+    
+    Candidate embeddings persist in the embeddings table and, quantized, in
+    the memory-mapped candidate embedding file shared by every worker. The
+    file is brought up to date for candidates whose version changed, so a
+    query is one FTS query plus one scan of the file, with the best matches
+    re-scored from their exact vectors.
+    """
+    
+    def __init__(self, rrf_k: int = 60, depth: int = 200, lexical_weight: float = 1.0,
+                 semantic_weight: float = 1.0, max_query_terms: int = 64):
+        self.defaults = {
+            'lexical_weight': lexical_weight,
+            'semantic_weight': semantic_weight,
+            'rrf_k': rrf_k,
+            'depth': depth
+        }
+        self.max_query_terms = max_query_terms
+        self._file_state = None  # ('candidates' data version, file generation) the file was last synced at
+        self._lock = threading.Lock()
+    
+    def settings(self, job_id: int, overrides: Optional[Dict] = None) -> Dict:
+        """Effective settings of a job: defaults, then the job's stored overrides, then per-call ones"""
+        settings = {**self.defaults, **db.get_job_retrieval_settings(job_id)}
+        settings.update({name: value for name, value in (overrides or {}).items() if value is not None})
+        self.validate(settings)
+        return settings
+    
+    @staticmethod
+    def validate(settings: Dict):
+        """Reject settings the fusion cannot use"""
+        unknown = set(settings) - set(SETTING_NAMES)
+        if unknown:
+            raise ValueError(f"Unknown hybrid retrieval settings: {sorted(unknown)}")
+        if settings.get('lexical_weight', 0) < 0 or settings.get('semantic_weight', 0) < 0:
+            raise ValueError("Ranking weights must not be negative")
+        if settings.get('lexical_weight') == 0 and settings.get('semantic_weight') == 0:
+            raise ValueError("At least one ranking weight must be positive")
+        if settings.get('rrf_k', 0) < 0:
+            raise ValueError("rrf_k must not be negative")
+        if settings.get('depth', 1) < 1:
+            raise ValueError("depth must be at least 1")
+    
+    def query_terms(self, job_data: Dict) -> List[str]:
+        """BM25 query terms of a job: its skills, then title and description words, most specific first"""
+        terms = []
+        seen = set()
+        words = WORD_PATTERN.findall(f"{job_data.get('title') or ''} {job_data.get('description') or ''}".lower())
+        for term in [skill.lower().strip() for skill in parse_skills(job_data.get('skills'))] + words:
+            if term and term not in seen and term not in STOP_WORDS and not term.isdigit():
+                seen.add(term)
+                terms.append(term)
+        return terms[:self.max_query_terms]
+    
+    def lexical_ranking(self, job_data: Dict, depth: int) -> List[Tuple[int, float]]:
+        """Best (candidate id, BM25 score) pairs of resume texts for a job, leaving out flagged duplicates"""
+        terms = self.query_terms(job_data)
+        if not FTS5_AVAILABLE or not terms:
+            return []
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT rowid, bm25(resume_fts) FROM resume_fts
+            WHERE resume_fts MATCH ? AND rowid NOT IN (SELECT id FROM candidates WHERE duplicate_of IS NOT NULL)
+            ORDER BY bm25(resume_fts), rowid LIMIT ?
+        ''', (build_match_query(terms, match_all=False), depth))
+        ranking = [(candidate_id, -score) for candidate_id, score in cursor.fetchall()]
+        conn.close()
+        return ranking
+    
+    def refresh_candidate_file(self, store=None) -> int:
+        """Bring the candidate embedding file up to date for the store's model, encoding only new or edited candidates
+        
+        Returns how many candidate texts had to be looked up (their vectors
+        are re-encoded only if the embedded text changed). Each model has its
+        own file. Flagged duplicates are kept out of (and removed from) the
+        file, like the other rankings leave them out.
+        """
+        store = store or embedding_store.pinned()
+        with self._lock:
+            model_name = store.model_name
+            candidate_embedding_file = candidate_embedding_files.get(model_name)
+            state = (model_name, db.get_data_version('candidates'), candidate_embedding_file.generation(model_name))
+            if state == self._file_state:
+                return 0
+            
+            conn = db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, version FROM candidates WHERE duplicate_of IS NULL ORDER BY id')
+            current = dict(cursor.fetchall())
+            stored_ids, stored_versions = candidate_embedding_file.live_versions(model_name)
+            stored = dict(zip(stored_ids.tolist(), stored_versions.tolist()))
+            stale = [candidate_id for candidate_id, version in current.items() if stored.get(candidate_id) != version]
+            removed = [candidate_id for candidate_id in stored if candidate_id not in current]
+            
+            buffered = {}
+            for start in range(0, len(stale), 500):
+                chunk = stale[start:start + 500]
+                resume_texts = db.get_resume_texts(chunk)
+                cursor.execute(f'''
+                    SELECT id, skills, education_level FROM candidates
+                    WHERE id IN ({', '.join('?' for _ in chunk)})
+                ''', chunk)
+                texts = {
+                    candidate_id: store.candidate_text(resume_texts.get(candidate_id), parse_skills(skills), education_level)
+                    for candidate_id, skills, education_level in cursor.fetchall()
+                }
+                buffered.update(store.get_many(cursor, 'candidate', texts))
+                conn.commit()
+                if buffered and (len(buffered) >= FILE_APPEND_ROWS or start + 500 >= len(stale)):
+                    ids = sorted(buffered)
+                    candidate_embedding_file.append(
+                        model_name, ids, [current[candidate_id] for candidate_id in ids],
+                        np.vstack([buffered[candidate_id] for candidate_id in ids])
+                    )
+                    buffered = {}
+            conn.close()
+            candidate_embedding_file.remove(model_name, removed)
+            
+            self._file_state = (model_name, state[1], candidate_embedding_file.generation(model_name))
+            return len(stale)
+    
+    def semantic_ranking(self, job_data: Dict, depth: int) -> Tuple[List[Tuple[int, float]], int]:
+        """Best (candidate id, cosine similarity 0-100) pairs for a job, and how many candidates were refreshed"""
+        store = embedding_store.pinned()
+        refreshed = self.refresh_candidate_file(store)
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        job_vector = store.get_many(cursor, 'job', {job_data['id']: store.job_text(job_data)})[job_data['id']]
+        conn.commit()
+        conn.close()
+        
+        matches = candidate_embedding_files.get(store.model_name).search(
+            store.model_name, job_vector, depth,
+            rescore=config.EMBEDDING_RESCORE, oversample=config.EMBEDDING_RESCORE_OVERSAMPLE
+        )
+        return [(candidate_id, round(similarity * 100, 2)) for candidate_id, similarity in matches], refreshed
+    
+    def rank(self, job_data: Dict, top_k: int = 20, overrides: Optional[Dict] = None, evaluate: bool = False) -> Dict:
+        """Top-k candidates of a job by reciprocal-rank fusion of the BM25 and embedding rankings
+        
+        With `evaluate`, the current matcher also ranks the whole pool and
+        the overlap of both top-k lists is reported.
+        """
+        if top_k < 1:
+            raise ValueError("top_k must be at least 1")
+        settings = self.settings(job_data['id'], overrides)
+        depth = max(settings['depth'], top_k)
+        
+        start = time.perf_counter()
+        lexical = self.lexical_ranking(job_data, depth) if settings['lexical_weight'] > 0 else []
+        lexical_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        semantic, refreshed = self.semantic_ranking(job_data, depth) if settings['semantic_weight'] > 0 else ([], 0)
+        semantic_ms = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        fused = {}
+        for weight, ranking, rank_key, score_key in (
+            (settings['lexical_weight'], lexical, 'lexical_rank', 'bm25_score'),
+            (settings['semantic_weight'], semantic, 'semantic_rank', 'semantic_similarity')
+        ):
+            for rank, (candidate_id, score) in enumerate(ranking, start=1):
+                entry = fused.setdefault(candidate_id, {
+                    'rrf_score': 0.0, 'lexical_rank': None, 'bm25_score': None,
+                    'semantic_rank': None, 'semantic_similarity': None
+                })
+                entry['rrf_score'] += weight / (settings['rrf_k'] + rank)
+                entry[rank_key] = rank
+                entry[score_key] = round(score, 4)
+        ranked = sorted(fused.items(), key=lambda item: (-item[1]['rrf_score'], item[0]))[:top_k]
+        
+        # Only the returned candidates are read from the database
+        page = {candidate['id']: candidate for candidate in db.get_candidates_for_scoring([candidate_id for candidate_id, _ in ranked])}
+        results = []
+        for candidate_id, entry in ranked:
+            candidate = page.get(candidate_id)
+            if candidate:  # Deleted or flagged since the rankings were read
+                results.append({
+                    'rank': len(results) + 1,
+                    'candidate_id': candidate_id,
+                    'name': candidate.get('name'),
+                    'email': candidate.get('email'),
+                    **entry,
+                    'rrf_score': round(entry['rrf_score'], 6)
+                })
+        fuse_ms = (time.perf_counter() - start) * 1000
+        
+        report = {
+            'job_id': job_data['id'],
+            'top_k': top_k,
+            'settings': settings,
+            'lexical_candidates': len(lexical),
+            'semantic_candidates': len(semantic),
+            'fused_candidates': len(fused),
+            'refreshed_embeddings': refreshed,
+            'results': results,
+            'timings_ms': {
+                'lexical': round(lexical_ms, 2),
+                'semantic': round(semantic_ms, 2),
+                'fusion': round(fuse_ms, 2),
+                'total': round(lexical_ms + semantic_ms + fuse_ms, 2)
+            }
+        }
+        if evaluate:
+            report['evaluation'] = self._evaluate(job_data, results, set(fused), top_k)
+        return report
+    
+    def _evaluate(self, job_data: Dict, results: List[Dict], fused_ids: set, top_k: int) -> Dict:
+        """Overlap of the hybrid top-k with the current matcher's top-k over the whole pool"""
+        start = time.perf_counter()
+        reference = rag_matcher.rank_candidates(db.get_candidates_for_scoring(), job_data, top_k=top_k)
+        reference_ms = (time.perf_counter() - start) * 1000
+        
+        expected = [candidate['id'] for candidate in reference]
+        found = {item['candidate_id'] for item in results}
+        return {
+            'overlap_at_k': round(len(found.intersection(expected)) / len(expected), 4) if expected else 1.0,
+            # Reference candidates neither ranking surfaced: raising depth cannot help below this
+            'reference_in_fused': round(len(fused_ids.intersection(expected)) / len(expected), 4) if expected else 1.0,
+            'missed_candidate_ids': [candidate_id for candidate_id in expected if candidate_id not in found],
+            'reference_ms': round(reference_ms, 2)
+        }
+    
+    def benchmark(self, top_k: int = 20, job_ids: Optional[List[int]] = None) -> Dict:
+        """Evaluate the hybrid ranking against the current matcher on every (or the given) job"""
+        job_ids = job_ids or [job['id'] for job in db.get_all_job_descriptions()]
+        reports = []
+        for job_id in job_ids:
+            job_data = db.get_job_description(job_id)
+            if job_data:
+                reports.append(self.rank(job_data, top_k=top_k, evaluate=True))
+        if not reports:
+            return {'jobs': 0}
+        
+        hybrid_ms = np.array([report['timings_ms']['total'] for report in reports])
+        reference_ms = np.array([report['evaluation']['reference_ms'] for report in reports])
+        return {
+            'jobs': len(reports),
+            'top_k': top_k,
+            'mean_overlap_at_k': round(float(np.mean([r['evaluation']['overlap_at_k'] for r in reports])), 4),
+            'mean_reference_in_fused': round(float(np.mean([r['evaluation']['reference_in_fused'] for r in reports])), 4),
+            # The first query also embeds every candidate, so its latency is reported apart
+            'first_query_ms': float(hybrid_ms[0]),
+            'hybrid_ms': {'p50': round(float(np.percentile(hybrid_ms, 50)), 2), 'p95': round(float(np.percentile(hybrid_ms, 95)), 2)},
+            'reference_ms': {'p50': round(float(np.percentile(reference_ms, 50)), 2), 'p95': round(float(np.percentile(reference_ms, 95)), 2)}
+        }
+
+# Initialize hybrid retriever instance
+hybrid_retriever = HybridRetriever(
+    rrf_k=config.HYBRID_RRF_K,
+    depth=config.HYBRID_DEPTH,
+    lexical_weight=config.HYBRID_LEXICAL_WEIGHT,
+    semantic_weight=config.HYBRID_SEMANTIC_WEIGHT,
+    max_query_terms=config.HYBRID_MAX_QUERY_TERMS
+)
+
+if __name__ == "__main__":
+    # Latency and top-k overlap against the current matcher on every job:
+    #   python hybrid_retrieval.py [top_k]
+    summary = hybrid_retriever.benchmark(top_k=int(sys.argv[1]) if len(sys.argv) > 1 else 20)
+    for key, value in summary.items():
+        print(f"{key}: {value}") 
\ No newline at end of file
@@ -0,0 +1,170 @@
+import threading
+import time
+from typing import Dict
+import numpy as np
+from database import db, parse_skills
+from embeddings import embedding_store
+from matcher import rag_matcher
+from pair_features import PairFeatureCache, SKILL_SIMILARITY_THRESHOLD, normalize_skill
+
+# Approximate scores within this of the k-th are rescored exactly, covering float and rounding noise
+RESCORE_MARGIN = 0.05
+
+class JobMatchIndex:
+    """Job-side index for ranking every job against one candidate (reverse matching)
+    
+    Holds, for all jobs, the stored description embeddings as one matrix,
+    the vocabulary of job skills with their vectors, and the job/skill
+    incidence as flat (job row, skill) occurrence arrays. A candidate's
+    RAG match score against every job then takes one encode of the
+    candidate's texts and a few array operations:
+      - resume/description similarity: description matrix @ candidate vector
+      - skill matches: which vocabulary skills the candidate matches (exactly
+        or above the similarity threshold), counted per job with bincount
+      - experience/education: once per distinct job requirement
+    Jobs within RESCORE_MARGIN of the k-th are then rescored through
+    compute_overall_match with a PairFeatureCache seeded with the index
+    vectors, so the returned scores are those forward ranking computes.
+    The index reloads when the 'jobs' data version or the embedding model
+    changes, and rescoring encodes with the model the index was loaded with.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data_version = None
+        self._skill_vectors = {}  # Raw skill text -> vector, kept across reloads with the same model
+        self._skill_model = None
+        self._state = None
+    
+    def refresh(self):
+        """Reload the job arrays if any job was created, edited or deleted, or the model swapped, since the last load"""
+        with self._lock:
+            data_version = db.get_data_version('jobs')
+            store = embedding_store.pinned()
+            if self._state is not None and data_version == self._data_version and self._state['model_name'] == store.model_name:
+                return
+            if store.model_name != self._skill_model:
+                self._skill_vectors, self._skill_model = {}, store.model_name
+            
+            conn = db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, title, description, skills, version FROM job_descriptions ORDER BY id')
+            jobs = [
+                {'id': row[0], 'title': row[1], 'description': row[2], 'skills': row[3], 'version': row[4]}
+                for row in cursor.fetchall()
+            ]
+            vectors = store.get_many(cursor, 'job', {job['id']: store.job_text(job) for job in jobs})
+            conn.commit()
+            conn.close()
+            
+            job_skills = [parse_skills(job['skills']) for job in jobs]
+            vocabulary = list(dict.fromkeys(skill for skills in job_skills for skill in skills))
+            missing = [skill for skill in vocabulary if skill not in self._skill_vectors]
+            if missing:
+                self._skill_vectors.update(zip(missing, store.encode(missing)))
+            positions = {skill: i for i, skill in enumerate(vocabulary)}
+            
+            requirements = {}
+            for row, job in enumerate(jobs):
+                requirements.setdefault((job.get('experience_years'), job.get('education_requirement')), []).append(row)
+            
+            self._state = {
+                'model_name': store.model_name,
+                'encode': store.encode,
+                'jobs': jobs,
+                'descriptions': [embedding_store.job_text(job) for job in jobs],
+                'description_matrix': np.vstack([vectors[job['id']] for job in jobs]) if jobs else None,
+                'vocabulary': vocabulary,
+                'normalized_vocabulary': [normalize_skill(skill) for skill in vocabulary],
+                'vocabulary_matrix': np.vstack([self._skill_vectors[skill] for skill in vocabulary]) if vocabulary else None,
+                'occurrence_rows': np.array([row for row, skills in enumerate(job_skills) for _ in skills], dtype=np.int64),
+                'occurrence_skills': np.array([positions[skill] for skills in job_skills for skill in skills], dtype=np.int64),
+                'skill_counts': np.array([len(skills) for skills in job_skills], dtype=np.float64),
+                'requirements': {key: np.array(rows) for key, rows in requirements.items()}
+            }
+            self._data_version = data_version
+    
+    def _approximate_scores(self, state: Dict, candidate: Dict, cache: PairFeatureCache) -> np.ndarray:
+        """Match score of the candidate against every job, computed column-wise"""
+        jobs = state['jobs']
+        probe = cache.get({**candidate, 'id': None}, {})
+        cache.vectors.warm(probe.candidate_skills + [probe.candidate_text])
+        
+        semantic = state['description_matrix'] @ cache.vectors.get([probe.candidate_text])[0] * 100
+        
+        matched = np.zeros(len(jobs))
+        if probe.candidate_skills and state['vocabulary']:
+            similar = (state['vocabulary_matrix'] @ cache.vectors.get(probe.candidate_skills).T) * 100 > SKILL_SIMILARITY_THRESHOLD
+            exact = np.array([skill in probe.candidate_skill_set for skill in state['normalized_vocabulary']])
+            matched_vocabulary = exact | similar.any(axis=1)
+            hits = state['occurrence_rows'][matched_vocabulary[state['occurrence_skills']]]
+            matched = np.bincount(hits, minlength=len(jobs)).astype(np.float64)
+        skills = np.divide(matched, state['skill_counts'], out=np.zeros(len(jobs)), where=state['skill_counts'] > 0) * 100
+        
+        experience = np.zeros(len(jobs))
+        education = np.zeros(len(jobs))
+        for (experience_years, education_requirement), rows in state['requirements'].items():
+            features = cache.get(
+                {**candidate, 'id': None},
+                {'experience_years': experience_years, 'education_requirement': education_requirement}
+            )
+            experience[rows] = rag_matcher.compute_experience_match(features)['experience_score']
+            education[rows] = rag_matcher.compute_education_match(features)['education_score']
+        
+        return skills * 0.4 + experience * 0.3 + education * 0.1 + semantic * 0.2
+    
+    def matching_jobs(self, candidate: Dict, top_k: int = 10) -> Dict:
+        """Top-k jobs for a candidate by RAG match score, with the score components"""
+        if top_k < 1:
+            raise ValueError("top_k must be at least 1")
+        start = time.perf_counter()
+        self.refresh()
+        state = self._state
+        jobs = state['jobs']
+        if not jobs:
+            return {'candidate_id': candidate['id'], 'total_jobs': 0, 'rescored_jobs': 0, 'results': [],
+                    'query_ms': round((time.perf_counter() - start) * 1000, 2)}
+        
+        # Index vectors seed the cache, so rescoring encodes nothing new
+        cache = PairFeatureCache(state['encode'])
+        cache.vectors.add(state['descriptions'], state['description_matrix'])
+        if state['vocabulary']:
+            cache.vectors.add(state['vocabulary'], state['vocabulary_matrix'])
+        
+        scores = self._approximate_scores(state, candidate, cache)
+        threshold = np.partition(scores, len(scores) - top_k)[len(scores) - top_k] if top_k < len(scores) else -np.inf
+        rows = np.flatnonzero(scores >= threshold - RESCORE_MARGIN)
+        
+        rescored = []
+        for row in rows:
+            job = jobs[row]
+            match_result = rag_matcher.compute_overall_match(candidate, job, cache.get(candidate, job))
+            rescored.append((match_result['final_score'], job, match_result))
+        rescored.sort(key=lambda item: (-item[0], item[1]['id']))
+        
+        results = []
+        for rank, (final_score, job, match_result) in enumerate(rescored[:top_k], start=1):
+            results.append({
+                'rank': rank,
+                'job_id': job['id'],
+                'title': job['title'],
+                'match_score': final_score,
+                'skills_match': {
+                    'match_score': match_result['skills_match']['match_score'],
+                    'matched_skills': match_result['skills_match']['matched_skills'],
+                    'missing_skills': match_result['skills_match']['missing_skills']
+                },
+                'experience_match': match_result['experience_match'],
+                'education_match': match_result['education_match'],
+                'semantic_similarity': match_result['semantic_similarity']
+            })
+        return {
+            'candidate_id': candidate['id'],
+            'total_jobs': len(jobs),
+            'rescored_jobs': len(rows),
+            'results': results,
+            'query_ms': round((time.perf_counter() - start) * 1000, 2)
+        }
+
+# Initialize job match index instance
+job_match_index = JobMatchIndex() 
\ No newline at end of file
@@ -0,0 +1,197 @@
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from database import db, parse_skills
+from embeddings import embedding_store
+from config import config
+
+class JobSimilarityIndex:
+    """Job-to-job similarity graph stored in the job_similarity table
+    
+    Similarity blends cosine similarity of the stored job embeddings with
+    Jaccard overlap of the job skill sets. Each job keeps its top-N
+    neighbours above a minimum score, so "similar jobs" lookups become an
+    indexed `job_id IN (...)` instead of a title LIKE scan.
+    """
+    
+    def __init__(self, top_n: int = 10, min_similarity: float = 0.35, embedding_weight: float = 0.7):
+        self.top_n = top_n
+        self.min_similarity = min_similarity
+        self.embedding_weight = embedding_weight
+    
+    def _load_jobs(self, cursor) -> Tuple[List[int], np.ndarray, np.ndarray]:
+        """Load job ids, embedding matrix and binary skill matrix for all jobs"""
+        cursor.execute('SELECT id, description, skills FROM job_descriptions ORDER BY id')
+        rows = cursor.fetchall()
+        ids = [row[0] for row in rows]
+        vectors = embedding_store.get_many(
+            cursor, 'job', {row[0]: embedding_store.job_text({'description': row[1]}) for row in rows}
+        )
+        embeddings = np.vstack([vectors[job_id] for job_id in ids]) if ids else np.zeros((0, 0), dtype=np.float32)
+        
+        skill_sets = [{skill.lower() for skill in parse_skills(row[2])} for row in rows]
+        vocabulary = {skill: i for i, skill in enumerate(sorted(set().union(*skill_sets)))}
+        skill_matrix = np.zeros((len(ids), len(vocabulary)), dtype=np.float32)
+        for i, skills in enumerate(skill_sets):
+            skill_matrix[i, [vocabulary[skill] for skill in skills]] = 1.0
+        
+        return ids, embeddings, skill_matrix
+    
+    def _similarity_rows(self, rows: np.ndarray, embeddings: np.ndarray, skill_matrix: np.ndarray) -> np.ndarray:
+        """Blended similarity of the given job rows against every job"""
+        cosine = embeddings[rows] @ embeddings.T
+        
+        intersection = skill_matrix[rows] @ skill_matrix.T
+        sizes = skill_matrix.sum(axis=1)
+        union = sizes[rows][:, None] + sizes[None, :] - intersection
+        jaccard = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+        
+        similarity = self.embedding_weight * cosine + (1 - self.embedding_weight) * jaccard
+        similarity[np.arange(len(rows)), rows] = -np.inf  # A job is not its own neighbour
+        return similarity
+    
+    def _top_neighbors(self, similarity: np.ndarray, ids: List[int]) -> List[Tuple[int, float]]:
+        """Top-N (job_id, score) pairs above the minimum similarity, best first"""
+        candidates = np.flatnonzero(similarity >= self.min_similarity)
+        if len(candidates) > self.top_n:
+            candidates = candidates[np.argpartition(-similarity[candidates], self.top_n - 1)[:self.top_n]]
+        candidates = candidates[np.argsort(-similarity[candidates], kind='stable')]
+        return [(ids[i], round(float(similarity[i]), 4)) for i in candidates]
+    
+    def _write_neighbors(self, cursor, job_id: int, neighbors: List[Tuple[int, float]]):
+        """Replace a job's neighbour list"""
+        cursor.execute('DELETE FROM job_similarity WHERE job_id = ?', (job_id,))
+        cursor.executemany(
+            'INSERT INTO job_similarity (job_id, similar_job_id, similarity) VALUES (?, ?, ?)',
+            [(job_id, similar_id, score) for similar_id, score in neighbors]
+        )
+    
+    def _linked_jobs(self, cursor, job_id: int) -> Set[int]:
+        """Jobs whose neighbour list currently contains the given job"""
+        cursor.execute('SELECT job_id FROM job_similarity WHERE similar_job_id = ?', (job_id,))
+        return {row[0] for row in cursor.fetchall()}
+    
+    def _recompute_rows(self, cursor, job_ids: Set[int], ids: List[int], embeddings: np.ndarray, skill_matrix: np.ndarray):
+        """Fully recompute the neighbour lists of the given jobs"""
+        positions = {job_id: i for i, job_id in enumerate(ids)}
+        rows = np.array([positions[job_id] for job_id in job_ids if job_id in positions], dtype=int)
+        if len(rows) == 0:
+            return
+        similarity = self._similarity_rows(rows, embeddings, skill_matrix)
+        for row, scores in zip(rows, similarity):
+            self._write_neighbors(cursor, ids[row], self._top_neighbors(scores, ids))
+    
+    def update_job(self, job_id: int):
+        """Refresh the graph after a job is created or edited"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            ids, embeddings, skill_matrix = self._load_jobs(cursor)
+            if job_id not in ids:
+                return
+            row = ids.index(job_id)
+            similarity = self._similarity_rows(np.array([row]), embeddings, skill_matrix)[0]
+            self._write_neighbors(cursor, job_id, self._top_neighbors(similarity, ids))
+            
+            # Similarity is symmetric: jobs that listed this one re-rank from scratch,
+            # any other job only needs to admit it if it now beats its N-th neighbour
+            linked = self._linked_jobs(cursor, job_id)
+            self._recompute_rows(cursor, linked, ids, embeddings, skill_matrix)
+            for other, other_id in enumerate(ids):
+                if other_id == job_id or other_id in linked or similarity[other] < self.min_similarity:
+                    continue
+                cursor.execute('''
+                    INSERT INTO job_similarity (job_id, similar_job_id, similarity) VALUES (?, ?, ?)
+                ''', (other_id, job_id, round(float(similarity[other]), 4)))
+                cursor.execute('''
+                    DELETE FROM job_similarity
+                    WHERE job_id = ? AND similar_job_id NOT IN (
+                        SELECT similar_job_id FROM job_similarity
+                        WHERE job_id = ?
+                        ORDER BY similarity DESC, similar_job_id
+                        LIMIT ?
+                    )
+                ''', (other_id, other_id, self.top_n))
+            
+            db.bump_data_version(cursor, 'job_similarity')
+            conn.commit()
+        except Exception as e:
+            print(f"Error updating job similarity for job {job_id}: {e}")
+        finally:
+            conn.close()
+    
+    def remove_job(self, job_id: int):
+        """Drop a deleted job from the graph and refill the lists it appeared in"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            linked = self._linked_jobs(cursor, job_id)
+            cursor.execute('DELETE FROM job_similarity WHERE job_id = ? OR similar_job_id = ?', (job_id, job_id))
+            embedding_store.delete(cursor, 'job', job_id)
+            if linked:
+                ids, embeddings, skill_matrix = self._load_jobs(cursor)
+                self._recompute_rows(cursor, linked, ids, embeddings, skill_matrix)
+            db.bump_data_version(cursor, 'job_similarity')
+            conn.commit()
+        except Exception as e:
+            print(f"Error removing job {job_id} from similarity index: {e}")
+        finally:
+            conn.close()
+    
+    def rebuild(self):
+        """Recompute the whole graph (embeds any job that has no stored embedding)"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            ids, embeddings, skill_matrix = self._load_jobs(cursor)
+            cursor.execute('DELETE FROM job_similarity')
+            self._recompute_rows(cursor, set(ids), ids, embeddings, skill_matrix)
+            db.bump_data_version(cursor, 'job_similarity')
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def needs_rebuild(self) -> bool:
+        """Check whether any job lacks an embedding for the current model"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT EXISTS(
+                SELECT 1 FROM job_descriptions j
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM embeddings e
+                    WHERE e.entity_type = 'job' AND e.entity_id = j.id AND e.model_name = ?
+                )
+            )
+        ''', (embedding_store.model_name,))
+        missing = cursor.fetchone()[0]
+        conn.close()
+        return bool(missing)
+    
+    def get_similar_jobs(self, job_id: int, limit: Optional[int] = None) -> List[Dict]:
+        """Get a job's stored neighbours, most similar first"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT js.similar_job_id, j.title, js.similarity
+            FROM job_similarity js
+            JOIN job_descriptions j ON js.similar_job_id = j.id
+            WHERE js.job_id = ?
+            ORDER BY js.similarity DESC, js.similar_job_id
+            LIMIT ?
+        ''', (job_id, limit or self.top_n))
+        similar_jobs = [
+            {'job_id': row[0], 'title': row[1], 'similarity': row[2]}
+            for row in cursor.fetchall()
+        ]
+        conn.close()
+        return similar_jobs
+
+# Initialize job similarity index instance
+job_similarity_index = JobSimilarityIndex(
+    top_n=config.JOB_SIMILARITY_TOP_N,
+    min_similarity=config.JOB_SIMILARITY_MIN_SCORE,
+    embedding_weight=config.JOB_SIMILARITY_EMBEDDING_WEIGHT
+) 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Depends, APIRouter, Request
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Depends, APIRouter, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
@@ -13,13 +13,26 @@ from database import db
 from resume_parser import resume_parser
 from jd_parser import jd_parser
 from matcher import rag_matcher
-from scorer import mcp_scorer
 from scheduler import interview_scheduler
 from messenger import llm_messenger
 from analytics import recruitment_analytics
 from mcp_protocol import mcp, MCPRequest, MCPMessageType
 from video_analyzer import video_analyzer
 from code_analyzer import code_analyzer
+from job_similarity import job_similarity_index
+from weight_profiles import weight_profiles
+from shadow_scoring import shadow_scorer
+from what_if import what_if_simulator
+from scoring_service import scoring_service
+from retrieval import candidate_retriever
+from candidate_index import candidate_index
+from full_text_search import full_text_search
+from hybrid_retrieval import hybrid_retriever
+from job_match_index import job_match_index
+from score_matrix import score_matrix_builder
+from duplicate_detection import duplicate_detector
+from talent_pools import talent_pools
+from model_swap import model_swap
 import uuid
 from config import config
 
@@ -83,6 +96,54 @@ class MCPScoreRequest(BaseModel):
     candidate_id: int
     job_id: int
 
+class MCPBatchScoreRequest(BaseModel):
+    job_id: int
+    candidate_ids: Optional[List[int]] = None
+    min_experience: Optional[int] = None
+    max_experience: Optional[int] = None
+    education_level: Optional[str] = None
+    skills: Optional[List[str]] = None
+    offset: int = 0
+    limit: int = 50
+
+class WeightProfileCreate(BaseModel):
+    name: str
+    weights: Dict[str, Any] = {}
+    activate: bool = False
+
+class WhatIfRequest(BaseModel):
+    job_id: int
+    weights: Dict[str, float]
+    top_k: int = 20
+
+class CandidateSearchRequest(BaseModel):
+    must_have: List[str] = []
+    nice_to_have: List[str] = []
+    exclude: List[str] = []
+    min_experience: Optional[int] = None
+    max_experience: Optional[int] = None
+    education_levels: Optional[List[str]] = None
+    offset: int = 0
+    limit: int = 50
+    facet_limit: int = 20
+
+class RetrievalSettingsUpdate(BaseModel):
+    lexical_weight: Optional[float] = None
+    semantic_weight: Optional[float] = None
+    rrf_k: Optional[int] = None
+    depth: Optional[int] = None
+
+class ScoreMatrixRunRequest(BaseModel):
+    chunk_size: Optional[int] = None
+    resume_run_id: Optional[int] = None
+
+class DuplicateUpdate(BaseModel):
+    duplicate_of: Optional[int] = None
+
+class EmbeddingModelSwapRequest(BaseModel):
+    model_name: str
+    batch_size: Optional[int] = None
+
 class CandidateUpdate(BaseModel):
     name: Optional[str] = None
     email: Optional[str] = None
@@ -146,6 +207,7 @@ async def list_routes():
 @api_router.post("/upload-jd")
 async def upload_job_description(
     request: Request,
+    background_tasks: BackgroundTasks,
     file: Optional[UploadFile] = File(None),
     title: Optional[str] = Form(None),
     description: Optional[str] = Form(None)
@@ -193,6 +255,8 @@ async def upload_job_description(
             requirements=json.dumps(jd_data.get('requirements', [])),
             skills=json.dumps(jd_data['skills'])
         )
+        background_tasks.add_task(job_similarity_index.update_job, job_id)
+        scoring_service.submit_job(job_id)
         
         return {
             "success": True,
@@ -205,7 +269,7 @@ async def upload_job_description(
 
 # JSON endpoint for job descriptions (keeping as backup)
 @api_router.post("/upload-jd-json")
-async def upload_job_description_json(job_data: JobDescriptionCreate):
+async def upload_job_description_json(job_data: JobDescriptionCreate, background_tasks: BackgroundTasks):
     """Upload job description via JSON"""
     try:
         # Parse text job description
@@ -219,6 +283,8 @@ async def upload_job_description_json(job_data: JobDescriptionCreate):
             requirements=json.dumps(jd_data.get('requirements', [])),
             skills=json.dumps(jd_data['skills'])
         )
+        background_tasks.add_task(job_similarity_index.update_job, job_id)
+        scoring_service.submit_job(job_id)
         
         return {
             "success": True,
@@ -256,6 +322,105 @@ async def get_job_description(job_id: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching job: {str(e)}")
 
+@api_router.get("/jobs/{job_id}/similar")
+async def get_similar_jobs(job_id: int, limit: Optional[int] = None):
+    """Get the precomputed most similar jobs for a job"""
+    try:
+        if not db.get_job_description(job_id):
+            raise HTTPException(status_code=404, detail="Job not found")
+
+        return {
+            "success": True,
+            "job_id": job_id,
+            "similar_jobs": job_similarity_index.get_similar_jobs(job_id, limit)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching similar jobs: {str(e)}")
+
+@api_router.get("/jobs/{job_id}/shortlist")
+async def get_job_shortlist(
+    job_id: int,
+    top_k: int = 20,
+    top_n: Optional[int] = None,
+    min_skill_overlap: Optional[int] = None,
+    max_experience_gap: Optional[int] = None,
+    min_education_ratio: Optional[float] = None,
+    evaluate: bool = False
+):
+    """Rank a job's candidates in two stages: cheap prefilters over the pool, full scoring of the top_n"""
+    try:
+        if not 1 <= top_k <= 500:
+            raise HTTPException(status_code=400, detail="top_k must be between 1 and 500")
+        job_data = db.get_job_description(job_id)
+        if not job_data:
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        shortlist = candidate_retriever.rank(
+            job_data,
+            db.get_candidates_for_scoring(),
+            top_k=top_k,
+            top_n=top_n,
+            min_skill_overlap=min_skill_overlap,
+            max_experience_gap=max_experience_gap,
+            min_education_ratio=min_education_ratio,
+            evaluate=evaluate
+        )
+        return {"success": True, **shortlist}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error building shortlist: {str(e)}")
+
+@api_router.get("/jobs/{job_id}/hybrid-matches")
+async def get_hybrid_matches(
+    job_id: int,
+    top_k: int = 20,
+    lexical_weight: Optional[float] = None,
+    semantic_weight: Optional[float] = None,
+    rrf_k: Optional[int] = None,
+    depth: Optional[int] = None,
+    evaluate: bool = False
+):
+    """Top-k candidates of a job by reciprocal-rank fusion of BM25 over resume texts and embedding similarity"""
+    try:
+        if not 1 <= top_k <= 500:
+            raise HTTPException(status_code=400, detail="top_k must be between 1 and 500")
+        job_data = db.get_job_description(job_id)
+        if not job_data:
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        overrides = {'lexical_weight': lexical_weight, 'semantic_weight': semantic_weight, 'rrf_k': rrf_k, 'depth': depth}
+        matches = hybrid_retriever.rank(job_data, top_k=top_k, overrides=overrides, evaluate=evaluate)
+        return {"success": True, **matches}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error ranking hybrid matches: {str(e)}")
+
+@api_router.put("/jobs/{job_id}/retrieval-settings")
+async def update_retrieval_settings(job_id: int, settings_update: RetrievalSettingsUpdate):
+    """Store a job's hybrid retrieval overrides (omitted fields use the configured defaults)"""
+    try:
+        if not db.get_job_description(job_id):
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        overrides = {name: value for name, value in settings_update.dict().items() if value is not None}
+        hybrid_retriever.validate({**hybrid_retriever.defaults, **overrides})
+        db.save_job_retrieval_settings(job_id, overrides)
+        return {"success": True, "overrides": overrides, "settings": hybrid_retriever.settings(job_id)}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating retrieval settings: {str(e)}")
+
 # Resume upload and candidate management
 @api_router.post("/upload-resume")
 async def upload_resume(
@@ -343,10 +508,17 @@ async def upload_resume(
         
         # Store in database
         candidate_id = db.insert_candidate(candidate_data)
+        candidate_index.update_candidate(candidate_id)
+        duplicate = duplicate_detector.check_candidate(candidate_id, candidate_data.get('resume_text', ''))
+        if not duplicate:
+            scoring_service.submit_candidate(candidate_id)  # Near-duplicates are not scored or clustered
+            talent_pools.assign_candidate(candidate_id)
+        candidate_data.pop('resume_text', None)  # Persisted and indexed; too bulky to echo back
         
         return {
             "success": True,
             "candidate_id": candidate_id,
+            "duplicate": duplicate,
             "parsed_data": candidate_data,
             "multi_modal_analysis": {
                 "video_analysis": video_analysis,
@@ -360,52 +532,26 @@ async def upload_resume(
 
 # Candidate ranking and matching
 @api_router.get("/candidates")
-async def get_candidates(job_id: Optional[int] = None):
-    """Get ranked candidates for a specific job or all candidates"""
+async def get_candidates(job_id: Optional[int] = None, collapse_duplicates: bool = False):
+    """Get ranked candidates for a specific job or all candidates
+    
+    Job rankings leave out candidates flagged as near-duplicates. Without
+    a job, collapse_duplicates folds them into their original's entry.
+    """
     try:
         if job_id:
-            # Get candidates with scores for specific job
-            candidates = db.get_candidates_with_scores(job_id)
             job_data = db.get_job_description(job_id)
-            
             if not job_data:
                 raise HTTPException(status_code=404, detail="Job not found")
             
-            # If candidates don't have scores, compute them
-            unscored_candidates = [c for c in candidates if c['final_score'] is None]
-            
-            if unscored_candidates:
-                # Compute RAG matching and MCP scores
-                for candidate in unscored_candidates:
-                    # Compute RAG match
-                    match_result = rag_matcher.compute_overall_match(candidate, job_data)
-                    
-                    # Compute MCP score
-                    mcp_result = mcp_scorer.compute_mcp_score(
-                        candidate, job_data, match_result['final_score']
-                    )
-                    
-                    # Store scores in database
-                    score_data = {
-                        'candidate_id': candidate['id'],
-                        'job_id': job_id,
-                        'match_score': match_result['final_score'],
-                        'experience_score': mcp_result['component_scores']['experience_score'],
-                        'education_score': mcp_result['component_scores']['education_score'],
-                        'final_score': mcp_result['final_score'],
-                        'matched_skills': match_result['skills_match']['matched_skills'],
-                        'missing_skills': match_result['skills_match']['missing_skills']
-                    }
-                    
-                    db.insert_candidate_score(score_data)
-                
-                # Refresh candidates list
-                candidates = db.get_candidates_with_scores(job_id)
+            # Stored scores only; missing or stale ones are queued for the scoring worker
+            candidates, pending_scores = scoring_service.get_ranked_candidates(job_data)
             
             return {
                 "success": True,
                 "candidates": candidates,
-                "job": job_data
+                "job": job_data,
+                "pending_scores": pending_scores
             }
         else:
             # Get all candidates without specific job matching
@@ -429,17 +575,173 @@ async def get_candidates(job_id: Optional[int] = None):
                     'resume_path': row[8],
                     'github_url': row[9],
                     'video_intro_path': row[10],
-                    'created_at': row[11]
+                    'created_at': row[11],
+                    'duplicate_of': row[13]
                 })
             
+            if collapse_duplicates:
+                originals = {candidate['id']: candidate for candidate in candidates if candidate['duplicate_of'] is None}
+                for candidate in originals.values():
+                    candidate['duplicates'] = []
+                for candidate in candidates:
+                    if candidate['duplicate_of'] in originals:
+                        originals[candidate['duplicate_of']]['duplicates'].append(candidate['id'])
+                candidates = [candidate for candidate in candidates if candidate['duplicate_of'] is None]
+            
             return {
                 "success": True,
                 "candidates": candidates
             }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching candidates: {str(e)}")
 
+@api_router.post("/candidates/search")
+async def search_candidates(search_request: CandidateSearchRequest):
+    """Boolean must-have/nice-to-have/exclude skill search with facet counts, served from the bitmap index"""
+    try:
+        if search_request.offset < 0 or not 1 <= search_request.limit <= 500:
+            raise HTTPException(status_code=400, detail="offset must be >= 0 and limit between 1 and 500")
+        if search_request.facet_limit < 1:
+            raise HTTPException(status_code=400, detail="facet_limit must be at least 1")
+        
+        matches = candidate_index.search(
+            must_have=search_request.must_have,
+            nice_to_have=search_request.nice_to_have,
+            exclude=search_request.exclude,
+            min_experience=search_request.min_experience,
+            max_experience=search_request.max_experience,
+            education_levels=search_request.education_levels,
+            offset=search_request.offset,
+            limit=search_request.limit,
+            facet_limit=search_request.facet_limit
+        )
+        
+        # Only the returned page is read from the database
+        page = {
+            candidate['id']: candidate
+            for candidate in db.get_candidates_for_scoring(
+                [item['candidate_id'] for item in matches['results']], include_duplicates=True
+            )
+        }
+        results = []
+        for item in matches['results']:
+            candidate = page.get(item['candidate_id'])
+            if candidate:
+                results.append({**candidate, 'nice_to_have_matched': item['nice_to_have_matched']})
+        
+        return {"success": True, **matches, "results": results}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching candidates: {str(e)}")
+
+@api_router.get("/candidates/duplicates")
+async def get_duplicate_candidates():
+    """Groups of candidates flagged as near-duplicates, each with its original"""
+    try:
+        groups = db.get_duplicate_groups()
+        return {
+            "success": True,
+            "groups": groups,
+            "duplicate_count": sum(len(group['duplicates']) for group in groups)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching duplicate candidates: {str(e)}")
+
+@api_router.get("/talent-pools")
+async def get_talent_pools(representatives: int = 3):
+    """Candidate clusters with their sizes, representative skills and closest candidates"""
+    try:
+        if not 0 <= representatives <= 20:
+            raise HTTPException(status_code=400, detail="representatives must be between 0 and 20")
+        return {"success": True, **talent_pools.get_pools(representatives)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching talent pools: {str(e)}")
+
+@api_router.get("/talent-pools/{pool_id}/candidates")
+async def get_talent_pool_candidates(pool_id: int, offset: int = 0, limit: int = 50):
+    """A talent pool's candidates, closest to the pool centroid first"""
+    try:
+        if offset < 0 or not 1 <= limit <= 500:
+            raise HTTPException(status_code=400, detail="offset must be >= 0 and limit between 1 and 500")
+        result = talent_pools.get_pool_candidates(pool_id, offset, limit)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Talent pool not found")
+        return {"success": True, **result}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching talent pool candidates: {str(e)}")
+
+@api_router.post("/talent-pools/refit")
+async def refit_talent_pools():
+    """Queue a background refit of the talent pools"""
+    try:
+        talent_pools.request_refit()
+        return {"success": True, "message": "Talent pool refit queued"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error queueing talent pool refit: {str(e)}")
+
+@api_router.get("/embedding-models")
+async def get_embedding_models():
+    """The active and loaded embedding models, any model being built, and every model with stored vectors"""
+    try:
+        return {"success": True, **model_swap.status()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching embedding models: {str(e)}")
+
+@api_router.post("/embedding-models/swap")
+async def swap_embedding_model(request: EmbeddingModelSwapRequest):
+    """Embed everything with another model in the background, switching to it once done"""
+    try:
+        model = model_swap.start(request.model_name, batch_size=request.batch_size)
+        return {"success": True, "model": model}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error starting embedding model swap: {str(e)}")
+
+@api_router.delete("/embedding-models/{model_name:path}")
+async def delete_embedding_model(model_name: str):
+    """Delete the stored vectors of an embedding model that is no longer in use"""
+    try:
+        deleted = model_swap.delete_model(model_name)
+        if deleted is None:
+            raise HTTPException(status_code=404, detail="Embedding model not found")
+        return {"success": True, "model_name": model_name, "deleted_vectors": deleted}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting embedding model: {str(e)}")
+
+@api_router.get("/search")
+async def search_text(q: str, types: Optional[str] = None, match: str = "all", offset: int = 0, limit: int = 20):
+    """BM25-ranked full-text search over resumes, job descriptions and messages"""
+    try:
+        if match not in ("all", "any"):
+            raise HTTPException(status_code=400, detail="match must be 'all' or 'any'")
+        if offset < 0 or not 1 <= limit <= 100:
+            raise HTTPException(status_code=400, detail="offset must be >= 0 and limit between 1 and 100")
+        
+        doc_types = [doc_type.strip() for doc_type in types.split(',') if doc_type.strip()] if types else None
+        results = full_text_search.search(q, doc_types, match_all=match == "all", offset=offset, limit=limit)
+        return {"success": True, **results}
+    except HTTPException:
+        raise
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching documents: {str(e)}")
+
 @api_router.get("/candidate/{candidate_id}")
 async def get_candidate_profile(candidate_id: int, job_id: Optional[int] = None):
     """Get detailed candidate profile with optional job matching insights"""
@@ -469,6 +771,68 @@ async def get_candidate_profile(candidate_id: int, job_id: Optional[int] = None)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching candidate profile: {str(e)}")
 
+@api_router.get("/candidate/{candidate_id}/matching-jobs")
+async def get_matching_jobs(candidate_id: int, top_k: int = 10):
+    """Top-k jobs for a candidate with component scores, served from the job-side index"""
+    try:
+        if not 1 <= top_k <= 100:
+            raise HTTPException(status_code=400, detail="top_k must be between 1 and 100")
+        candidates = db.get_candidates_for_scoring([candidate_id], include_duplicates=True)
+        if not candidates:
+            raise HTTPException(status_code=404, detail="Candidate not found")
+        
+        return {"success": True, **job_match_index.matching_jobs(candidates[0], top_k)}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error finding matching jobs: {str(e)}")
+
+@api_router.get("/candidate/{candidate_id}/duplicates")
+async def get_candidate_duplicates(candidate_id: int):
+    """A candidate's duplicate flag and the candidates with near-identical resumes"""
+    try:
+        candidate = db.get_candidate_by_id(candidate_id)
+        if not candidate:
+            raise HTTPException(status_code=404, detail="Candidate not found")
+        
+        return {
+            "success": True,
+            "candidate_id": candidate_id,
+            "duplicate_of": candidate['duplicate_of'],
+            "similarity": candidate['duplicate_similarity'],
+            "duplicates": db.get_duplicate_ids(candidate_id),
+            "similar_candidates": duplicate_detector.find_similar(candidate_id)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching candidate duplicates: {str(e)}")
+
+@api_router.put("/candidate/{candidate_id}/duplicate")
+async def update_candidate_duplicate(candidate_id: int, duplicate_update: DuplicateUpdate):
+    """Flag a candidate as a duplicate of another, or clear its flag (duplicate_of: null)"""
+    try:
+        if not db.get_candidate_by_id(candidate_id):
+            raise HTTPException(status_code=404, detail="Candidate not found")
+        
+        if duplicate_update.duplicate_of is None:
+            if db.clear_duplicate(candidate_id):
+                scoring_service.submit_candidate(candidate_id)
+                talent_pools.assign_candidate(candidate_id)
+            duplicate_of = None
+        else:
+            duplicate_of = db.mark_duplicate(candidate_id, duplicate_update.duplicate_of)
+        
+        return {"success": True, "candidate_id": candidate_id, "duplicate_of": duplicate_of}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating duplicate flag: {str(e)}")
+
 # Interview scheduling endpoints
 @api_router.post("/schedule/slots")
 async def create_time_slots(slot_request: TimeSlotCreate):
@@ -574,6 +938,7 @@ async def update_interview(interview_id: int, update_data: InterviewUpdate):
                         SET {", ".join(update_fields)}
                         WHERE id = ?
                     ''', params)
+                    db.bump_data_version(cursor, 'interviews')
                     conn.commit()
                 
                 conn.close()
@@ -749,22 +1114,66 @@ async def get_dashboard_data():
 async def get_hiring_funnel_metrics(days: int = 30):
     """Get comprehensive hiring funnel metrics"""
     try:
-        metrics = recruitment_analytics.get_hiring_funnel_metrics(days)
+        metrics, cache_info = recruitment_analytics.get_cached(
+            'funnel', recruitment_analytics.get_hiring_funnel_metrics, days=days
+        )
         return {
             "success": True,
-            "metrics": metrics
+            "metrics": metrics,
+            "cache": cache_info
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching funnel metrics: {str(e)}")
 
+@api_router.get("/analytics/score-distribution")
+async def get_score_distribution(days: int = 30, job_id: Optional[int] = None):
+    """Get the candidate score distribution, globally or for a specific job"""
+    try:
+        distribution, cache_info = recruitment_analytics.get_cached(
+            'score_distribution', recruitment_analytics.get_score_distribution, days=days, job_id=job_id
+        )
+        return {
+            "success": True,
+            "distribution": distribution,
+            "cache": cache_info
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching score distribution: {str(e)}")
+
+@api_router.post("/analytics/what-if")
+async def simulate_what_if_ranking(what_if_request: WhatIfRequest):
+    """Re-rank a job's scored candidates under different component weights"""
+    try:
+        if not 1 <= what_if_request.top_k <= 500:
+            raise HTTPException(status_code=400, detail="top_k must be between 1 and 500")
+        if not db.get_job_description(what_if_request.job_id):
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        simulation = what_if_simulator.simulate(
+            what_if_request.job_id, what_if_request.weights, top_k=what_if_request.top_k
+        )
+        return {
+            "success": True,
+            "simulation": simulation
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error simulating ranking: {str(e)}")
+
 @api_router.get("/analytics/bias")
 async def detect_bias(job_id: Optional[int] = None):
     """Detect potential bias in hiring process"""
     try:
-        bias_analysis = recruitment_analytics.detect_bias(job_id)
+        bias_analysis, cache_info = recruitment_analytics.get_cached(
+            'bias', recruitment_analytics.detect_bias, job_id=job_id
+        )
         return {
             "success": True,
-            "bias_analysis": bias_analysis
+            "bias_analysis": bias_analysis,
+            "cache": cache_info
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error detecting bias: {str(e)}")
@@ -773,10 +1182,13 @@ async def detect_bias(job_id: Optional[int] = None):
 async def get_performance_predictions(job_id: int):
     """Get hiring performance predictions for a job"""
     try:
-        predictions = recruitment_analytics.get_performance_predictions(job_id)
+        predictions, cache_info = recruitment_analytics.get_cached(
+            'predictions', recruitment_analytics.get_performance_predictions, job_id=job_id
+        )
         return {
             "success": True,
-            "predictions": predictions
+            "predictions": predictions,
+            "cache": cache_info
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating predictions: {str(e)}")
@@ -785,14 +1197,70 @@ async def get_performance_predictions(job_id: int):
 async def get_real_time_insights():
     """Get real-time recruitment insights"""
     try:
-        insights = recruitment_analytics.get_real_time_insights()
+        insights, cache_info = recruitment_analytics.get_cached(
+            'insights', recruitment_analytics.get_real_time_insights
+        )
         return {
             "success": True,
-            "insights": insights
+            "insights": insights,
+            "cache": cache_info
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching insights: {str(e)}")
 
+@api_router.get("/analytics/cache")
+async def get_analytics_cache_metrics():
+    """Get analytics result cache metrics"""
+    try:
+        return {
+            "success": True,
+            "cache_metrics": recruitment_analytics.cache.get_metrics()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching cache metrics: {str(e)}")
+
+@api_router.get("/scoring/status")
+async def get_scoring_status():
+    """Get the background scoring worker's queue depth and counters"""
+    try:
+        return {
+            "success": True,
+            "scoring": scoring_service.get_queue_stats()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching scoring status: {str(e)}")
+
+@api_router.post("/scoring/matrix")
+async def start_score_matrix_run(request: ScoreMatrixRunRequest):
+    """Score every candidate against every job in the background, or resume an unfinished run"""
+    try:
+        return {"success": True, "run": score_matrix_builder.start(request.chunk_size, request.resume_run_id)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error starting score matrix run: {str(e)}")
+
+@api_router.get("/scoring/matrix")
+async def get_score_matrix_runs(limit: int = 20):
+    """Recent full score matrix runs with their progress"""
+    try:
+        return {"success": True, "runs": score_matrix_builder.get_runs(limit)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching score matrix runs: {str(e)}")
+
+@api_router.get("/scoring/matrix/{run_id}")
+async def get_score_matrix_run(run_id: int):
+    """Progress of one full score matrix run"""
+    try:
+        run = score_matrix_builder.get_run(run_id)
+        if not run:
+            raise HTTPException(status_code=404, detail="Score matrix run not found")
+        return {"success": True, "run": run}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching score matrix run: {str(e)}")
+
 # CRUD endpoints for candidates
 @api_router.put("/candidate/{candidate_id}")
 async def update_candidate(candidate_id: int, candidate_update: CandidateUpdate):
@@ -822,6 +1290,9 @@ async def update_candidate(candidate_id: int, candidate_update: CandidateUpdate)
         success = db.update_candidate(candidate_id, update_data)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to update candidate")
+        candidate_index.update_candidate(candidate_id)
+        scoring_service.submit_candidate(candidate_id)
+        talent_pools.assign_candidate(candidate_id)
         
         # Return updated candidate
         updated_candidate = db.get_candidate_by_id(candidate_id)
@@ -846,9 +1317,16 @@ async def delete_candidate(candidate_id: int):
             raise HTTPException(status_code=404, detail="Candidate not found")
         
         # Delete candidate
+        duplicate_ids = db.get_duplicate_ids(candidate_id)
         success = db.delete_candidate(candidate_id)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to delete candidate")
+        candidate_index.remove_candidate(candidate_id)
+        duplicate_detector.remove_candidate(candidate_id)
+        if duplicate_ids:
+            # Promoted to original of the group: scored and clustered from now on
+            scoring_service.submit_candidate(duplicate_ids[0])
+            talent_pools.assign_candidate(duplicate_ids[0])
         
         return {
             "success": True,
@@ -862,7 +1340,7 @@ async def delete_candidate(candidate_id: int):
 
 # CRUD endpoints for jobs
 @api_router.put("/jobs/{job_id}")
-async def update_job(job_id: int, job_update: JobUpdate):
+async def update_job(job_id: int, job_update: JobUpdate, background_tasks: BackgroundTasks):
     """Update job description"""
     try:
         # Get existing job
@@ -889,6 +1367,9 @@ async def update_job(job_id: int, job_update: JobUpdate):
         success = db.update_job_description(job_id, update_data)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to update job")
+        mcp.invalidate_context(job_id)
+        background_tasks.add_task(job_similarity_index.update_job, job_id)
+        scoring_service.submit_job(job_id)
         
         # Return updated job
         updated_job = db.get_job_description(job_id)
@@ -904,7 +1385,7 @@ async def update_job(job_id: int, job_update: JobUpdate):
         raise HTTPException(status_code=500, detail=f"Error updating job: {str(e)}")
 
 @api_router.delete("/jobs/{job_id}")
-async def delete_job(job_id: int):
+async def delete_job(job_id: int, background_tasks: BackgroundTasks):
     """Delete job description and all related data"""
     try:
         # Check if job exists
@@ -916,6 +1397,8 @@ async def delete_job(job_id: int):
         success = db.delete_job_description(job_id)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to delete job")
+        mcp.invalidate_context(job_id)
+        background_tasks.add_task(job_similarity_index.remove_job, job_id)
         
         return {
             "success": True,
@@ -937,8 +1420,8 @@ async def mcp_score_candidate(mcp_score_request: MCPScoreRequest):
         if not candidate_data:
             raise HTTPException(status_code=404, detail="Candidate not found")
         
-        # Initialize MCP context
-        context = mcp.initialize_context(mcp_score_request.job_id)
+        # Get the (cached) MCP context for the job
+        context = mcp.get_context(mcp_score_request.job_id)
         
         # Create MCP request
         request = MCPRequest(
@@ -951,6 +1434,7 @@ async def mcp_score_candidate(mcp_score_request: MCPScoreRequest):
         
         # Process request
         response = mcp.process_score_request(request)
+        shadow_scorer.submit_mcp_score(request, response.score, response.weight_profile_version)
         
         return {
             "success": True,
@@ -961,12 +1445,49 @@ async def mcp_score_candidate(mcp_score_request: MCPScoreRequest):
                 "reasoning": response.reasoning,
                 "context_factors": response.context_factors,
                 "model_version": response.model_version,
+                "weight_profile_version": response.weight_profile_version,
                 "timestamp": response.timestamp.isoformat()
             }
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing MCP score: {str(e)}")
 
+@api_router.post("/mcp/score/batch")
+async def mcp_score_candidates_batch(batch_request: MCPBatchScoreRequest):
+    """Score a job's candidate pool using Model Context Protocol and return a ranked page"""
+    try:
+        if batch_request.offset < 0 or not 1 <= batch_request.limit <= 500:
+            raise HTTPException(status_code=400, detail="offset must be >= 0 and limit between 1 and 500")
+        
+        try:
+            context = mcp.get_context(batch_request.job_id)
+        except ValueError:
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        candidates = db.get_candidates_for_scoring(
+            candidate_ids=batch_request.candidate_ids,
+            min_experience=batch_request.min_experience,
+            max_experience=batch_request.max_experience,
+            education_level=batch_request.education_level,
+            skills=batch_request.skills
+        )
+        ranked = mcp.score_candidates_batch(
+            context, candidates, offset=batch_request.offset, limit=batch_request.limit
+        )
+        shadow_scorer.submit_mcp_batch(context, candidates, ranked['results'], ranked['weight_profile_version'])
+        
+        return {
+            "success": True,
+            "job_id": batch_request.job_id,
+            "model_version": mcp.model_version,
+            "timestamp": datetime.now().isoformat(),
+            **ranked
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing MCP batch score: {str(e)}")
+
 @api_router.post("/mcp/feedback")
 async def record_mcp_feedback(request_id: str, actual_outcome: str, feedback_score: float):
     """Record feedback for MCP continuous learning"""
@@ -991,6 +1512,130 @@ async def get_mcp_stats():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching MCP stats: {str(e)}")
 
+# Scoring weight profile endpoints
+@api_router.get("/weight-profiles")
+async def list_weight_profiles():
+    """List scoring weight profile versions"""
+    try:
+        active = weight_profiles.current()
+        return {
+            "success": True,
+            "active_version": active.version,
+            "profiles": weight_profiles.list_profiles()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching weight profiles: {str(e)}")
+
+@api_router.get("/weight-profiles/active")
+async def get_active_weight_profile():
+    """Get the active scoring weight profile"""
+    try:
+        return {
+            "success": True,
+            "profile": weight_profiles.current().to_dict()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching active weight profile: {str(e)}")
+
+@api_router.get("/weight-profiles/{version}")
+async def get_weight_profile(version: int):
+    """Get a scoring weight profile version"""
+    try:
+        profile = weight_profiles.get_profile(version)
+        if not profile:
+            raise HTTPException(status_code=404, detail="Weight profile not found")
+        
+        return {
+            "success": True,
+            "profile": profile
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching weight profile: {str(e)}")
+
+@api_router.post("/weight-profiles")
+async def create_weight_profile(profile_data: WeightProfileCreate):
+    """Create a new scoring weight profile version (partial weights are merged onto the defaults)"""
+    try:
+        profile = weight_profiles.create_profile(
+            profile_data.name, profile_data.weights, activate=profile_data.activate
+        )
+        if profile_data.activate:
+            scoring_service.submit()  # Stored final scores of the previous profile are stale now
+        return {
+            "success": True,
+            "profile": profile
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating weight profile: {str(e)}")
+
+@api_router.post("/weight-profiles/{version}/activate")
+async def activate_weight_profile(version: int):
+    """Activate a scoring weight profile version"""
+    try:
+        if not weight_profiles.activate(version):
+            raise HTTPException(status_code=404, detail="Weight profile not found")
+        scoring_service.submit()  # Stored final scores of the previous profile are stale now
+        
+        return {
+            "success": True,
+            "message": f"Weight profile version {version} activated",
+            "active_version": weight_profiles.current().version
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error activating weight profile: {str(e)}")
+
+@api_router.post("/weight-profiles/{version}/shadow")
+async def set_shadow_weight_profile(version: int):
+    """Evaluate a scoring weight profile in shadow mode alongside the active one"""
+    try:
+        if not weight_profiles.set_shadow(version):
+            raise HTTPException(status_code=404, detail="Weight profile not found")
+        
+        return {
+            "success": True,
+            "message": f"Weight profile version {version} is now scored in shadow mode",
+            "shadow_version": version
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error setting shadow weight profile: {str(e)}")
+
+@api_router.delete("/weight-profiles/shadow")
+async def clear_shadow_weight_profile():
+    """Turn shadow scoring off"""
+    try:
+        weight_profiles.set_shadow(None)
+        return {
+            "success": True,
+            "message": "Shadow scoring disabled"
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error clearing shadow weight profile: {str(e)}")
+
+@api_router.get("/shadow-scoring")
+async def get_shadow_scoring_report(shadow_version: Optional[int] = None):
+    """Compare shadow-profile scores with the primary scores they shadowed"""
+    try:
+        shadow = weight_profiles.shadow()
+        return {
+            "success": True,
+            "active_version": weight_profiles.current().version,
+            "shadow_version": shadow.version if shadow else None,
+            "queue": shadow_scorer.get_queue_stats(),
+            "comparison": shadow_scorer.get_comparison(shadow_version)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching shadow scoring report: {str(e)}")
+
 # Include the API router
 app.include_router(api_router)
 
@@ -1001,6 +1646,18 @@ async def startup_event():
     print("🚀 Starting Agentic AI Hiring Assistant...")
     config.print_config_status()
     print("📊 Database initialized")
+    model_swap.start_sync()
+    if rag_matcher.fallback:
+        print(f"⚠️ Serving fallback embedding model {rag_matcher.model_name} instead of {rag_matcher.requested_model_name}")
+    if job_similarity_index.needs_rebuild():
+        job_similarity_index.rebuild()
+        print("🔗 Job similarity index rebuilt")
+    candidate_index.rebuild()
+    duplicates = duplicate_detector.rebuild()
+    if duplicates['signed'] or duplicates['resigned']:
+        print(f"🪞 Duplicate index: {duplicates['signed'] + duplicates['resigned']} resumes signed, {duplicates['flagged']} flagged")
+    scoring_service.submit()  # Scores missed while down, or left stale by a scorer version bump
+    talent_pools.start()
     print("🤖 AI models loaded")
     print("✅ Application ready!")
 
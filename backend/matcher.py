@@ -1,18 +1,58 @@
 from sentence_transformers import SentenceTransformer
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import json
+from database import db
+from pair_features import Encoder, PairFeatures, PairFeatureCache
+from ranking import bounded_top_k
+from config import config
+
+# Highest semantic similarity a pair can get: cosine of unit float32 vectors, with headroom for rounding
+SEMANTIC_SIMILARITY_BOUND = 100.01
 
 class RAGMatcher:
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
-        """Initialize the RAG matcher with sentence transformer model"""
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', fallback_model_name: Optional[str] = None):
+        """Initialize the RAG matcher with sentence transformer model
+        
+        If the model fails to load, the fallback model is loaded instead when
+        one is given, and the error is raised otherwise. Stored embeddings are
+        keyed by model name, so a fallback's vectors are never compared with
+        the requested model's.
+        """
+        self.requested_model_name = model_name
         try:
-            self.model = SentenceTransformer(model_name)
+            model = SentenceTransformer(model_name)
         except Exception as e:
-            print(f"Error loading model {model_name}: {e}")
-            # Fallback to a smaller model if the main one fails
-            self.model = SentenceTransformer('paraphrase-MiniLM-L3-v2')
+            if not fallback_model_name:
+                raise
+            print(f"⚠️ Error loading model {model_name}: {e}")
+            print(f"⚠️ Falling back to {fallback_model_name}; embeddings are stored and compared under that model only")
+            model, model_name = SentenceTransformer(fallback_model_name), fallback_model_name
+        self._active = (model, model_name)
+    
+    @property
+    def active(self) -> Tuple[SentenceTransformer, str]:
+        """The loaded model and its name, read together so they always belong to each other"""
+        return self._active
+    
+    @property
+    def model(self) -> SentenceTransformer:
+        return self._active[0]
+    
+    @property
+    def model_name(self) -> str:
+        return self._active[1]
+    
+    @property
+    def fallback(self) -> bool:
+        """Whether the fallback model is serving in place of the requested one"""
+        return self.model_name != self.requested_model_name
+    
+    def activate(self, model: SentenceTransformer, model_name: str):
+        """Switch to another loaded model in a single assignment"""
+        self._active = (model, model_name)
+        self.requested_model_name = model_name
     
     def compute_text_similarity(self, text1: str, text2: str) -> float:
         """Compute semantic similarity between two texts"""
@@ -29,178 +69,65 @@ class RAGMatcher:
             print(f"Error computing text similarity: {e}")
             return 0.0
     
-    def compute_skills_match(self, candidate_skills: List[str], job_skills: List[str]) -> Dict:
-        """Compute skills matching between candidate and job requirements"""
-        if not candidate_skills or not job_skills:
-            return {
-                'match_score': 0.0,
-                'matched_skills': [],
-                'missing_skills': job_skills if job_skills else [],
-                'extra_skills': candidate_skills if candidate_skills else []
-            }
-        
-        # Normalize skills to lowercase for comparison
-        candidate_skills_lower = [skill.lower().strip() for skill in candidate_skills]
-        job_skills_lower = [skill.lower().strip() for skill in job_skills]
-        
-        matched_skills = []
-        missing_skills = []
-        
-        # Direct matching first
-        for job_skill in job_skills:
-            job_skill_lower = job_skill.lower().strip()
-            if job_skill_lower in candidate_skills_lower:
-                matched_skills.append(job_skill)
-            else:
-                # Try semantic matching for similar skills
-                best_match_score = 0.0
-                best_match = None
-                
-                for candidate_skill in candidate_skills:
-                    similarity = self.compute_text_similarity(job_skill, candidate_skill)
-                    if similarity > best_match_score and similarity > 70:  # 70% threshold
-                        best_match_score = similarity
-                        best_match = job_skill
-                
-                if best_match:
-                    matched_skills.append(best_match)
-                else:
-                    missing_skills.append(job_skill)
-        
-        # Find extra skills that candidate has but job doesn't require
-        extra_skills = []
-        for candidate_skill in candidate_skills:
-            candidate_skill_lower = candidate_skill.lower().strip()
-            if candidate_skill_lower not in job_skills_lower:
-                # Check if it's semantically similar to any job skill
-                is_similar = False
-                for job_skill in job_skills:
-                    similarity = self.compute_text_similarity(candidate_skill, job_skill)
-                    if similarity > 70:
-                        is_similar = True
-                        break
-                
-                if not is_similar:
-                    extra_skills.append(candidate_skill)
-        
-        # Calculate match score
-        if len(job_skills) > 0:
-            match_score = (len(matched_skills) / len(job_skills)) * 100
-        else:
-            match_score = 100.0  # If no skills required, perfect match
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts into a (len(texts), dim) matrix of unit vectors"""
+        return self.encoder()(texts)
+    
+    def encoder(self, active: Optional[Tuple[SentenceTransformer, str]] = None) -> Encoder:
+        """Encode function bound to the model loaded now (or an earlier `active` snapshot), for vectors compared with each other"""
+        model = (active or self.active)[0]
         
-        return {
-            'match_score': round(match_score, 2),
-            'matched_skills': matched_skills,
-            'missing_skills': missing_skills,
-            'extra_skills': extra_skills
-        }
+        def encode(texts: List[str]) -> np.ndarray:
+            vectors = model.encode(texts, normalize_embeddings=True)
+            return np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+        return encode
     
-    def compute_experience_match(self, candidate_experience: int, required_experience: int) -> Dict:
+    def pair_features(self, candidate_data: Dict, job_data: Dict) -> PairFeatures:
+        """Compute the shared features of a candidate-job pair with this matcher's model"""
+        return PairFeatures(candidate_data, job_data, self.encode)
+    
+    def compute_skills_match(self, features: PairFeatures) -> Dict:
+        """Compute skills matching between candidate and job requirements"""
+        return dict(features.skill_matches)
+    
+    def compute_experience_match(self, features: PairFeatures) -> Dict:
         """Compute experience matching score"""
-        if required_experience == 0:
-            return {
-                'experience_score': 100.0,
-                'experience_gap': 0,
-                'meets_requirement': True
-            }
-        
-        if candidate_experience >= required_experience:
-            # Bonus for extra experience, but cap at 100%
-            bonus = min((candidate_experience - required_experience) * 5, 20)
-            score = min(100.0 + bonus, 100.0)
-            return {
-                'experience_score': score,
-                'experience_gap': 0,
-                'meets_requirement': True
-            }
-        else:
-            # Penalty for lack of experience
-            gap = required_experience - candidate_experience
-            score = max(0, (candidate_experience / required_experience) * 100)
-            return {
-                'experience_score': round(score, 2),
-                'experience_gap': gap,
-                'meets_requirement': False
-            }
+        return {
+            'experience_score': round(features.experience_ratio * 100, 2),
+            'experience_gap': features.experience_gap,
+            'meets_requirement': features.experience_ratio >= 1.0
+        }
     
-    def compute_education_match(self, candidate_education: str, candidate_education_score: float, 
-                               required_education: str) -> Dict:
+    def compute_education_match(self, features: PairFeatures) -> Dict:
         """Compute education matching score"""
-        education_hierarchy = {
-            'high school': 0.1,
-            'secondary': 0.1,
-            'certificate': 0.2,
-            'diploma': 0.4,
-            'bachelor': 0.6,
-            'bachelors': 0.6,
-            'bs': 0.6,
-            'ba': 0.6,
-            'btech': 0.6,
-            'be': 0.6,
-            'master': 0.8,
-            'masters': 0.8,
-            'mba': 0.8,
-            'ms': 0.8,
-            'ma': 0.8,
-            'mtech': 0.8,
-            'phd': 1.0,
-            'ph.d': 1.0,
-            'doctorate': 1.0,
-            'doctoral': 1.0
-        }
-        
-        required_score = education_hierarchy.get(required_education.lower(), 0.6)
-        
-        if candidate_education_score >= required_score:
-            score = 100.0
-            meets_requirement = True
-        else:
-            score = (candidate_education_score / required_score) * 100
-            meets_requirement = False
-        
         return {
-            'education_score': round(score, 2),
-            'meets_requirement': meets_requirement,
-            'education_gap': max(0, required_score - candidate_education_score)
+            'education_score': round(features.education_ratio * 100, 2),
+            'meets_requirement': features.education_ratio >= 1.0,
+            'education_gap': features.education_gap
         }
     
-    def compute_overall_match(self, candidate_data: Dict, job_data: Dict) -> Dict:
+    def compute_overall_match(self, candidate_data: Dict, job_data: Dict,
+                              features: Optional[PairFeatures] = None) -> Dict:
         """Compute overall matching score between candidate and job"""
-        # Extract candidate information
-        candidate_skills = candidate_data.get('skills', [])
-        candidate_experience = candidate_data.get('experience_years', 0)
-        candidate_education = candidate_data.get('education_level', '')
-        candidate_education_score = candidate_data.get('education_score', 0.0)
-        
-        # Extract job requirements
-        job_skills = job_data.get('skills', [])
-        required_experience = job_data.get('experience_years', 0)
-        required_education = job_data.get('education_requirement', 'Bachelor')
+        features = features or self.pair_features(candidate_data, job_data)
         
         # Compute individual matches
-        skills_match = self.compute_skills_match(candidate_skills, job_skills)
-        experience_match = self.compute_experience_match(candidate_experience, required_experience)
-        education_match = self.compute_education_match(
-            candidate_education, candidate_education_score, required_education
-        )
+        skills_match = self.compute_skills_match(features)
+        experience_match = self.compute_experience_match(features)
+        education_match = self.compute_education_match(features)
         
-        # Compute semantic similarity between resume and job description
-        candidate_text = f"{' '.join(candidate_skills)} {candidate_education}"
-        job_text = job_data.get('description', '')
-        semantic_similarity = self.compute_text_similarity(candidate_text, job_text)
+        # Semantic similarity between resume and job description
+        semantic_similarity = features.semantic_similarity
         
-        # Weighted final score calculation
-        # Skills: 40%, Experience: 30%, Education: 10%, Semantic: 20%
-        final_score = (
-            skills_match['match_score'] * 0.4 +
-            experience_match['experience_score'] * 0.3 +
-            education_match['education_score'] * 0.1 +
-            semantic_similarity * 0.2
+        final_score = self._weighted_score(
+            skills_match['match_score'],
+            experience_match['experience_score'],
+            education_match['education_score'],
+            semantic_similarity
         )
         
         return {
-            'final_score': round(final_score, 2),
+            'final_score': final_score,
             'skills_match': skills_match,
             'experience_match': experience_match,
             'education_match': education_match,
@@ -213,12 +140,50 @@ class RAGMatcher:
             }
         }
     
-    def rank_candidates(self, candidates: List[Dict], job_data: Dict) -> List[Dict]:
-        """Rank candidates based on their match scores with the job"""
+    def _weighted_score(self, skills_score: float, experience_score: float,
+                        education_score: float, semantic_similarity: float) -> float:
+        """Weighted final score calculation"""
+        # Skills: 40%, Experience: 30%, Education: 10%, Semantic: 20%
+        return round(
+            skills_score * 0.4 +
+            experience_score * 0.3 +
+            education_score * 0.1 +
+            semantic_similarity * 0.2,
+            2
+        )
+    
+    def _bounded_components(self, features: PairFeatures) -> Tuple[float, float, float]:
+        """Skills, experience and education scores: every component but the resume/description similarity"""
+        return (
+            features.skill_matches['match_score'],
+            self.compute_experience_match(features)['experience_score'],
+            self.compute_education_match(features)['education_score']
+        )
+    
+    def match_score_upper_bound(self, features: PairFeatures) -> float:
+        """Highest final score a pair can get, whatever its resume/description similarity"""
+        return self._weighted_score(*self._bounded_components(features), SEMANTIC_SIMILARITY_BOUND)
+    
+    def rank_candidates(self, candidates: List[Dict], job_data: Dict, top_k: Optional[int] = None) -> List[Dict]:
+        """Rank candidates based on their match scores with the job
+        
+        With `top_k`, only the best top_k are returned, exactly as a full
+        sort would. The resume/description similarity is then skipped for
+        every candidate whose upper bound cannot beat the current k-th score.
+        """
         ranked_candidates = []
+        feature_cache = PairFeatureCache(self.encoder())
+        features = [feature_cache.get(candidate, job_data) for candidate in candidates]
+        
+        if top_k is None:
+            feature_cache.vectors.warm([text for pair in features for text in pair.embedding_texts()])
+            rows = range(len(candidates))
+        else:
+            rows = [row for row, _ in self._top_k_rows(features, top_k, feature_cache)]
         
-        for candidate in candidates:
-            match_result = self.compute_overall_match(candidate, job_data)
+        for row in rows:
+            candidate = candidates[row]
+            match_result = self.compute_overall_match(candidate, job_data, features[row])
             
             candidate_with_score = candidate.copy()
             candidate_with_score.update({
@@ -237,6 +202,22 @@ class RAGMatcher:
         
         return ranked_candidates
     
+    def _top_k_rows(self, features: List[PairFeatures], top_k: int, feature_cache: PairFeatureCache) -> List[tuple]:
+        """Exact top-k (row, match score) pairs, computing semantic similarity only where it can matter"""
+        # Skill vectors come from the pool's small shared skill vocabulary, so they are encoded up front
+        feature_cache.vectors.warm([skill for pair in features for skill in pair.skill_texts()])
+        bounds = [self.match_score_upper_bound(pair) for pair in features]
+        
+        def score_rows(rows: List[int]) -> List[float]:
+            feature_cache.vectors.warm([text for row in rows for text in features[row].similarity_texts()])
+            return [
+                self._weighted_score(*self._bounded_components(features[row]), features[row].semantic_similarity)
+                for row in rows
+            ]
+        
+        top, _ = bounded_top_k(bounds, score_rows, top_k)
+        return top
+    
     def get_match_insights(self, candidate_data: Dict, job_data: Dict) -> Dict:
         """Get detailed insights about the match"""
         match_result = self.compute_overall_match(candidate_data, job_data)
@@ -286,5 +267,8 @@ class RAGMatcher:
         else:
             return "Not Recommended - Poor match"
 
-# Initialize matcher instance
-rag_matcher = RAGMatcher() 
\ No newline at end of file
+# Initialize matcher instance (with the model the last swap activated, if any)
+rag_matcher = RAGMatcher(
+    config.EMBEDDING_MODEL if config.EMBEDDING_MODEL_FORCE else db.get_active_embedding_model() or config.EMBEDDING_MODEL,
+    fallback_model_name=config.EMBEDDING_FALLBACK_MODEL or None
+) 
\ No newline at end of file
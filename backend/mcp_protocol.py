@@ -1,7 +1,12 @@
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 import json
+import threading
+from collections import Counter, OrderedDict, deque
 from datetime import datetime
-from database import db
+from database import db, parse_skills
+from config import config
+from weight_profiles import weight_profiles, WeightProfile
+from pair_features import PairFeatures, normalize_skill
 import numpy as np
 from dataclasses import dataclass
 from enum import Enum
@@ -44,6 +49,48 @@ class MCPResponse:
     context_factors: Dict
     model_version: str
     timestamp: datetime
+    weight_profile_version: Optional[int] = None
+
+class FeedbackWindow:
+    """Fixed-size ring buffer of recent feedback with O(1) running metrics"""
+    
+    def __init__(self, size: int = 50, accurate_threshold: float = 0.8):
+        self.accurate_threshold = accurate_threshold
+        self.entries = deque(maxlen=size)  # (feedback_score, actual_outcome)
+        self.score_sum = 0.0
+        self.accurate = 0
+        self.outcomes = Counter()
+    
+    def add(self, feedback_score: float, actual_outcome: str):
+        """Append feedback, retiring the oldest entry's contribution when full"""
+        if len(self.entries) == self.entries.maxlen:
+            self._retire(*self.entries[0])
+        self.entries.append((feedback_score, actual_outcome))
+        self.score_sum += feedback_score
+        self.accurate += feedback_score >= self.accurate_threshold
+        self.outcomes[actual_outcome] += 1
+    
+    def _retire(self, feedback_score: float, actual_outcome: str):
+        """Remove an entry's contribution from the running metrics"""
+        self.score_sum -= feedback_score
+        self.accurate -= feedback_score >= self.accurate_threshold
+        self.outcomes[actual_outcome] -= 1
+        if not self.outcomes[actual_outcome]:
+            del self.outcomes[actual_outcome]
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def accuracy(self) -> float:
+        """Share of feedback in the window at or above the accuracy threshold"""
+        return self.accurate / len(self.entries) if self.entries else 0.0
+    
+    def mean_score(self) -> float:
+        """Mean feedback score in the window"""
+        return self.score_sum / len(self.entries) if self.entries else 0.0
+
+# Data version scopes whose writes can change an initialized context
+CONTEXT_VERSION_SCOPES = ('jobs', 'scores', 'interviews', 'job_similarity')
 
 class ModelContextProtocol:
     """
@@ -51,21 +98,140 @@ class ModelContextProtocol:
     and context-aware candidate scoring
     """
     
-    def __init__(self):
+    def __init__(self, context_cache_size: int = 256, context_refresh_seconds: float = 5.0,
+                 feedback_batch_size: int = 20, feedback_flush_seconds: float = 2.0):
         self.model_version = "1.0.0"
-        self.context_weights = {
-            'skills_match': 0.4,
-            'experience_relevance': 0.3,
-            'cultural_fit': 0.15,
-            'growth_potential': 0.15
-        }
-        self.feedback_history = []
+        self.profiles = weight_profiles  # Base context weights come from the active profile
         self.performance_metrics = {
             'accuracy': 0.0,
             'precision': 0.0,
             'recall': 0.0,
             'f1_score': 0.0
         }
+        
+        # Initialized contexts per job: job_id -> (data versions, context), in LRU order
+        self.context_cache_size = context_cache_size
+        self.context_refresh_seconds = context_refresh_seconds
+        self._context_cache = OrderedDict()
+        self._context_lock = threading.Lock()
+        self._context_refresher = None
+        self.context_cache_stats = {'hits': 0, 'misses': 0, 'refreshes': 0}
+        
+        # Feedback is buffered, written to mcp_feedback in batches, and read back
+        # incrementally (id > last seen) so every worker tracks the same window
+        self.feedback_batch_size = feedback_batch_size
+        self.feedback_flush_seconds = feedback_flush_seconds
+        self.feedback_window = FeedbackWindow(size=50)
+        self.feedback_count = 0
+        self._last_feedback_id = None  # None until the first sync
+        self._pending_feedback = []
+        self._feedback_lock = threading.Lock()
+        self._feedback_sync_lock = threading.Lock()
+        self._feedback_flusher = None
+    
+    @property
+    def context_weights(self) -> Dict[str, float]:
+        """Base context weights of the active weight profile"""
+        return dict(self.profiles.current().mcp['context_weights'])
+    
+    def get_context(self, job_id: int) -> MCPContext:
+        """Get the cached context for a job, initializing it on a miss"""
+        with self._context_lock:
+            entry = self._context_cache.get(job_id)
+            if entry is not None:
+                self._context_cache.move_to_end(job_id)
+                self.context_cache_stats['hits'] += 1
+                return entry[1]
+            self.context_cache_stats['misses'] += 1
+        
+        if self.context_cache_size <= 0:
+            return self.initialize_context(job_id)
+        
+        # Read versions first so a write racing the initialization triggers a refresh
+        versions = self._context_versions()
+        context = self.initialize_context(job_id)
+        self._store_context(job_id, versions, context)
+        self._start_context_refresher()
+        return context
+    
+    def invalidate_context(self, job_id: int):
+        """Drop a job's cached context (e.g. after the job is edited or deleted)"""
+        with self._context_lock:
+            self._context_cache.pop(job_id, None)
+    
+    def _context_versions(self) -> Tuple[int, ...]:
+        """Current data versions of the scopes a context depends on"""
+        versions = db.get_data_versions()
+        return tuple(versions.get(scope, 0) for scope in CONTEXT_VERSION_SCOPES)
+    
+    def _store_context(self, job_id: int, versions: Tuple[int, ...], context: MCPContext):
+        """Insert a context into the bounded cache"""
+        with self._context_lock:
+            self._context_cache[job_id] = (versions, context)
+            self._context_cache.move_to_end(job_id)
+            while len(self._context_cache) > self.context_cache_size:
+                self._context_cache.popitem(last=False)
+    
+    def _start_context_refresher(self):
+        """Start the background refresh thread once"""
+        with self._context_lock:
+            if self._context_refresher is not None:
+                return
+            self._context_refresher = threading.Thread(
+                target=self._refresh_contexts_loop, name='mcp-context-refresher', daemon=True
+            )
+        self._context_refresher.start()
+    
+    def _refresh_contexts_loop(self):
+        """Poll data versions and re-initialize cached contexts that went stale"""
+        stop = threading.Event()
+        while not stop.wait(self.context_refresh_seconds):
+            try:
+                self.refresh_stale_contexts()
+            except Exception as e:
+                print(f"Error refreshing MCP contexts: {e}")
+    
+    def refresh_stale_contexts(self) -> int:
+        """Re-initialize cached contexts built from older data versions"""
+        with self._context_lock:
+            if not self._context_cache:
+                return 0
+            cached = [(job_id, entry[0]) for job_id, entry in self._context_cache.items()]
+        
+        versions = self._context_versions()
+        refreshed = 0
+        for job_id, cached_versions in cached:
+            if cached_versions == versions:
+                continue
+            try:
+                context = self.initialize_context(job_id)
+            except ValueError:
+                self.invalidate_context(job_id)  # Job was deleted
+                continue
+            with self._context_lock:
+                # Skip jobs evicted or invalidated while we were rebuilding
+                if job_id not in self._context_cache:
+                    continue
+                self._context_cache[job_id] = (versions, context)
+                self.context_cache_stats['refreshes'] += 1
+            refreshed += 1
+        return refreshed
+    
+    def get_context_cache_stats(self) -> Dict:
+        """Get context cache size and hit rate"""
+        with self._context_lock:
+            hits = self.context_cache_stats['hits']
+            misses = self.context_cache_stats['misses']
+            total_requests = hits + misses
+            return {
+                'entries': len(self._context_cache),
+                'max_entries': self.context_cache_size,
+                'refresh_seconds': self.context_refresh_seconds,
+                'hits': hits,
+                'misses': misses,
+                'refreshes': self.context_cache_stats['refreshes'],
+                'hit_rate': round(hits / total_requests, 4) if total_requests else 0.0
+            }
     
     def initialize_context(self, job_id: int) -> MCPContext:
         """Initialize context for a specific job"""
@@ -89,7 +255,7 @@ class ModelContextProtocol:
         seniority_level = self._determine_seniority(job_title)
         industry = self._classify_industry(job_description)
         
-        # Get historical performance for similar jobs
+        # Get historical performance for this job and its precomputed similar jobs
         cursor.execute('''
             SELECT 
                 cs.final_score,
@@ -98,9 +264,10 @@ class ModelContextProtocol:
             FROM candidate_scores cs
             JOIN candidates c ON cs.candidate_id = c.id
             LEFT JOIN interview_schedules i ON c.id = i.candidate_id
-            JOIN job_descriptions j ON cs.job_id = j.id
-            WHERE j.title LIKE ? OR j.id = ?
-        ''', (f'%{job_type}%', job_id))
+            WHERE cs.job_id IN (
+                SELECT ? UNION SELECT similar_job_id FROM job_similarity WHERE job_id = ?
+            )
+        ''', (job_id, job_id))
         
         historical_data = cursor.fetchall()
         
@@ -122,18 +289,20 @@ class ModelContextProtocol:
             market_conditions=market_conditions
         )
     
-    def process_score_request(self, request: MCPRequest) -> MCPResponse:
+    def process_score_request(self, request: MCPRequest, profile: Optional[WeightProfile] = None) -> MCPResponse:
         """Process a scoring request using MCP"""
         
         # Extract candidate and context data
         candidate = request.candidate_data
         context = request.context
+        profile = profile or self.profiles.current()
+        features = self.pair_features(candidate, context)
         
         # Calculate context-aware scores
-        scores = self._calculate_contextual_scores(candidate, context)
+        scores = self._calculate_contextual_scores(features, context)
         
         # Apply context weights
-        weighted_score = self._apply_context_weights(scores, context)
+        weighted_score = self._apply_context_weights(scores, context, profile)
         
         # Calculate confidence based on data quality and historical performance
         confidence = self._calculate_confidence(candidate, context, scores)
@@ -146,7 +315,7 @@ class ModelContextProtocol:
             'job_type_influence': self._get_job_type_influence(context),
             'market_demand': context.market_conditions.get('demand_score', 0.5),
             'historical_success_rate': context.historical_performance.get('success_rate', 0.0),
-            'skill_rarity': self._calculate_skill_rarity(candidate.get('skills', []), context.required_skills)
+            'skill_rarity': self._calculate_skill_rarity(features.candidate_skills, context.required_skills)
         }
         
         return MCPResponse(
@@ -156,7 +325,8 @@ class ModelContextProtocol:
             reasoning=reasoning,
             context_factors=context_factors,
             model_version=self.model_version,
-            timestamp=datetime.now()
+            timestamp=datetime.now(),
+            weight_profile_version=profile.version
         )
     
     def _classify_job_type(self, title: str, description: str) -> str:
@@ -241,54 +411,47 @@ class ModelContextProtocol:
             'competition_level': 'high' if demand_score > 0.7 else 'medium'
         }
     
-    def _calculate_contextual_scores(self, candidate: Dict, context: MCPContext) -> Dict:
+    def pair_features(self, candidate: Dict, context: MCPContext) -> PairFeatures:
+        """Shared pair features of a candidate against the context's job"""
+        return PairFeatures(candidate, {'id': context.job_id, 'skills': context.required_skills})
+    
+    def _calculate_contextual_scores(self, features: PairFeatures, context: MCPContext) -> Dict:
         """Calculate context-aware scores"""
         scores = {}
         
         # Skills match score with context
-        scores['skills_match'] = self._calculate_skills_match_score(
-            candidate.get('skills', []), 
-            context.required_skills,
-            context.market_conditions
-        )
+        scores['skills_match'] = self._calculate_skills_match_score(features, context.market_conditions)
         
         # Experience relevance score
         scores['experience_relevance'] = self._calculate_experience_relevance(
-            candidate.get('experience_years', 0),
+            features.experience_years,
             context.seniority_level,
             context.job_type
         )
         
         # Cultural fit score (simplified)
         scores['cultural_fit'] = self._calculate_cultural_fit(
-            candidate,
+            features,
             context.industry,
             context.job_type
         )
         
         # Growth potential score
         scores['growth_potential'] = self._calculate_growth_potential(
-            candidate,
+            features,
             context.seniority_level,
             context.historical_performance
         )
         
         return scores
     
-    def _calculate_skills_match_score(self, candidate_skills: List[str], 
-                                    required_skills: List[str], 
-                                    market_conditions: Dict) -> float:
+    def _calculate_skills_match_score(self, features: PairFeatures, market_conditions: Dict) -> float:
         """Calculate skills match with market context"""
-        if not required_skills:
+        if not features.job_skills:
             return 100.0
         
-        candidate_skills_lower = [skill.lower() for skill in candidate_skills]
-        required_skills_lower = [skill.lower() for skill in required_skills]
-        
         # Basic match
-        matched_skills = [skill for skill in required_skills_lower 
-                         if skill in candidate_skills_lower]
-        base_score = (len(matched_skills) / len(required_skills)) * 100
+        base_score = features.exact_overlap * 100
         
         # Market demand bonus
         demand_bonus = market_conditions.get('demand_score', 0) * 10
@@ -318,7 +481,7 @@ class ModelContextProtocol:
             ratio = candidate_experience / expected
             return ratio * 100
     
-    def _calculate_cultural_fit(self, candidate: Dict, industry: str, job_type: str) -> float:
+    def _calculate_cultural_fit(self, features: PairFeatures, industry: str, job_type: str) -> float:
         """Calculate cultural fit score (simplified)"""
         # This is a simplified implementation
         # In practice, this would use more sophisticated analysis
@@ -326,25 +489,25 @@ class ModelContextProtocol:
         base_score = 75.0  # Default cultural fit
         
         # Education alignment
-        education = candidate.get('education_level', '').lower()
+        education = features.education_level_lower
         if 'computer' in education or 'engineering' in education:
             if job_type == 'technical':
                 base_score += 10
         
         # Experience diversity bonus
-        experience_years = candidate.get('experience_years', 0)
+        experience_years = features.experience_years
         if 3 <= experience_years <= 15:  # Sweet spot for adaptability
             base_score += 5
         
         return min(100.0, base_score)
     
-    def _calculate_growth_potential(self, candidate: Dict, seniority_level: str, 
+    def _calculate_growth_potential(self, features: PairFeatures, seniority_level: str, 
                                   historical_performance: Dict) -> float:
         """Calculate growth potential score"""
         base_score = 70.0
         
         # Age and experience balance
-        experience = candidate.get('experience_years', 0)
+        experience = features.experience_years
         
         if seniority_level == 'junior' and experience <= 3:
             base_score += 20  # High growth potential for juniors
@@ -354,15 +517,26 @@ class ModelContextProtocol:
             base_score += 10  # Proven track record
         
         # Education factor
-        education_score = candidate.get('education_score', 0.5)
+        education_score = features.education_score if features.education_score is not None else 0.5
         base_score += education_score * 10
         
         return min(100.0, base_score)
     
-    def _apply_context_weights(self, scores: Dict, context: MCPContext) -> float:
+    def _apply_context_weights(self, scores: Dict, context: MCPContext,
+                               profile: Optional[WeightProfile] = None) -> float:
         """Apply context-specific weights to scores"""
+        weights = self._get_context_weights(context, profile)
+        
+        # Calculate weighted score
+        weighted_score = sum(scores[key] * weights[key] for key in scores.keys())
+        
+        return weighted_score
+    
+    def _get_context_weights(self, context: MCPContext, profile: Optional[WeightProfile] = None) -> Dict[str, float]:
+        """Get the component weights for a context"""
         # Adjust weights based on context
-        weights = self.context_weights.copy()
+        profile = profile or self.profiles.current()
+        weights = dict(profile.mcp['context_weights'])
         
         # Adjust weights based on job type
         if context.job_type == 'technical':
@@ -380,10 +554,7 @@ class ModelContextProtocol:
             weights['experience_relevance'] = 0.4
             weights['skills_match'] = 0.35
         
-        # Calculate weighted score
-        weighted_score = sum(scores[key] * weights[key] for key in scores.keys())
-        
-        return weighted_score
+        return weights
     
     def _calculate_confidence(self, candidate: Dict, context: MCPContext, scores: Dict) -> float:
         """Calculate confidence in the score"""
@@ -461,45 +632,254 @@ class ModelContextProtocol:
         
         return len(candidate_rare_skills) / max(len(candidate_skills), 1)
     
-    def record_feedback(self, request_id: str, actual_outcome: str, feedback_score: float):
-        """Record feedback for continuous learning"""
-        feedback = {
-            'request_id': request_id,
-            'actual_outcome': actual_outcome,
-            'feedback_score': feedback_score,
-            'timestamp': datetime.now().isoformat()
+    def score_candidates_batch(self, context: MCPContext, candidates: List[Dict],
+                               offset: int = 0, limit: int = 50,
+                               profile: Optional[WeightProfile] = None) -> Dict:
+        """Score a candidate pool against one context and return a ranked page
+        
+        Components, weighted scores and confidences are computed as vectors over
+        the whole pool with the same formulas as process_score_request; reasoning
+        and context factors are only generated for the returned page.
+        """
+        total = len(candidates)
+        profile = profile or self.profiles.current()
+        if total == 0:
+            return {'total': 0, 'offset': offset, 'limit': limit, 'weight_profile_version': profile.version, 'results': []}
+        
+        experience = np.array([c.get('experience_years') or 0 for c in candidates], dtype=float)
+        education_scores = np.array(
+            [c['education_score'] if c.get('education_score') is not None else 0.5 for c in candidates], dtype=float
+        )
+        components = {
+            'skills_match': self._batch_skills_match(candidates, context),
+            'experience_relevance': self._batch_experience_relevance(experience, context),
+            'cultural_fit': self._batch_cultural_fit(candidates, experience, context),
+            'growth_potential': self._batch_growth_potential(experience, education_scores, context)
         }
+        component_matrix = np.column_stack(list(components.values()))
+        
+        weights = self._get_context_weights(context, profile)
+        scores = component_matrix @ np.array([weights[key] for key in components])
         
-        self.feedback_history.append(feedback)
+        # Confidence: completeness + historical data + component consistency + market quality
+        completeness = np.array([
+            sum(1 for field in ('skills', 'experience_years', 'education_level') if c.get(field)) / 3
+            for c in candidates
+        ])
+        sample_size = context.historical_performance.get('sample_size', 0)
+        consistency = np.maximum(0, 1 - component_matrix.var(axis=1) / 1000)
+        confidence = (completeness * 0.3 + min(sample_size / 20, 1.0) * 0.3 + consistency * 0.2 + 0.2) * 100
+        
+        # Rank by score, ties keep the input order
+        ranking = np.argsort(-scores, kind='stable')
+        page = ranking[offset:offset + limit]
+        
+        job_type_influence = self._get_job_type_influence(context)
+        results = []
+        for rank, i in enumerate(page, start=offset + 1):
+            candidate = candidates[i]
+            candidate_scores = {key: float(values[i]) for key, values in components.items()}
+            results.append({
+                'rank': rank,
+                'candidate_id': candidate.get('id'),
+                'name': candidate.get('name'),
+                'score': round(float(scores[i]), 2),
+                'confidence': round(float(confidence[i]), 2),
+                'component_scores': {key: round(value, 2) for key, value in candidate_scores.items()},
+                'reasoning': self._generate_reasoning(candidate_scores, context, candidate),
+                'context_factors': {
+                    'job_type_influence': job_type_influence,
+                    'market_demand': context.market_conditions.get('demand_score', 0.5),
+                    'historical_success_rate': context.historical_performance.get('success_rate', 0.0),
+                    'skill_rarity': self._calculate_skill_rarity(candidate.get('skills', []), context.required_skills)
+                }
+            })
+        
+        return {
+            'total': total,
+            'offset': offset,
+            'limit': limit,
+            'weight_profile_version': profile.version,
+            'results': results
+        }
+    
+    def _batch_skills_match(self, candidates: List[Dict], context: MCPContext) -> np.ndarray:
+        """Vectorized _calculate_skills_match_score over a candidate pool"""
+        if not context.required_skills:
+            return np.full(len(candidates), 100.0)
+        
+        # Column per distinct required skill, weighted by how often it is required
+        columns = {}
+        for skill in context.required_skills:
+            columns.setdefault(normalize_skill(skill), len(columns))
+        multiplicity = np.zeros(len(columns))
+        for skill in context.required_skills:
+            multiplicity[columns[normalize_skill(skill)]] += 1
+        
+        has_skill = np.zeros((len(candidates), len(columns)))
+        for i, candidate in enumerate(candidates):
+            for skill in parse_skills(candidate.get('skills')):
+                column = columns.get(normalize_skill(skill))
+                if column is not None:
+                    has_skill[i, column] = 1.0
+        
+        base_scores = has_skill @ multiplicity / len(context.required_skills) * 100
+        demand_bonus = context.market_conditions.get('demand_score', 0) * 10
+        return np.minimum(100.0, base_scores + demand_bonus)
+    
+    def _batch_experience_relevance(self, experience: np.ndarray, context: MCPContext) -> np.ndarray:
+        """Vectorized _calculate_experience_relevance over a candidate pool"""
+        expected = {'junior': 2, 'mid': 5, 'senior': 8, 'management': 10}.get(context.seniority_level, 5)
+        return np.where(experience >= expected, 100.0, experience / expected * 100)
+    
+    def _batch_cultural_fit(self, candidates: List[Dict], experience: np.ndarray, context: MCPContext) -> np.ndarray:
+        """Vectorized _calculate_cultural_fit over a candidate pool"""
+        scores = np.full(len(candidates), 75.0)
+        if context.job_type == 'technical':
+            relevant_education = np.array([
+                'computer' in (c.get('education_level') or '').lower() or
+                'engineering' in (c.get('education_level') or '').lower()
+                for c in candidates
+            ])
+            scores += relevant_education * 10
+        scores += ((experience >= 3) & (experience <= 15)) * 5
+        return np.minimum(100.0, scores)
+    
+    def _batch_growth_potential(self, experience: np.ndarray, education_scores: np.ndarray,
+                                context: MCPContext) -> np.ndarray:
+        """Vectorized _calculate_growth_potential over a candidate pool"""
+        scores = np.full(len(experience), 70.0)
+        if context.seniority_level == 'junior':
+            scores += (experience <= 3) * 20
+        elif context.seniority_level == 'mid':
+            scores += ((experience >= 3) & (experience <= 7)) * 15
+        elif context.seniority_level == 'senior':
+            scores += (experience >= 5) * 10
+        scores += education_scores * 10
+        return np.minimum(100.0, scores)
+    
+    def record_feedback(self, request_id: str, actual_outcome: str, feedback_score: float):
+        """Record feedback for continuous learning"""
+        with self._feedback_lock:
+            self._pending_feedback.append((request_id, actual_outcome, feedback_score, datetime.now().isoformat()))
+            flush_now = len(self._pending_feedback) >= self.feedback_batch_size
         
-        # Update performance metrics
-        self._update_performance_metrics()
+        if flush_now:
+            self.flush_feedback()
+        else:
+            self._start_feedback_flusher()
+    
+    def flush_feedback(self) -> int:
+        """Write buffered feedback in one batch and fold new rows into the metrics"""
+        with self._feedback_lock:
+            pending, self._pending_feedback = self._pending_feedback, []
+        
+        if pending:
+            conn = db.get_connection()
+            try:
+                conn.executemany('''
+                    INSERT INTO mcp_feedback (request_id, actual_outcome, feedback_score, created_at)
+                    VALUES (?, ?, ?, ?)
+                ''', pending)
+                conn.commit()
+            except Exception as e:
+                print(f"Error writing MCP feedback: {e}")
+                with self._feedback_lock:
+                    self._pending_feedback[:0] = pending  # Retry on the next flush
+                return 0
+            finally:
+                conn.close()
+        
+        self._sync_feedback()
+        return len(pending)
+    
+    def _start_feedback_flusher(self):
+        """Start the background flush thread once"""
+        with self._feedback_lock:
+            if self._feedback_flusher is not None:
+                return
+            self._feedback_flusher = threading.Thread(
+                target=self._flush_feedback_loop, name='mcp-feedback-flusher', daemon=True
+            )
+        self._feedback_flusher.start()
+    
+    def _flush_feedback_loop(self):
+        """Flush buffered feedback every few seconds"""
+        stop = threading.Event()
+        while not stop.wait(self.feedback_flush_seconds):
+            try:
+                self.flush_feedback()
+            except Exception as e:
+                print(f"Error flushing MCP feedback: {e}")
+    
+    def _sync_feedback(self):
+        """Fold feedback rows written by any worker since the last sync into the window"""
+        with self._feedback_sync_lock:
+            conn = db.get_connection()
+            cursor = conn.cursor()
+            if self._last_feedback_id is None:
+                # First sync: only the window's worth of rows is needed
+                cursor.execute('SELECT COUNT(*), COALESCE(MAX(id), 0) FROM mcp_feedback')
+                total, max_id = cursor.fetchone()
+                cursor.execute('''
+                    SELECT id, feedback_score, actual_outcome FROM mcp_feedback
+                    ORDER BY id DESC LIMIT ?
+                ''', (self.feedback_window.entries.maxlen,))
+                rows = cursor.fetchall()[::-1]
+                self.feedback_count = total - len(rows)
+                self._last_feedback_id = 0
+            else:
+                cursor.execute('''
+                    SELECT id, feedback_score, actual_outcome FROM mcp_feedback
+                    WHERE id > ? ORDER BY id
+                ''', (self._last_feedback_id,))
+                rows = cursor.fetchall()
+            conn.close()
+            
+            for feedback_id, feedback_score, actual_outcome in rows:
+                self.feedback_window.add(feedback_score, actual_outcome)
+                self.feedback_count += 1
+                self._last_feedback_id = feedback_id
+                self._update_performance_metrics()
     
     def _update_performance_metrics(self):
         """Update model performance metrics based on feedback"""
-        if len(self.feedback_history) < 10:
+        if len(self.feedback_window) < 10:
             return  # Need minimum feedback for meaningful metrics
         
-        # Calculate accuracy, precision, recall, etc.
-        # This is a simplified implementation
-        recent_feedback = self.feedback_history[-50:]  # Last 50 feedback items
-        
-        accurate_predictions = sum(1 for fb in recent_feedback if fb['feedback_score'] >= 0.8)
-        self.performance_metrics['accuracy'] = accurate_predictions / len(recent_feedback)
+        # Rolling accuracy over the last 50 feedback items
+        self.performance_metrics['accuracy'] = self.feedback_window.accuracy()
         
         # Update model version if performance improves significantly
         if self.performance_metrics['accuracy'] > 0.85:
-            self.model_version = f"1.{len(self.feedback_history) // 100}.0"
+            self.model_version = f"1.{self.feedback_count // 100}.0"
     
     def get_model_stats(self) -> Dict:
         """Get current model statistics"""
+        self.flush_feedback()
+        with self._feedback_sync_lock:
+            performance_metrics = dict(self.performance_metrics)
+            feedback_count = self.feedback_count
+            recent_feedback = {
+                'window_size': len(self.feedback_window),
+                'mean_feedback_score': round(self.feedback_window.mean_score(), 4),
+                'outcomes': dict(self.feedback_window.outcomes)
+            }
         return {
             'model_version': self.model_version,
-            'performance_metrics': self.performance_metrics,
-            'feedback_count': len(self.feedback_history),
+            'performance_metrics': performance_metrics,
+            'feedback_count': feedback_count,
+            'recent_feedback': recent_feedback,
             'context_weights': self.context_weights,
+            'weight_profile_version': self.profiles.current().version,
+            'context_cache': self.get_context_cache_stats(),
             'last_updated': datetime.now().isoformat()
         }
 
 # Initialize MCP instance
-mcp = ModelContextProtocol() 
\ No newline at end of file
+mcp = ModelContextProtocol(
+    context_cache_size=config.MCP_CONTEXT_CACHE_SIZE,
+    context_refresh_seconds=config.MCP_CONTEXT_REFRESH_SECONDS,
+    feedback_batch_size=config.MCP_FEEDBACK_BATCH_SIZE,
+    feedback_flush_seconds=config.MCP_FEEDBACK_FLUSH_SECONDS
+) 
\ No newline at end of file
@@ -0,0 +1,248 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from database import db, parse_skills
+from embeddings import EmbeddingStore, embedding_store
+from matcher import RAGMatcher, rag_matcher
+from score_matrix import CANDIDATE_PROFILE_ENTITY, candidate_profile_text
+from hybrid_retrieval import hybrid_retriever
+from embedding_file import candidate_embedding_files
+from scoring_service import scoring_service
+from job_similarity import job_similarity_index
+from talent_pools import talent_pools
+from config import config
+
+# Re-embedding passes before switching: each pass after the first only catches entities edited during the one before
+MAX_PASSES = 3
+
+def _placeholders(ids: List[int]) -> str:
+    return ', '.join('?' for _ in ids)
+
+def job_texts(cursor, ids: List[int]) -> Dict[int, str]:
+    """Embedded text of the given jobs (deleted ones drop out)"""
+    cursor.execute(f'SELECT id, description FROM job_descriptions WHERE id IN ({_placeholders(ids)})', ids)
+    return {job_id: embedding_store.job_text({'description': description}) for job_id, description in cursor.fetchall()}
+
+def candidate_texts(cursor, ids: List[int]) -> Dict[int, str]:
+    """Embedded resume text of the given candidates (deleted ones drop out)"""
+    resume_texts = db.get_resume_texts(ids)
+    cursor.execute(f'SELECT id, skills, education_level FROM candidates WHERE id IN ({_placeholders(ids)})', ids)
+    return {
+        candidate_id: embedding_store.candidate_text(resume_texts.get(candidate_id), parse_skills(skills), education_level)
+        for candidate_id, skills, education_level in cursor.fetchall()
+    }
+
+def candidate_profile_texts(cursor, ids: List[int]) -> Dict[int, str]:
+    """Embedded skills and education text of the given candidates (deleted ones drop out)"""
+    cursor.execute(f'SELECT id, skills, education_level FROM candidates WHERE id IN ({_placeholders(ids)})', ids)
+    return {
+        candidate_id: candidate_profile_text(parse_skills(skills), education_level or '')
+        for candidate_id, skills, education_level in cursor.fetchall()
+    }
+
+# Entity types a swap re-embeds, with how to rebuild each one's text
+ENTITY_TEXTS: Dict[str, Callable] = {
+    'job': job_texts,
+    'candidate': candidate_texts,
+    CANDIDATE_PROFILE_ENTITY: candidate_profile_texts
+}
+
+class ModelSwap:
+    """Zero-downtime embedding model swaps
+    
+    Stored embeddings are keyed by model name, so two models' vectors can
+    sit side by side. A swap loads the new model next to the serving one
+    and, in a background thread, embeds every entity the serving model has
+    a stored vector for, batch by batch, under the new model's name. Only
+    entities without a current vector are encoded, so a swap interrupted
+    by a restart resumes where it stopped, and swapping back to a retired
+    model only re-encodes what changed since. Requests keep using the old
+    model throughout.
+    
+    Once a pass finds nothing left to encode (or after MAX_PASSES, with the
+    remaining edits left to be re-encoded on first use), the matcher's
+    model and name are replaced in one assignment and the model is marked
+    active in the embedding_models registry. Vector work that spans several
+    calls pins one model (EmbeddingStore.pinned, RAGMatcher.encoder), so no
+    request compares vectors of two models, and in-memory indexes reload
+    when the model changes. Other worker processes pick up the new active
+    model from the registry every sync_seconds.
+    """
+    
+    def __init__(self, batch_size: int = 256, sync_seconds: float = 30.0):
+        self.batch_size = batch_size
+        self.sync_seconds = sync_seconds
+        self._lock = threading.Lock()
+        self._building = None  # Model this process is building
+        self._synced = None  # Active model in the registry when this process last looked
+        self._worker = None
+    
+    def start(self, model_name: str, batch_size: Optional[int] = None, background: bool = True) -> Dict:
+        """Start building a model's embeddings, switching to it once they cover every stored entity"""
+        model_name = (model_name or '').strip()
+        batch_size = batch_size or self.batch_size
+        if not model_name:
+            raise ValueError("model_name is required")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        with self._lock:
+            if self._building is not None:
+                raise ValueError(f"Embedding model {self._building} is already being built")
+            if model_name == rag_matcher.model_name:
+                raise ValueError(f"Embedding model {model_name} is already active")
+            self._building = model_name
+        db.save_embedding_model(
+            model_name, status='building', source_model=rag_matcher.model_name, total_vectors=0,
+            checked_vectors=0, encoded_vectors=0, passes=0, error=None
+        )
+        
+        if background:
+            threading.Thread(target=self._run, args=(model_name, batch_size), name='embedding-model-swap', daemon=True).start()
+        else:
+            self._run(model_name, batch_size)
+        return self.get_model(model_name)
+    
+    def _run(self, model_name: str, batch_size: int):
+        """Embed every stored entity with the new model, then switch to it"""
+        try:
+            target = RAGMatcher(model_name)  # No fallback: a swap builds exactly the model asked for
+            store = EmbeddingStore(target)
+            encoded = 0
+            for passes in range(1, MAX_PASSES + 1):
+                encoded_now = self._embed_pass(store, batch_size, passes, encoded)
+                encoded += encoded_now
+                if not encoded_now:
+                    break
+            
+            rag_matcher.activate(target.model, model_name)
+            db.activate_embedding_model(model_name)
+            self._synced = model_name
+            print(f"🔁 Embedding model switched to {model_name}")
+            self._after_switch()
+        except Exception as e:
+            print(f"Error building embedding model {model_name}: {e}")
+            db.save_embedding_model(model_name, status='failed', error=str(e))
+        finally:
+            with self._lock:
+                self._building = None
+    
+    def _embed_pass(self, store: EmbeddingStore, batch_size: int, passes: int, encoded_before: int) -> int:
+        """Embed the entities the serving model has vectors for and the new one lacks, returning how many"""
+        source_model = rag_matcher.model_name
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT entity_type, entity_id FROM embeddings
+            WHERE model_name = ? AND entity_type IN ({_placeholders(list(ENTITY_TEXTS))})
+            ORDER BY entity_type, entity_id
+        ''', (source_model, *ENTITY_TEXTS))
+        entities = {}
+        for entity_type, entity_id in cursor.fetchall():
+            entities.setdefault(entity_type, []).append(entity_id)
+        total = sum(len(ids) for ids in entities.values())
+        db.save_embedding_model(store.model_name, source_model=source_model, total_vectors=total, checked_vectors=0, passes=passes)
+        
+        checked, encoded = 0, 0
+        for entity_type, ids in entities.items():
+            for start in range(0, len(ids), batch_size):
+                chunk = ids[start:start + batch_size]
+                texts = ENTITY_TEXTS[entity_type](cursor, chunk)
+                stale = store.stale_ids(cursor, entity_type, texts)
+                store.get_many(cursor, entity_type, {entity_id: texts[entity_id] for entity_id in stale})
+                conn.commit()
+                checked += len(chunk)
+                encoded += len(stale)
+                db.save_embedding_model(store.model_name, checked_vectors=checked, encoded_vectors=encoded_before + encoded)
+        conn.close()
+        return encoded
+    
+    def _after_switch(self):
+        """Rebuild the derived data that holds the old model's vectors or similarities"""
+        for name, rebuild in (
+            ('job similarity graph', job_similarity_index.rebuild),
+            ('candidate embedding file', hybrid_retriever.refresh_candidate_file),
+            ('talent pools', talent_pools.request_refit),
+            ('stored scores', scoring_service.submit)  # Scores stamped with the old model are stale now
+        ):
+            try:
+                rebuild()
+            except Exception as e:
+                print(f"Error rebuilding {name} after the model swap: {e}")
+    
+    def sync(self) -> bool:
+        """Switch to the registry's active model if another process activated one, returning whether it switched"""
+        active = db.get_active_embedding_model()
+        with self._lock:
+            if not active or active == self._synced or self._building is not None:
+                return False
+        switched = active != rag_matcher.model_name
+        if switched:
+            target = RAGMatcher(active)
+            rag_matcher.activate(target.model, active)
+            print(f"🔁 Embedding model switched to {active}")
+        # Only once it serves, so a model that failed to load is tried again on the next sync
+        self._synced = active
+        return switched
+    
+    def start_sync(self):
+        """Register the serving model if none is active yet (or EMBEDDING_MODEL_FORCE is set), and start following the registry once
+        
+        A fallback serving in place of a model that failed to load is never
+        registered, so one bad start does not pin it: later starts (and this
+        worker's syncs) try the registered or configured model again.
+        """
+        if self._worker is not None:
+            return
+        active = db.get_active_embedding_model()
+        if not rag_matcher.fallback and (active is None or (config.EMBEDDING_MODEL_FORCE and active != rag_matcher.model_name)):
+            db.activate_embedding_model(rag_matcher.model_name)
+        self._synced = rag_matcher.model_name
+        self._worker = threading.Thread(target=self._sync_loop, name='embedding-model-sync', daemon=True)
+        self._worker.start()
+    
+    def _sync_loop(self):
+        while True:
+            time.sleep(self.sync_seconds)
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Error switching to the active embedding model: {e}")
+    
+    def get_model(self, model_name: str) -> Optional[Dict]:
+        """A registered model with its build progress"""
+        for model in db.get_embedding_models():
+            if model['model_name'] == model_name:
+                return self.report(model)
+        return None
+    
+    @staticmethod
+    def report(model: Dict) -> Dict:
+        total = model.get('total_vectors') or 0
+        return {
+            **model,
+            'coverage_percent': round(100.0 * (model.get('checked_vectors') or 0) / total, 2) if total else None
+        }
+    
+    def status(self) -> Dict:
+        """The active, loaded and building models, and every model with stored vectors"""
+        return {
+            'active_model': db.get_active_embedding_model(),
+            'loaded_model': rag_matcher.model_name,
+            'fallback': rag_matcher.fallback,
+            'requested_model': rag_matcher.requested_model_name,
+            'building_model': self._building,
+            'models': [self.report(model) for model in db.get_embedding_models()]
+        }
+    
+    def delete_model(self, model_name: str) -> Optional[int]:
+        """Delete the stored vectors of a model no longer in use, or None if it has none and is not registered"""
+        with self._lock:
+            if model_name in (rag_matcher.model_name, db.get_active_embedding_model(), self._building):
+                raise ValueError(f"Embedding model {model_name} is in use and cannot be deleted")
+            if self.get_model(model_name) is None:
+                return None
+            candidate_embedding_files.delete(model_name)
+            return db.delete_embedding_model(model_name)
+
+# Initialize model swap instance
+model_swap = ModelSwap(batch_size=config.EMBEDDING_SWAP_BATCH_SIZE, sync_seconds=config.EMBEDDING_MODEL_SYNC_SECONDS) 
\ No newline at end of file
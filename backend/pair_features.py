@@ -0,0 +1,226 @@
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from database import parse_skills
+
+EDUCATION_HIERARCHY = {
+    'high school': 0.1,
+    'secondary': 0.1,
+    'certificate': 0.2,
+    'diploma': 0.4,
+    'bachelor': 0.6,
+    'bachelors': 0.6,
+    'bs': 0.6,
+    'ba': 0.6,
+    'btech': 0.6,
+    'be': 0.6,
+    'master': 0.8,
+    'masters': 0.8,
+    'mba': 0.8,
+    'ms': 0.8,
+    'ma': 0.8,
+    'mtech': 0.8,
+    'phd': 1.0,
+    'ph.d': 1.0,
+    'doctorate': 1.0,
+    'doctoral': 1.0
+}
+
+# Similarity (0-100) above which two differently named skills count as the same
+SKILL_SIMILARITY_THRESHOLD = 70
+
+Encoder = Callable[[List[str]], np.ndarray]
+
+def normalize_skill(skill) -> str:
+    """Canonical form skills are compared in"""
+    return str(skill).lower().strip()
+
+def required_education_score(required_education: str) -> float:
+    """Education hierarchy score of a job's requirement (bachelor level if unknown)"""
+    return EDUCATION_HIERARCHY.get((required_education or '').lower(), 0.6)
+
+def _default_encoder() -> Encoder:
+    """Encoder bound to the shared matcher's current model (imported lazily: matcher builds on this module)"""
+    from matcher import rag_matcher
+    return rag_matcher.encoder()
+
+class TextVectors:
+    """Unit vectors of texts, encoded on first use and shared by every pair that needs them"""
+    
+    def __init__(self, encode: Optional[Encoder] = None):
+        self._encode = encode or _default_encoder()
+        self._vectors = {}
+    
+    def warm(self, texts: List[str]):
+        """Encode the texts not seen yet in a single batch"""
+        missing = list(dict.fromkeys(text for text in texts if text not in self._vectors))
+        if missing:
+            for text, vector in zip(missing, self._encode(missing)):
+                self._vectors[text] = vector
+    
+    def add(self, texts: List[str], vectors: np.ndarray):
+        """Use vectors encoded elsewhere (stored embeddings, an index) for the given texts"""
+        for text, vector in zip(texts, vectors):
+            self._vectors.setdefault(text, vector)
+    
+    def get(self, texts: List[str]) -> np.ndarray:
+        """Vectors of texts as a (len(texts), dim) matrix"""
+        self.warm(texts)
+        return np.array([self._vectors[text] for text in texts])
+
+class PairFeatures:
+    """Features of one candidate-job pair, computed once and shared by every scorer
+    
+    Skill sets, overlap counts and experience/education gaps are computed up
+    front. Features that need the embedding model (semantic skill matches and
+    resume/description similarity) are computed on first access, so scorers
+    that only use exact overlap never encode anything.
+    """
+    
+    def __init__(self, candidate_data: Dict, job_data: Dict, encode: Optional[Encoder] = None,
+                 vectors: Optional[TextVectors] = None):
+        self._vectors = vectors or TextVectors(encode)
+        
+        # Skills (job rows store them as a JSON string, request payloads as lists)
+        self.candidate_skills = parse_skills(candidate_data.get('skills'))
+        self.job_skills = parse_skills(job_data.get('skills'))
+        self.candidate_skill_set = {normalize_skill(skill) for skill in self.candidate_skills}
+        self.job_skill_set = {normalize_skill(skill) for skill in self.job_skills}
+        self.exact_matches = sum(1 for skill in self.job_skills if normalize_skill(skill) in self.candidate_skill_set)
+        self.exact_overlap = self.exact_matches / len(self.job_skills) if self.job_skills else 1.0
+        self.extra_skill_count = len(self.candidate_skill_set - self.job_skill_set)
+        self.missing_skill_ratio = (
+            len(self.job_skill_set - self.candidate_skill_set) / len(self.job_skill_set) if self.job_skill_set else 0.0
+        )
+        
+        # Experience
+        self.experience_years = candidate_data.get('experience_years') or 0
+        self.required_experience = job_data.get('experience_years') or 0
+        self.experience_gap = max(0, self.required_experience - self.experience_years)
+        if self.required_experience == 0 or self.experience_years >= self.required_experience:
+            self.experience_ratio = 1.0
+        else:
+            self.experience_ratio = self.experience_years / self.required_experience
+        
+        # Education
+        self.education_level = candidate_data.get('education_level') or ''
+        self.education_level_lower = self.education_level.lower()
+        self.education_score = candidate_data.get('education_score')
+        self.required_education_score = required_education_score(job_data.get('education_requirement', 'Bachelor'))
+        candidate_education_score = self.education_score or 0.0
+        self.education_gap = max(0, self.required_education_score - candidate_education_score)
+        self.education_ratio = min(1.0, candidate_education_score / self.required_education_score)
+        
+        self._job_text = job_data.get('description') or ''
+        self._skill_matches = None
+        self._semantic_similarity = None
+    
+    @property
+    def candidate_text(self) -> str:
+        """Text compared with the job description for semantic similarity"""
+        return f"{' '.join(self.candidate_skills)} {self.education_level}"
+    
+    def embedding_texts(self) -> List[str]:
+        """Texts the semantic features of this pair still need to encode"""
+        return self.similarity_texts() + self.skill_texts()
+    
+    def similarity_texts(self) -> List[str]:
+        """Texts the resume/description similarity still needs to encode"""
+        if self._semantic_similarity is None:
+            return [self.candidate_text, self._job_text]
+        return []
+    
+    def skill_texts(self) -> List[str]:
+        """Skills the semantic skill matching still needs to encode"""
+        if self._skill_matches is None and self.candidate_skills and self.job_skills and (
+            self.job_skill_set - self.candidate_skill_set or self.candidate_skill_set - self.job_skill_set
+        ):
+            return self.job_skills + self.candidate_skills
+        return []
+    
+    def reuse(self, skill_matches: Optional[Dict] = None, semantic_similarity: Optional[float] = None):
+        """Use previously stored semantic features instead of recomputing them"""
+        if skill_matches is not None:
+            self._skill_matches = skill_matches
+        if semantic_similarity is not None:
+            self._semantic_similarity = semantic_similarity
+    
+    @property
+    def skill_matches(self) -> Dict:
+        """Matched, missing and extra skills, counting semantically similar skills as matches"""
+        if self._skill_matches is None:
+            self._skill_matches = self._compute_skill_matches()
+        return self._skill_matches
+    
+    def _compute_skill_matches(self) -> Dict:
+        """Exact matches first, then one similarity matrix for the remaining skill pairs"""
+        candidate_skills, job_skills = self.candidate_skills, self.job_skills
+        if not candidate_skills or not job_skills:
+            return {
+                'match_score': 0.0,
+                'matched_skills': [],
+                'missing_skills': job_skills,
+                'extra_skills': candidate_skills
+            }
+        
+        unmatched_job = [i for i, skill in enumerate(job_skills) if normalize_skill(skill) not in self.candidate_skill_set]
+        unmatched_candidate = [i for i, skill in enumerate(candidate_skills) if normalize_skill(skill) not in self.job_skill_set]
+        similar = np.zeros((len(job_skills), len(candidate_skills)), dtype=bool)
+        if unmatched_job or unmatched_candidate:
+            try:
+                job_vectors = self._vectors.get(job_skills)
+                candidate_vectors = self._vectors.get(candidate_skills)
+                similar = (job_vectors @ candidate_vectors.T) * 100 > SKILL_SIMILARITY_THRESHOLD
+            except Exception as e:
+                print(f"Error computing skill similarity: {e}")
+        
+        unmatched_job = set(unmatched_job)
+        matched_skills = [skill for i, skill in enumerate(job_skills) if i not in unmatched_job or similar[i].any()]
+        missing_skills = [job_skills[i] for i in sorted(unmatched_job) if not similar[i].any()]
+        extra_skills = [candidate_skills[j] for j in unmatched_candidate if not similar[:, j].any()]
+        
+        return {
+            'match_score': round(len(matched_skills) / len(job_skills) * 100, 2),
+            'matched_skills': matched_skills,
+            'missing_skills': missing_skills,
+            'extra_skills': extra_skills
+        }
+    
+    @property
+    def semantic_similarity(self) -> float:
+        """Similarity (0-100) between the candidate's skills/education and the job description"""
+        if self._semantic_similarity is None:
+            try:
+                candidate_vector, job_vector = self._vectors.get([self.candidate_text, self._job_text])
+                self._semantic_similarity = float(candidate_vector @ job_vector * 100)
+            except Exception as e:
+                print(f"Error computing text similarity: {e}")
+                self._semantic_similarity = 0.0
+        return self._semantic_similarity
+
+class PairFeatureCache:
+    """Pair features for one request, keyed by (candidate id, job id)
+    
+    Text embeddings are shared across every pair in the cache, so a job's
+    description and skills are encoded once however many candidates it is
+    compared with.
+    """
+    
+    def __init__(self, encode: Optional[Encoder] = None):
+        self.vectors = TextVectors(encode)
+        self._pairs = {}
+    
+    def get(self, candidate_data: Dict, job_data: Dict) -> PairFeatures:
+        """Get the features of a pair, computing them on first use"""
+        key = (candidate_data.get('id'), job_data.get('id'))
+        if None in key:
+            return PairFeatures(candidate_data, job_data, vectors=self.vectors)
+        features = self._pairs.get(key)
+        if features is None:
+            features = self._pairs[key] = PairFeatures(candidate_data, job_data, vectors=self.vectors)
+        return features
+    
+    def warm(self, candidates: List[Dict], job_data: Dict) -> List[PairFeatures]:
+        """Get the features of many candidates against a job, encoding all their texts in one batch"""
+        features = [self.get(candidate, job_data) for candidate in candidates]
+        self.vectors.warm([text for pair in features for text in pair.embedding_texts()])
+        return features 
\ No newline at end of file
@@ -0,0 +1,51 @@
+import heapq
+from typing import Callable, List, Sequence, Tuple
+import numpy as np
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Rows of the k best scores, best first, without sorting the whole array"""
+    if k >= len(scores):
+        return np.argsort(-scores, kind='stable')
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    # Admit rows tied with the k-th score so the row-order tie-break stays exact
+    threshold = scores[candidates].min()
+    candidates = np.flatnonzero(scores >= threshold)
+    return candidates[np.lexsort((candidates, -scores[candidates]))][:k]
+
+def bounded_top_k(upper_bounds: Sequence[float], score_rows: Callable[[List[int]], List[float]],
+                  k: int, batch_size: int = 32) -> Tuple[List[Tuple[int, float]], int]:
+    """Exact top-k (row, score) pairs, best first, scoring only rows that can still make the cut
+    
+    Rows are visited in descending upper-bound order and scored in batches
+    by `score_rows`; a min-heap holds the best k so far. Once the next
+    row's bound cannot beat the k-th score, no later row can either and the
+    scan stops. Ties are broken by row order, as a stable sort would, so the
+    result equals the first k of a full sort. Also returns how many rows
+    were scored.
+    """
+    bounds = np.asarray(upper_bounds, dtype=np.float64)
+    order = np.argsort(-bounds, kind='stable')
+    heap = []  # (score, -row): the smallest key is the current k-th best
+    scored = 0
+    position = 0
+    while position < len(order) and k > 0:
+        batch = []
+        while position < len(order) and len(batch) < batch_size:
+            row = int(order[position])
+            if len(heap) == k and (bounds[row], -row) < heap[0]:
+                position = len(order)  # Bounds only decrease from here on
+                break
+            batch.append(row)
+            position += 1
+        if not batch:
+            break
+        
+        for row, score in zip(batch, score_rows(batch)):
+            key = (score, -row)
+            if len(heap) < k:
+                heapq.heappush(heap, key)
+            elif key > heap[0]:
+                heapq.heapreplace(heap, key)
+        scored += len(batch)
+    
+    return [(-negative_row, score) for score, negative_row in sorted(heap, reverse=True)], scored 
\ No newline at end of file
@@ -171,8 +171,8 @@ class ResumeParser:
         
         return highest_level, highest_score
     
-    def parse_resume(self, file_path: str) -> Dict:
-        """Parse resume and extract all relevant information"""
+    def extract_text(self, file_path: str) -> str:
+        """Extract the raw text of a resume file"""
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"Resume file not found: {file_path}")
         
@@ -180,13 +180,17 @@ class ResumeParser:
         file_extension = os.path.splitext(file_path)[1].lower()
         
         if file_extension == '.pdf':
-            text = self.extract_text_from_pdf(file_path)
+            return self.extract_text_from_pdf(file_path)
         elif file_extension in ['.txt', '.text']:
             # Handle text files for testing
             with open(file_path, 'r', encoding='utf-8') as f:
-                text = f.read()
+                return f.read()
         else:
             raise ValueError(f"Unsupported file format: {file_extension}. Only PDF and TXT files are supported.")
+    
+    def parse_resume(self, file_path: str) -> Dict:
+        """Parse resume and extract all relevant information"""
+        text = self.extract_text(file_path)
         
         if not text.strip():
             raise ValueError("Could not extract text from file")
@@ -206,7 +210,8 @@ class ResumeParser:
             'experience_years': experience_years,
             'education_level': education_level,
             'education_score': education_score,
-            'resume_path': file_path
+            'resume_path': file_path,
+            'resume_text': text  # Stored compressed and full-text indexed on insert
         }
 
 # Initialize parser instance
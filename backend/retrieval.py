@@ -0,0 +1,232 @@
+import re
+import time
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from matcher import rag_matcher
+from scorer import mcp_scorer
+from pair_features import PairFeatures, PairFeatureCache
+from jd_parser import jd_parser
+from ranking import top_k_rows, bounded_top_k
+from config import config
+
+# Weights compute_overall_match gives its components; stage one stands word overlap in for semantic
+LEXICAL_WEIGHTS = {'skills': 0.4, 'experience': 0.3, 'education': 0.1, 'words': 0.2}
+TOKEN_PATTERN = re.compile(r'[a-z0-9+#]+')
+
+def tokenize(text: str) -> Set[str]:
+    """Lowercase word set of a text"""
+    return set(TOKEN_PATTERN.findall((text or '').lower()))
+
+def required_experience(job_data: Dict) -> int:
+    """Years of experience a job asks for: its stated experience_years, else what jd_parser finds in its text
+    
+    Stored jobs carry no experience_years column, so the requirement is
+    parsed from the description and requirements the way the upload
+    endpoints parse it.
+    """
+    if job_data.get('experience_years'):
+        return job_data['experience_years']
+    text = ' '.join(str(part) for part in (job_data.get('description'), job_data.get('requirements')) if part)
+    return jd_parser.extract_experience_requirements(text)
+
+class CandidateRetriever:
+    """Two-stage candidate ranking for a job
+    
+    Stage one looks at every candidate using only features that need no
+    embedding model: exact skill overlap, experience and education ratios,
+    and how many of the candidate's skill/education words appear in the job
+    description. Candidates failing the prefilters are dropped, and the top_n
+    survivors by that lexical score go on to stage two. Stage two computes
+    semantic similarity (one batch encode) and the MCP score for those
+    survivors only, visiting them in upper-bound order and stopping once
+    no remaining survivor can make the top_k.
+    """
+    
+    def __init__(self, top_n: int = 100, min_skill_overlap: int = 1,
+                 max_experience_gap: int = 5, min_education_ratio: float = 0.0):
+        self.top_n = top_n
+        self.min_skill_overlap = min_skill_overlap
+        self.max_experience_gap = max_experience_gap
+        self.min_education_ratio = min_education_ratio
+    
+    def lexical_scores(self, features: List[PairFeatures], job_data: Dict) -> np.ndarray:
+        """Stage one score (0-100) of every pair, on the same scale as the RAG match score"""
+        if not features:
+            return np.zeros(0)
+        job_words = tokenize(job_data.get('description'))
+        columns = np.array([
+            (
+                pair.exact_overlap,
+                pair.experience_ratio,
+                pair.education_ratio,
+                len(tokenize(pair.candidate_text) & job_words) / max(1, len(tokenize(pair.candidate_text)))
+            )
+            for pair in features
+        ], dtype=np.float64)
+        return columns @ np.array([LEXICAL_WEIGHTS[c] for c in ('skills', 'experience', 'education', 'words')]) * 100
+    
+    def prefilter(self, features: List[PairFeatures], min_skill_overlap: int, max_experience_gap: Optional[int],
+                  min_education_ratio: float, required_years: int = 0) -> np.ndarray:
+        """Mask of the pairs that pass the cheap thresholds (required_years: the job's experience requirement)"""
+        mask = np.ones(len(features), dtype=bool)
+        if not features:
+            return mask
+        job_skill_count = len(features[0].job_skills)
+        if job_skill_count and min_skill_overlap > 0:
+            exact_matches = np.array([pair.exact_matches for pair in features])
+            mask &= exact_matches >= min(min_skill_overlap, job_skill_count)
+        if max_experience_gap is not None and required_years:
+            experience_years = np.array([pair.experience_years for pair in features])
+            mask &= required_years - experience_years <= max_experience_gap
+        if min_education_ratio > 0:
+            mask &= np.array([pair.education_ratio for pair in features]) >= min_education_ratio
+        return mask
+    
+    def _score_pair(self, job_data: Dict, candidate: Dict, pair: PairFeatures, profile) -> Dict:
+        """Full RAG + MCP scoring of one pair"""
+        match_result = rag_matcher.compute_overall_match(candidate, job_data, pair)
+        mcp_result = mcp_scorer.compute_mcp_score(
+            candidate, job_data, match_result['final_score'], profile=profile, features=pair
+        )
+        return {
+            'candidate_id': candidate['id'],
+            'name': candidate.get('name'),
+            'email': candidate.get('email'),
+            'final_score': mcp_result['final_score'],
+            'match_score': match_result['final_score'],
+            'semantic_similarity': match_result['semantic_similarity'],
+            'skills_match': {
+                'match_score': match_result['skills_match']['match_score'],
+                'matched_skills': match_result['skills_match']['matched_skills'],
+                'missing_skills': match_result['skills_match']['missing_skills']
+            },
+            'experience_match': match_result['experience_match'],
+            'education_match': match_result['education_match']
+        }
+    
+    def _score(self, job_data: Dict, candidates: List[Dict], features: List[PairFeatures],
+               cache: PairFeatureCache, profile) -> List[Dict]:
+        """Score every pair, encoding all their missing texts in one batch, best first"""
+        cache.vectors.warm([text for pair in features for text in pair.embedding_texts()])
+        scored = [self._score_pair(job_data, candidate, pair, profile) for candidate, pair in zip(candidates, features)]
+        scored.sort(key=lambda item: (-item['final_score'], item['candidate_id']))
+        return scored
+    
+    def _top_k(self, job_data: Dict, candidates: List[Dict], features: List[PairFeatures],
+               cache: PairFeatureCache, profile, top_k: int) -> Tuple[List[Dict], int]:
+        """Exactly the first top_k of _score, skipping resume/description similarity where it cannot matter
+        
+        The MCP score grows with the match score, so the MCP score of the
+        match score's upper bound bounds it. Also returns how many pairs
+        needed the similarity.
+        """
+        # Candidate id order, so row-order tie-breaking matches _score
+        order = sorted(range(len(candidates)), key=lambda row: candidates[row]['id'])
+        candidates = [candidates[row] for row in order]
+        features = [features[row] for row in order]
+        
+        cache.vectors.warm([skill for pair in features for skill in pair.skill_texts()])
+        bounds = [
+            mcp_scorer.compute_mcp_score(
+                candidate, job_data, rag_matcher.match_score_upper_bound(pair), profile=profile, features=pair
+            )['final_score']
+            for candidate, pair in zip(candidates, features)
+        ]
+        scored = {}
+        
+        def score_rows(rows: List[int]) -> List[float]:
+            cache.vectors.warm([text for row in rows for text in features[row].similarity_texts()])
+            for row in rows:
+                scored[row] = self._score_pair(job_data, candidates[row], features[row], profile)
+            return [scored[row]['final_score'] for row in rows]
+        
+        top, scored_count = bounded_top_k(bounds, score_rows, top_k)
+        return [scored[row] for row, _ in top], scored_count
+    
+    def rank(self, job_data: Dict, candidates: List[Dict], top_k: int = 20, top_n: Optional[int] = None,
+             min_skill_overlap: Optional[int] = None, max_experience_gap: Optional[int] = None,
+             min_education_ratio: Optional[float] = None, evaluate: bool = False) -> Dict:
+        """Rank candidates for a job, running semantic and MCP scoring only on the top_n stage one survivors
+        
+        With `evaluate`, the whole pool is also scored exhaustively and
+        recall@k of the two-stage shortlist against it is reported.
+        """
+        top_n = self.top_n if top_n is None else top_n
+        min_skill_overlap = self.min_skill_overlap if min_skill_overlap is None else min_skill_overlap
+        max_experience_gap = self.max_experience_gap if max_experience_gap is None else max_experience_gap
+        min_education_ratio = self.min_education_ratio if min_education_ratio is None else min_education_ratio
+        if top_k < 1:
+            raise ValueError("top_k must be at least 1")
+        if top_n < top_k:
+            raise ValueError("top_n must be at least top_k")
+        profile = mcp_scorer.profiles.current()
+        
+        # Stage one: cheap features of the whole pool, prefilters and lexical shortlist
+        start = time.perf_counter()
+        cache = PairFeatureCache(rag_matcher.encoder())
+        features = [cache.get(candidate, job_data) for candidate in candidates]
+        lexical = self.lexical_scores(features, job_data)
+        required_years = required_experience(job_data)
+        passed = np.flatnonzero(
+            self.prefilter(features, min_skill_overlap, max_experience_gap, min_education_ratio, required_years)
+        )
+        survivors = passed[top_k_rows(lexical[passed], top_n)]
+        stage_one_ms = (time.perf_counter() - start) * 1000
+        
+        # Stage two: semantic and MCP scoring of the survivors that can still make the top_k
+        start = time.perf_counter()
+        ranked, semantic_scored = self._top_k(
+            job_data, [candidates[i] for i in survivors], [features[i] for i in survivors], cache, profile, top_k
+        )
+        lexical_by_id = {candidates[i]['id']: round(float(lexical[i]), 2) for i in survivors}
+        results = []
+        for rank, item in enumerate(ranked, start=1):
+            results.append({**item, 'rank': rank, 'lexical_score': lexical_by_id[item['candidate_id']]})
+        stage_two_ms = (time.perf_counter() - start) * 1000
+        
+        report = {
+            'job_id': job_data.get('id'),
+            'total_candidates': len(candidates),
+            'passed_prefilter': len(passed),
+            'stage_two_candidates': len(survivors),
+            'semantic_scored': semantic_scored,
+            'top_k': top_k,
+            'top_n': top_n,
+            'filters': {
+                'min_skill_overlap': min_skill_overlap,
+                'max_experience_gap': max_experience_gap,
+                'required_experience': required_years,
+                'min_education_ratio': min_education_ratio
+            },
+            'weight_profile_version': profile.version,
+            'results': results,
+            'timings_ms': {'stage_one': round(stage_one_ms, 2), 'stage_two': round(stage_two_ms, 2)}
+        }
+        if evaluate:
+            report['evaluation'] = self._evaluate(job_data, candidates, profile, results, top_k)
+        return report
+    
+    def _evaluate(self, job_data: Dict, candidates: List[Dict], profile, results: List[Dict], top_k: int) -> Dict:
+        """Recall@k of the two-stage shortlist against exhaustive scoring of the whole pool"""
+        # Fresh features and embeddings, so the timing is that of a cold exhaustive ranking
+        start = time.perf_counter()
+        cache = PairFeatureCache(rag_matcher.encoder())
+        features = [cache.get(candidate, job_data) for candidate in candidates]
+        exhaustive = self._score(job_data, candidates, features, cache, profile)[:top_k]
+        exhaustive_ms = (time.perf_counter() - start) * 1000
+        
+        expected = [item['candidate_id'] for item in exhaustive]
+        found = {item['candidate_id'] for item in results}
+        return {
+            'recall_at_k': round(len(found.intersection(expected)) / len(expected), 4) if expected else 1.0,
+            'missed_candidate_ids': [candidate_id for candidate_id in expected if candidate_id not in found],
+            'exhaustive_ms': round(exhaustive_ms, 2)
+        }
+
+# Initialize candidate retriever instance
+candidate_retriever = CandidateRetriever(
+    top_n=config.RETRIEVAL_TOP_N,
+    min_skill_overlap=config.RETRIEVAL_MIN_SKILL_OVERLAP,
+    max_experience_gap=config.RETRIEVAL_MAX_EXPERIENCE_GAP,
+    min_education_ratio=config.RETRIEVAL_MIN_EDUCATION_RATIO
+) 
\ No newline at end of file
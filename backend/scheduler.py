@@ -329,6 +329,7 @@ class InterviewScheduler:
                 WHERE id = ?
             ''', (new_slot_id,))
             
+            db.bump_data_version(cursor, 'interviews', 'slots')
             conn.commit()
             conn.close()
             
@@ -382,6 +383,7 @@ class InterviewScheduler:
                 WHERE slot_datetime = ? AND interviewer_name = ?
             ''', (scheduled_time, interviewer_name))
             
+            db.bump_data_version(cursor, 'interviews', 'slots')
             conn.commit()
             conn.close()
             
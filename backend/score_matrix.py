@@ -0,0 +1,403 @@
+import argparse
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterator, List, Optional
+import numpy as np
+from scipy import sparse
+from database import db, parse_skills
+from embeddings import embedding_store
+from scorer import mcp_scorer
+from pair_features import SKILL_SIMILARITY_THRESHOLD, normalize_skill, required_education_score
+from config import config
+
+# Embedded text of a candidate for the resume/description similarity (PairFeatures.candidate_text)
+CANDIDATE_PROFILE_ENTITY = 'candidate_profile'
+RESUMABLE_STATUSES = ('interrupted', 'failed')
+
+class LeaseLost(Exception):
+    """Another worker took over a run whose lease expired"""
+
+def candidate_profile_text(skills: List[str], education_level: str) -> str:
+    """Text stored under CANDIDATE_PROFILE_ENTITY for a candidate"""
+    return f"{' '.join(skills)} {education_level}"
+
+def round_scores(values: np.ndarray) -> np.ndarray:
+    """Round to 2 decimals with the same results as Python's round() on each value"""
+    rounded = np.round(values, 2)
+    # rint(x * 100) / 100 only differs from correct rounding when x * 100 is within float error of a tie
+    scaled = values * 100
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        rounded[near_tie] = [round(value, 2) for value in values[near_tie].tolist()]
+    return rounded
+
+def incidence(rows: List[List[int]], width: int) -> sparse.csr_matrix:
+    """Sparse 0/1 matrix with the given column indices set in each row"""
+    indptr = np.cumsum([0] + [len(columns) for columns in rows])
+    indices = np.fromiter((column for columns in rows for column in columns), dtype=np.int64, count=indptr[-1])
+    matrix = sparse.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, indptr), shape=(len(rows), width))
+    matrix.sum_duplicates()
+    return matrix
+
+class ScoreMatrixBuilder:
+    """Scores every candidate against every job in bulk and stores the rows in candidate_scores
+    
+    The jobs are loaded once as matrices: stored description embeddings, a
+    skill-by-job occurrence matrix over the job skill vocabulary, and per-job
+    MCP context weights and adjustment flags. Candidates (other than flagged
+    near-duplicates) then go through in id-ordered chunks, each scored
+    against all jobs at once:
+      - semantic similarity: one multiply of the chunk's stored profile
+        embeddings with the job embedding matrix
+      - skill matches: a sparse candidate-by-skill matrix (exact and
+        above-threshold similar skills) times the skill-by-job matrix
+      - experience, education and the MCP score: broadcast array arithmetic
+        following RAGMatcher and MCPScorer operation for operation
+    Each chunk is written with one bulk upsert and recorded in its
+    score_matrix_runs row, so an interrupted run resumes after its last
+    chunk. Score distribution sketches are rebuilt whenever a run stops.
+    
+    A running run is leased to the worker scoring it, and every chunk
+    renews the lease. Only one run can hold a live lease, across all
+    processes; a run whose lease went lease_seconds without renewal is
+    reported as interrupted and can be resumed by any worker, and the
+    worker that lost it stops at its next chunk.
+    """
+    
+    def __init__(self, chunk_size: int = 500, lease_seconds: float = 600.0):
+        self.chunk_size = chunk_size
+        self.lease_seconds = lease_seconds
+        self._skill_vectors = {}  # Raw skill text -> vector, shared by every chunk of a run
+        self._skill_model = None
+    
+    def _skill_matrix(self, skills: List[str], store) -> np.ndarray:
+        """Vectors of skills under the store's model, encoding the unseen ones in one batch"""
+        if store.model_name != self._skill_model:
+            self._skill_vectors, self._skill_model = {}, store.model_name
+        missing = [skill for skill in skills if skill not in self._skill_vectors]
+        if missing:
+            self._skill_vectors.update(zip(missing, store.encode(missing)))
+        return np.vstack([self._skill_vectors[skill] for skill in skills])
+    
+    def _load_jobs(self, profile) -> Dict:
+        """Job-side matrices and per-job constants every candidate chunk is scored against
+        
+        The embedding model is pinned here for the whole run, so a model swap
+        during the run does not mix vectors of two models.
+        """
+        jobs = sorted(db.get_all_job_descriptions(), key=lambda job: job['id'])
+        store = embedding_store.pinned()
+        if not jobs:
+            return {'store': store, 'jobs': []}  # Nothing to score against; the run completes with 0 pairs
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        vectors = store.get_many(cursor, 'job', {job['id']: store.job_text(job) for job in jobs})
+        conn.commit()
+        conn.close()
+        
+        job_skills = [parse_skills(job['skills']) for job in jobs]
+        vocabulary = list(dict.fromkeys(skill for skills in job_skills for skill in skills))
+        positions = {skill: i for i, skill in enumerate(vocabulary)}
+        normalized = list(dict.fromkeys(normalize_skill(skill) for skill in vocabulary))
+        normalized_positions = {skill: i for i, skill in enumerate(normalized)}
+        job_skill_sets = [{normalize_skill(skill) for skill in skills} for skills in job_skills]
+        
+        weights = [
+            mcp_scorer.get_context_weights(job.get('title') or '', job.get('description') or '', profile)
+            for job in jobs
+        ]
+        titles = [(job.get('title') or '').lower() for job in jobs]
+        descriptions = [(job.get('description') or '').lower() for job in jobs]
+        return {
+            'store': store,
+            'jobs': jobs,
+            'skills': job_skills,
+            'occurrences': [[positions[skill] for skill in skills] for skills in job_skills],
+            'embeddings': np.vstack([vectors[job['id']] for job in jobs]),
+            'vocabulary': vocabulary,
+            'vocabulary_vectors': self._skill_matrix(vocabulary, store) if vocabulary else None,
+            'normalized_positions': normalized_positions,
+            # Normalized skill -> raw vocabulary entries it exactly matches
+            'exact': incidence(
+                [[positions[raw] for raw in vocabulary if normalize_skill(raw) == skill] for skill in normalized],
+                len(vocabulary)
+            ),
+            'skill_by_job': incidence([[positions[skill] for skill in skills] for skills in job_skills], len(vocabulary)).T.tocsr(),
+            'normalized_by_job': incidence(
+                [[normalized_positions[skill] for skill in skills] for skills in job_skill_sets], len(normalized)
+            ).T.tocsr(),
+            'skill_counts': np.array([len(skills) for skills in job_skills], dtype=np.float64),
+            'skill_set_sizes': np.array([len(skills) for skills in job_skill_sets], dtype=np.float64),
+            'required_experience': np.array([job.get('experience_years') or 0 for job in jobs], dtype=np.float64),
+            'required_education': np.array(
+                [required_education_score(job.get('education_requirement', 'Bachelor')) for job in jobs], dtype=np.float64
+            ),
+            'match_weight': np.array([w['match_score'] for w in weights]),
+            'experience_weight': np.array([w['experience'] for w in weights]),
+            'education_weight': np.array([w['education'] for w in weights]),
+            'senior': np.array(['senior' in title for title in titles]),
+            'lead': np.array(['lead' in title for title in titles]),
+            'junior': np.array(['junior' in title for title in titles]),
+            'software': np.array(['computer science' in text or 'software' in text for text in descriptions])
+        }
+    
+    def score_chunk(self, state: Dict, candidates: List[Dict], profile_version: Optional[int]) -> Iterator[Dict]:
+        """Score rows of a chunk of candidates against every loaded job
+        
+        The scores are computed up front; the row dicts are generated as the
+        bulk write consumes them, so a chunk never holds them all.
+        """
+        jobs = state['jobs']
+        candidate_skills = [parse_skills(candidate.get('skills')) for candidate in candidates]
+        candidate_skill_sets = [{normalize_skill(skill) for skill in skills} for skills in candidate_skills]
+        education_levels = [candidate.get('education_level') or '' for candidate in candidates]
+        
+        # Semantic block: stored profile embeddings times the job embedding matrix
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        vectors = state['store'].get_many(cursor, CANDIDATE_PROFILE_ENTITY, {
+            candidate['id']: candidate_profile_text(skills, level)
+            for candidate, skills, level in zip(candidates, candidate_skills, education_levels)
+        })
+        conn.commit()
+        conn.close()
+        profile_matrix = np.vstack([vectors[candidate['id']] for candidate in candidates])
+        semantic = ((profile_matrix @ state['embeddings'].T) * 100).astype(np.float64)
+        
+        # Skill matches: which job vocabulary skills each candidate matches, exactly or by similarity
+        matched = sparse.csr_matrix((len(candidates), len(state['vocabulary'])), dtype=np.float32)
+        overlap = np.zeros((len(candidates), len(jobs)))
+        if state['vocabulary']:
+            candidate_vocabulary = list(dict.fromkeys(skill for skills in candidate_skills for skill in skills))
+            if candidate_vocabulary:
+                positions = {skill: i for i, skill in enumerate(candidate_vocabulary)}
+                similar = (state['vocabulary_vectors'] @ self._skill_matrix(candidate_vocabulary, state['store']).T) * 100 > SKILL_SIMILARITY_THRESHOLD
+                by_similarity = incidence([[positions[skill] for skill in skills] for skills in candidate_skills], len(candidate_vocabulary)) \
+                    @ sparse.csr_matrix(similar.T.astype(np.float32))
+                normalized_sets = incidence([
+                    [state['normalized_positions'][skill] for skill in skills if skill in state['normalized_positions']]
+                    for skills in candidate_skill_sets
+                ], len(state['normalized_positions']))
+                matched = ((by_similarity + normalized_sets @ state['exact']) > 0).astype(np.float32)
+                overlap = (normalized_sets @ state['normalized_by_job']).toarray()
+        matched_counts = (matched @ state['skill_by_job']).toarray().astype(np.float64)
+        counts = state['skill_counts']
+        skills_score = round_scores(np.divide(matched_counts, counts, out=np.zeros_like(matched_counts), where=counts > 0) * 100)
+        
+        # Experience and education ratios (PairFeatures), broadcast candidates x jobs
+        years = np.array([candidate.get('experience_years') or 0 for candidate in candidates], dtype=np.float64)[:, None]
+        required = state['required_experience'][None, :]
+        experience_ratio = np.where(
+            (required == 0) | (years >= required), 1.0,
+            np.divide(years, required, out=np.ones((len(candidates), len(jobs))), where=required > 0)
+        )
+        education_scores = np.array([candidate.get('education_score') or 0.0 for candidate in candidates], dtype=np.float64)[:, None]
+        education_ratio = np.minimum(1.0, education_scores / state['required_education'][None, :])
+        experience_score = round_scores(experience_ratio * 100)
+        education_score = round_scores(education_ratio * 100)
+        match_score = round_scores(skills_score * 0.4 + experience_score * 0.3 + education_score * 0.1 + semantic * 0.2)
+        
+        # MCP score (MCPScorer.compute_mcp_score and apply_contextual_adjustments)
+        normalized_experience = experience_ratio * 100.0
+        normalized_education = np.broadcast_to(education_scores * 100.0, match_score.shape)
+        final = (
+            np.maximum(0, np.minimum(100, match_score)) * state['match_weight'] +
+            normalized_experience * state['experience_weight'] +
+            normalized_education * state['education_weight']
+        )
+        has_skills = state['skill_set_sizes'] > 0
+        extra = np.array([len(skills) for skills in candidate_skill_sets], dtype=np.float64)[:, None] - overlap
+        final = final + np.where(has_skills & (extra > 0), np.minimum(extra * 1, 5), 0)
+        gap = np.divide(state['skill_set_sizes'] - overlap, state['skill_set_sizes'], out=np.zeros_like(overlap), where=has_skills)
+        final = final - np.where(has_skills & (gap > 0.5), gap * 10, 0)
+        senior = state['senior'] & (years < 5)
+        lead = ~senior & state['lead'] & (years < 7)
+        junior = ~senior & ~lead & state['junior'] & (years > 8)
+        final = np.where(senior, final * 0.9, np.where(lead, final * 0.85, np.where(junior, final * 1.05, final)))
+        relevant_education = np.array([
+            any(term in level.lower() for term in ['computer', 'software', 'engineering']) for level in education_levels
+        ])[:, None]
+        final = np.where(state['software'] & relevant_education, final * 1.02, final)
+        final = round_scores(np.maximum(0, np.minimum(100, final)))
+        experience_component = round_scores(normalized_experience)
+        education_component = round_scores(normalized_education)
+        
+        # Rows, with each job's matched/missing skill lists read off the matched vocabulary
+        matched = matched.toarray().astype(bool)
+        return self._rows(state, candidates, candidate_skills, matched, profile_version, {
+            'match_score': match_score, 'experience_component': experience_component,
+            'education_component': education_component, 'final': final, 'skills_score': skills_score,
+            'experience_score': experience_score, 'education_score': education_score, 'semantic': semantic
+        })
+    
+    def _rows(self, state: Dict, candidates: List[Dict], candidate_skills: List[List[str]], matched: np.ndarray,
+              profile_version: Optional[int], scores: Dict[str, np.ndarray]) -> Iterator[Dict]:
+        """candidate_scores rows of a scored chunk, job by job"""
+        match_score, final, semantic = scores['match_score'], scores['final'], scores['semantic']
+        experience_component, education_component = scores['experience_component'], scores['education_component']
+        skills_score, experience_score, education_score = scores['skills_score'], scores['experience_score'], scores['education_score']
+        for j, job in enumerate(state['jobs']):
+            skills = state['skills'][j]
+            flags = matched[:, state['occurrences'][j]] if skills else None
+            for i, candidate in enumerate(candidates):
+                if skills and candidate_skills[i]:
+                    matched_skills = [skill for skill, hit in zip(skills, flags[i]) if hit]
+                    missing_skills = [skill for skill, hit in zip(skills, flags[i]) if not hit]
+                else:
+                    matched_skills, missing_skills = [], skills
+                yield {
+                    'candidate_id': candidate['id'],
+                    'job_id': job['id'],
+                    'match_score': float(match_score[i, j]),
+                    'experience_score': float(experience_component[i, j]),
+                    'education_score': float(education_component[i, j]),
+                    'final_score': float(final[i, j]),
+                    'matched_skills': matched_skills,
+                    'missing_skills': missing_skills,
+                    'weight_profile_version': profile_version,
+                    'components': {
+                        'skills': float(skills_score[i, j]),
+                        'experience': float(experience_score[i, j]),
+                        'education': float(education_score[i, j]),
+                        'semantic': float(semantic[i, j])
+                    },
+                    'candidate_version': candidate.get('version'),
+                    'job_version': job.get('version'),
+                    'embedding_model': state['store'].model_name
+                }
+    
+    def start(self, chunk_size: Optional[int] = None, resume_run_id: Optional[int] = None,
+              background: bool = True, progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Start a new run, or resume an unfinished one, and return its run record"""
+        chunk_size = chunk_size or self.chunk_size
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        owner = uuid.uuid4().hex
+        if resume_run_id is not None:
+            run = self.get_run(resume_run_id)
+            if run is None:
+                raise ValueError(f"Score matrix run {resume_run_id} not found")
+            if run['status'] not in RESUMABLE_STATUSES:
+                raise ValueError(f"Score matrix run {resume_run_id} is {run['status']} and cannot be resumed")
+            self._check_model(run, embedding_store.model_name)
+            if not db.claim_score_matrix_run(resume_run_id, owner, self.lease_seconds):
+                raise ValueError("Another score matrix run is in progress")
+            run_id = resume_run_id
+        else:
+            run_id = db.create_score_matrix_run(chunk_size, 0, 0, None, owner, self.lease_seconds)
+            if run_id is None:
+                raise ValueError("Another score matrix run is in progress")
+        
+        if background:
+            threading.Thread(target=self._run, args=(run_id, owner, progress), name='score-matrix', daemon=True).start()
+        else:
+            self._run(run_id, owner, progress)
+        return self.get_run(run_id)
+    
+    @staticmethod
+    def _check_model(run: Dict, model_name: str):
+        """Refuse to resume a run under another embedding model than its earlier chunks were scored with"""
+        if run['embedding_model'] and run['embedding_model'] != model_name:
+            raise ValueError(
+                f"Score matrix run {run['id']} was scored with embedding model {run['embedding_model']}, "
+                f"not {model_name}; start a new run"
+            )
+    
+    def _heartbeat(self, run_id: int, owner: str, **fields):
+        """Record progress and renew the lease, or raise LeaseLost if another worker took the run over"""
+        if not db.update_score_matrix_run(run_id, lease_owner=owner, **fields):
+            raise LeaseLost(f"Score matrix run {run_id} was taken over by another worker")
+    
+    def _run(self, run_id: int, owner: str, progress: Optional[Callable[[Dict], None]]):
+        """Score the candidates after the run's last completed chunk, chunk by chunk"""
+        run = db.get_score_matrix_runs(run_id)[0]
+        pairs_written = run['pairs_written']
+        try:
+            profile = mcp_scorer.profiles.current()
+            state = self._load_jobs(profile)
+            self._check_model(run, state['store'].model_name)  # The model may have switched since start()
+            conn = db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM candidates WHERE id > ? AND duplicate_of IS NULL', (run['last_candidate_id'],))
+            remaining = cursor.fetchone()[0]
+            conn.close()
+            self._heartbeat(
+                run_id, owner, total_candidates=run['processed_candidates'] + remaining,
+                total_jobs=len(state['jobs']), weight_profile_version=profile.version,
+                embedding_model=state['store'].model_name
+            )
+            
+            last_candidate_id = run['last_candidate_id']
+            processed = run['processed_candidates']
+            while state['jobs']:
+                conn = db.get_connection()
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id FROM candidates WHERE id > ? AND duplicate_of IS NULL ORDER BY id LIMIT ?
+                ''', (last_candidate_id, run['chunk_size']))
+                candidate_ids = [row[0] for row in cursor.fetchall()]
+                conn.close()
+                if not candidate_ids:
+                    break
+                
+                candidates = db.get_candidates_for_scoring(candidate_ids)
+                if candidates:
+                    pairs_written += db.bulk_upsert_candidate_scores(self.score_chunk(state, candidates, profile.version))
+                processed += len(candidates)
+                last_candidate_id = candidate_ids[-1]
+                self._heartbeat(
+                    run_id, owner, processed_candidates=processed, last_candidate_id=last_candidate_id,
+                    pairs_written=pairs_written
+                )
+                if progress:
+                    progress(self.get_run(run_id))
+            
+            self._heartbeat(run_id, owner, status='completed', finished_at=time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()))
+        except LeaseLost as e:
+            print(f"{e}; stopping")
+        except Exception as e:
+            print(f"Error in score matrix run {run_id}: {e}")
+            db.update_score_matrix_run(run_id, lease_owner=owner, status='failed', error=str(e))
+        finally:
+            # Also after a failure, so the sketches cover the chunks that were written
+            if pairs_written != run['pairs_written']:
+                try:
+                    db.rebuild_score_sketches()
+                except Exception as e:
+                    print(f"Error rebuilding score sketches after score matrix run {run_id}: {e}")
+        if progress:
+            progress(self.get_run(run_id))
+    
+    def get_run(self, run_id: int) -> Optional[Dict]:
+        """A run record with its completion percentage"""
+        runs = db.get_score_matrix_runs(run_id, lease_seconds=self.lease_seconds)
+        if not runs:
+            return None
+        run = runs[0]
+        run.pop('lease_owner')
+        if run.pop('lease_expired'):
+            run['status'] = 'interrupted'  # Left running by a worker that stopped renewing its lease
+        run['progress'] = round(run['processed_candidates'] / run['total_candidates'] * 100, 2) if run['total_candidates'] else 0.0
+        return run
+    
+    def get_runs(self, limit: int = 20) -> List[Dict]:
+        """The most recent runs, newest first"""
+        return [self.get_run(run['id']) for run in db.get_score_matrix_runs(limit=limit)]
+
+# Initialize score matrix builder instance
+score_matrix_builder = ScoreMatrixBuilder(
+    chunk_size=config.SCORE_MATRIX_CHUNK_SIZE, lease_seconds=config.SCORE_MATRIX_LEASE_SECONDS
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score every candidate against every job into candidate_scores")
+    parser.add_argument('--chunk-size', type=int, default=None, help="Candidates per bulk write")
+    parser.add_argument('--resume', type=int, default=None, metavar='RUN_ID', help="Continue an interrupted or failed run")
+    args = parser.parse_args()
+    
+    def report(run: Dict):
+        print(f"Run {run['id']} {run['status']}: {run['processed_candidates']}/{run['total_candidates']} candidates "
+              f"x {run['total_jobs']} jobs ({run['progress']}%), {run['pairs_written']} scores written")
+    
+    score_matrix_builder.start(args.chunk_size, args.resume, background=False, progress=report) 
\ No newline at end of file
@@ -1,80 +1,49 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 import json
 from datetime import datetime
+from weight_profiles import weight_profiles, WeightProfile
+from pair_features import PairFeatures
+from ranking import top_k_rows
+import numpy as np
 
 class MCPScorer:
     def __init__(self):
         """Initialize MCP (Multi-Criteria Preference) Scorer"""
-        # Default weights for scoring criteria
-        self.default_weights = {
-            'match_score': 0.6,      # RAG matching score weight
-            'experience': 0.3,       # Years of experience weight
-            'education': 0.1         # Education level weight
-        }
-        
-        # Context-aware weight adjustments based on job type
-        self.job_type_weights = {
-            'senior': {
-                'match_score': 0.5,
-                'experience': 0.4,
-                'education': 0.1
-            },
-            'junior': {
-                'match_score': 0.7,
-                'experience': 0.1,
-                'education': 0.2
-            },
-            'lead': {
-                'match_score': 0.4,
-                'experience': 0.5,
-                'education': 0.1
-            },
-            'manager': {
-                'match_score': 0.3,
-                'experience': 0.5,
-                'education': 0.2
-            },
-            'intern': {
-                'match_score': 0.8,
-                'experience': 0.0,
-                'education': 0.2
-            }
-        }
-        
-        # Industry-specific weight adjustments
-        self.industry_weights = {
-            'research': {
-                'match_score': 0.4,
-                'experience': 0.3,
-                'education': 0.3
-            },
-            'startup': {
-                'match_score': 0.7,
-                'experience': 0.2,
-                'education': 0.1
-            },
-            'enterprise': {
-                'match_score': 0.5,
-                'experience': 0.4,
-                'education': 0.1
-            }
-        }
+        # Weights come from the active weight profile (see weight_profiles.py)
+        self.profiles = weight_profiles
+    
+    @property
+    def default_weights(self) -> Dict[str, float]:
+        """Default weights for scoring criteria in the active profile"""
+        return dict(self.profiles.current().scorer['default_weights'])
     
-    def get_context_weights(self, job_title: str, job_description: str) -> Dict[str, float]:
+    @property
+    def job_type_weights(self) -> Dict[str, Dict[str, float]]:
+        """Context-aware weight adjustments based on job type in the active profile"""
+        return {level: dict(weights) for level, weights in self.profiles.current().scorer['job_type_weights'].items()}
+    
+    @property
+    def industry_weights(self) -> Dict[str, Dict[str, float]]:
+        """Industry-specific weight adjustments in the active profile"""
+        return {industry: dict(weights) for industry, weights in self.profiles.current().scorer['industry_weights'].items()}
+    
+    def get_context_weights(self, job_title: str, job_description: str,
+                            profile: Optional[WeightProfile] = None) -> Dict[str, float]:
         """Get context-aware weights based on job characteristics"""
-        weights = self.default_weights.copy()
+        profile = profile or self.profiles.current()
+        weights = dict(profile.scorer['default_weights'])
         
         job_title_lower = job_title.lower()
         job_desc_lower = job_description.lower()
         
         # Adjust weights based on seniority level
-        for level, level_weights in self.job_type_weights.items():
+        for level, level_weights in profile.scorer['job_type_weights'].items():
             if level in job_title_lower:
                 weights.update(level_weights)
                 break
         
         # Adjust weights based on industry context
-        for industry, industry_weights in self.industry_weights.items():
+        for industry, industry_weights in profile.scorer['industry_weights'].items():
             if industry in job_desc_lower:
                 # Blend with existing weights
                 for key in weights:
@@ -98,48 +67,32 @@ class MCPScorer:
         
         return weights
     
-    def normalize_experience_score(self, candidate_experience: int, required_experience: int) -> float:
-        """Normalize experience score to 0-100 scale"""
-        if required_experience == 0:
-            return 100.0
-        
-        if candidate_experience >= required_experience:
-            # Bonus for extra experience, but diminishing returns
-            extra_years = candidate_experience - required_experience
-            bonus = min(extra_years * 2, 20)  # Max 20% bonus
-            return min(100.0 + bonus, 100.0)
-        else:
-            # Linear penalty for missing experience
-            ratio = candidate_experience / required_experience
-            return ratio * 100.0
+    def normalize_experience_score(self, features: PairFeatures) -> float:
+        """Normalize experience score to 0-100 scale (capped at 100 when requirement is met)"""
+        return features.experience_ratio * 100.0
     
-    def normalize_education_score(self, education_score: float) -> float:
+    def normalize_education_score(self, features: PairFeatures) -> float:
         """Normalize education score to 0-100 scale"""
         # Education score is already normalized (0.0 to 1.0)
-        return education_score * 100.0
+        return (features.education_score or 0.0) * 100.0
     
     def compute_mcp_score(self, candidate_data: Dict, job_data: Dict, 
-                         match_score: float) -> Dict:
+                         match_score: float, profile: Optional[WeightProfile] = None,
+                         features: Optional[PairFeatures] = None) -> Dict:
         """Compute MCP score using context-aware weights"""
+        # One snapshot for the whole computation, even if a new profile is activated meanwhile
+        profile = profile or self.profiles.current()
+        features = features or PairFeatures(candidate_data, job_data)
         
         # Get context-aware weights
         job_title = job_data.get('title', '')
         job_description = job_data.get('description', '')
-        weights = self.get_context_weights(job_title, job_description)
-        
-        # Extract candidate information
-        candidate_experience = candidate_data.get('experience_years', 0)
-        candidate_education_score = candidate_data.get('education_score', 0.0)
-        
-        # Extract job requirements
-        required_experience = job_data.get('experience_years', 0)
+        weights = self.get_context_weights(job_title, job_description, profile)
         
         # Normalize scores
         normalized_match_score = max(0, min(100, match_score))
-        normalized_experience_score = self.normalize_experience_score(
-            candidate_experience, required_experience
-        )
-        normalized_education_score = self.normalize_education_score(candidate_education_score)
+        normalized_experience_score = self.normalize_experience_score(features)
+        normalized_education_score = self.normalize_education_score(features)
         
         # Calculate weighted final score
         final_score = (
@@ -149,9 +102,7 @@ class MCPScorer:
         )
         
         # Apply contextual adjustments
-        final_score = self.apply_contextual_adjustments(
-            final_score, candidate_data, job_data
-        )
+        final_score = self.apply_contextual_adjustments(final_score, features, job_data)
         
         return {
             'final_score': round(final_score, 2),
@@ -161,6 +112,7 @@ class MCPScorer:
                 'education_score': round(normalized_education_score, 2)
             },
             'weights_used': weights,
+            'weight_profile_version': profile.version,
             'score_breakdown': {
                 'match_contribution': round(normalized_match_score * weights['match_score'], 2),
                 'experience_contribution': round(normalized_experience_score * weights['experience'], 2),
@@ -168,33 +120,29 @@ class MCPScorer:
             }
         }
     
-    def apply_contextual_adjustments(self, base_score: float, candidate_data: Dict, 
+    def apply_contextual_adjustments(self, base_score: float, features: PairFeatures, 
                                    job_data: Dict) -> float:
         """Apply contextual adjustments to the base score"""
         adjusted_score = base_score
         
         # Bonus for relevant skills beyond requirements
-        candidate_skills = set(skill.lower() for skill in candidate_data.get('skills', []))
-        job_skills = set(skill.lower() for skill in job_data.get('skills', []))
-        
-        if job_skills:
-            extra_relevant_skills = len(candidate_skills - job_skills)
+        if features.job_skill_set:
+            extra_relevant_skills = features.extra_skill_count
             if extra_relevant_skills > 0:
                 # Small bonus for additional relevant skills
                 skill_bonus = min(extra_relevant_skills * 1, 5)  # Max 5% bonus
                 adjusted_score += skill_bonus
         
         # Penalty for significant skill gaps
-        if job_skills:
-            missing_skills = len(job_skills - candidate_skills)
-            skill_gap_ratio = missing_skills / len(job_skills)
+        if features.job_skill_set:
+            skill_gap_ratio = features.missing_skill_ratio
             if skill_gap_ratio > 0.5:  # Missing more than 50% of required skills
                 penalty = skill_gap_ratio * 10  # Up to 10% penalty
                 adjusted_score -= penalty
         
         # Experience level adjustments
         job_title_lower = job_data.get('title', '').lower()
-        candidate_experience = candidate_data.get('experience_years', 0)
+        candidate_experience = features.experience_years
         
         if 'senior' in job_title_lower and candidate_experience < 5:
             adjusted_score *= 0.9  # 10% penalty for senior roles with low experience
@@ -205,7 +153,7 @@ class MCPScorer:
         
         # Education relevance adjustments
         job_desc_lower = job_data.get('description', '').lower()
-        candidate_education = candidate_data.get('education_level', '').lower()
+        candidate_education = features.education_level_lower
         
         if 'computer science' in job_desc_lower or 'software' in job_desc_lower:
             if any(term in candidate_education for term in ['computer', 'software', 'engineering']):
@@ -295,20 +243,32 @@ class MCPScorer:
             return "D"
     
     def batch_score_candidates(self, candidates: List[Dict], job_data: Dict, 
-                             match_scores: List[float]) -> List[Dict]:
-        """Score multiple candidates efficiently"""
+                             match_scores: List[float], top_k: Optional[int] = None) -> List[Dict]:
+        """Score multiple candidates efficiently
+        
+        With `top_k`, only the best top_k are returned (exactly as a full
+        sort would) and only they get an explanation.
+        """
         scored_candidates = []
+        profile = self.profiles.current()
         
+        score_data = []
         for i, candidate in enumerate(candidates):
             match_score = match_scores[i] if i < len(match_scores) else 0.0
-            
-            score_data = self.compute_mcp_score(candidate, job_data, match_score)
-            explanation = self.get_score_explanation(score_data, candidate, job_data)
+            score_data.append(self.compute_mcp_score(candidate, job_data, match_score, profile))
+        
+        rows = range(len(candidates))
+        if top_k is not None:
+            rows = top_k_rows(np.array([data['final_score'] for data in score_data]), top_k)
+        
+        for i in rows:
+            candidate = candidates[i]
+            explanation = self.get_score_explanation(score_data[i], candidate, job_data)
             
             scored_candidate = candidate.copy()
             scored_candidate.update({
-                'mcp_score': score_data['final_score'],
-                'score_data': score_data,
+                'mcp_score': score_data[i]['final_score'],
+                'score_data': score_data[i],
                 'score_explanation': explanation
             })
             
@@ -0,0 +1,265 @@
+import queue
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from database import db, SCORER_VERSION
+from matcher import rag_matcher
+from scorer import mcp_scorer
+from pair_features import PairFeatureCache
+from shadow_scoring import shadow_scorer
+
+# Candidate and job fields each stored score component is computed from. Jobs carry no
+# experience or education requirement in this schema, so those components are candidate-only.
+COMPONENT_DEPENDENCIES = {
+    'skills': {'candidate': {'skills'}, 'job': {'skills'}},
+    'experience': {'candidate': {'experience_years'}, 'job': set()},
+    'education': {'candidate': {'education_score'}, 'job': set()},
+    'semantic': {'candidate': {'skills', 'education_level'}, 'job': {'description'}},
+    # MCP final score: context weights, contextual adjustments and every RAG component
+    'final': {
+        'candidate': {'skills', 'experience_years', 'education_level', 'education_score'},
+        'job': {'title', 'description', 'skills'}
+    }
+}
+
+def affected_components(candidate_fields: Set[str], job_fields: Set[str]) -> Set[str]:
+    """Score components with an input among the changed fields"""
+    return {
+        component for component, dependencies in COMPONENT_DEPENDENCIES.items()
+        if dependencies['candidate'] & candidate_fields or dependencies['job'] & job_fields
+    }
+
+def changed_fields(changes: Dict[int, List[str]], since: Optional[int], until: int) -> Optional[Set[str]]:
+    """Fields changed by the edits after version `since` up to `until`, or None if not fully logged"""
+    if since is None or since > until:
+        return None
+    fields = set()
+    for version in range(since + 1, until + 1):
+        if version not in changes:
+            return None
+        fields.update(changes[version])
+    return fields
+
+class ScoringService:
+    """Computes and stores candidate-job scores at write time
+    
+    Ingesting or editing a candidate (or job) queues it for a background
+    worker that scores it against every job (or candidate) in batches, with
+    all texts of a batch encoded at once. Score rows are stamped with the
+    candidate, job and scorer versions they were computed from, so an edit
+    makes its rows stale without touching them. Reads only return stored
+    scores and queue whatever is still missing or stale.
+    
+    Stale rows are rescored only as far as the edit requires: the logged
+    field changes since the row's versions are mapped through
+    COMPONENT_DEPENDENCIES, stored skills/semantic components whose inputs
+    did not change are reused (they are the ones needing the encoder), and
+    rows whose inputs did not change at all are just restamped.
+    """
+    
+    def __init__(self, batch_size: int = 200):
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.stats = {
+            'queued': 0, 'completed': 0, 'failed': 0, 'scored_pairs': 0,
+            'full_rescores': 0, 'partial_rescores': 0, 'restamped': 0
+        }
+        self._queued_scopes = set()  # Scopes waiting in the queue, so repeated edits coalesce
+        self._lock = threading.Lock()
+        self._worker = None
+    
+    def score_candidates(self, job_data: Dict, candidates: List[Dict],
+                         reuse: Optional[Dict[int, Dict]] = None, active: Optional[Tuple] = None) -> int:
+        """Compute and store the scores of candidates for a job
+        
+        `reuse` maps candidate IDs to stored semantic features (see
+        PairFeatures.reuse) that are still valid and need not be recomputed.
+        Scores are computed with, and stamped with, the `active` (model,
+        model name) snapshot, by default the matcher's current one.
+        """
+        if not candidates:
+            return 0
+        
+        # Pair features are computed once and shared by both scorers; all
+        # texts the batch still needs are encoded in a single call up front
+        active = active or rag_matcher.active
+        feature_cache = PairFeatureCache(rag_matcher.encoder(active))
+        for candidate in candidates:
+            if reuse and candidate['id'] in reuse:
+                feature_cache.get(candidate, job_data).reuse(**reuse[candidate['id']])
+        rows = []
+        scored = []
+        for candidate, features in zip(candidates, feature_cache.warm(candidates, job_data)):
+            # Compute RAG match
+            match_result = rag_matcher.compute_overall_match(candidate, job_data, features)
+            
+            # Compute MCP score
+            mcp_result = mcp_scorer.compute_mcp_score(
+                candidate, job_data, match_result['final_score'], features=features
+            )
+            
+            rows.append({
+                'candidate_id': candidate['id'],
+                'job_id': job_data['id'],
+                'match_score': match_result['final_score'],
+                'experience_score': mcp_result['component_scores']['experience_score'],
+                'education_score': mcp_result['component_scores']['education_score'],
+                'final_score': mcp_result['final_score'],
+                'matched_skills': match_result['skills_match']['matched_skills'],
+                'missing_skills': match_result['skills_match']['missing_skills'],
+                'weight_profile_version': mcp_result['weight_profile_version'],
+                'components': {
+                    'skills': match_result['skills_match']['match_score'],
+                    'experience': match_result['experience_match']['experience_score'],
+                    'education': match_result['education_match']['education_score'],
+                    'semantic': features.semantic_similarity  # Unrounded, so partial rescoring reuses it exactly
+                },
+                # Versions of the data and the embedding model these scores were computed from
+                'candidate_version': candidate.get('version'),
+                'job_version': job_data.get('version'),
+                'embedding_model': active[1]
+            })
+            scored.append((candidate, match_result['final_score'], mcp_result['final_score']))
+        
+        db.upsert_candidate_scores(rows)
+        shadow_scorer.submit_candidate_scores(job_data, scored, mcp_result['weight_profile_version'])
+        return len(rows)
+    
+    def get_ranked_candidates(self, job_data: Dict) -> Tuple[List[Dict], int]:
+        """Get a job's candidates ranked by stored score, queueing missing or stale ones
+        
+        Returns the candidates and how many of their scores are still pending.
+        """
+        candidates = db.get_candidates_with_scores(job_data['id'], rag_matcher.model_name)
+        pending = sum(1 for c in candidates if c['final_score'] is None or c['score_stale'])
+        if pending:
+            self.submit(job_id=job_data['id'])
+        return candidates, pending
+    
+    def score_pending(self, candidate_id: Optional[int] = None, job_id: Optional[int] = None) -> int:
+        """Score missing or stale pairs (optionally only a candidate's or a job's), returning the count"""
+        scored = 0
+        while True:
+            active = rag_matcher.active
+            pairs = db.get_pairs_to_score(active[1], candidate_id, job_id, limit=self.batch_size)
+            if not pairs:
+                break
+            
+            candidate_ids_by_job = {}
+            for pair_candidate_id, pair_job_id in pairs:
+                candidate_ids_by_job.setdefault(pair_job_id, []).append(pair_candidate_id)
+            
+            batch_scored = 0
+            for pair_job_id, candidate_ids in candidate_ids_by_job.items():
+                job_data = db.get_job_description(pair_job_id)
+                if job_data:
+                    batch_scored += self.rescore(job_data, db.get_candidates_for_scoring(candidate_ids), active)
+            if batch_scored == 0:
+                break  # Rows vanished underneath us; nothing left to do
+            scored += batch_scored
+        return scored
+    
+    def rescore(self, job_data: Dict, candidates: List[Dict], active: Optional[Tuple] = None) -> int:
+        """Bring candidates' stored scores for a job up to date, recomputing only what changed
+        
+        Scores computed with another embedding model than `active`'s are
+        recomputed in full, and those of another weight profile than the
+        active one get a new final score.
+        """
+        active = active or rag_matcher.active
+        profile_version = mcp_scorer.profiles.current().version
+        job_id = job_data['id']
+        candidate_ids = [candidate['id'] for candidate in candidates]
+        stored = db.get_stored_scores(job_id, candidate_ids)
+        job_changes = db.get_field_changes('job', [job_id]).get(job_id, {})
+        candidate_changes = db.get_field_changes('candidate', candidate_ids)
+        
+        to_score = []
+        reuse = {}
+        restamps = []
+        for candidate in candidates:
+            row = stored.get(candidate['id'])
+            affected = None
+            if row and row['scorer_version'] == SCORER_VERSION and row['embedding_model'] == active[1]:
+                candidate_fields = changed_fields(
+                    candidate_changes.get(candidate['id'], {}), row['candidate_version'], candidate['version']
+                )
+                job_fields = changed_fields(job_changes, row['job_version'], job_data['version'])
+                if candidate_fields is not None and job_fields is not None:
+                    affected = affected_components(candidate_fields, job_fields)
+                    if row['weight_profile_version'] != profile_version:
+                        affected.add('final')
+            
+            if affected is None:
+                to_score.append(candidate)  # New, pre-versioning or unlogged: score from scratch
+            elif 'final' not in affected:
+                restamps.append((candidate['version'], job_data['version'], candidate['id'], job_id))
+            else:
+                to_score.append(candidate)
+                components = row['components']
+                reuse[candidate['id']] = {}
+                if 'skills' not in affected and components['skills'] is not None:
+                    reuse[candidate['id']]['skill_matches'] = {
+                        'match_score': components['skills'],
+                        'matched_skills': row['matched_skills'],
+                        'missing_skills': row['missing_skills'],
+                        'extra_skills': []  # Not stored; nothing downstream of the score uses it
+                    }
+                if 'semantic' not in affected and components['semantic'] is not None:
+                    reuse[candidate['id']]['semantic_similarity'] = components['semantic']
+        
+        db.restamp_scores(restamps)
+        scored = self.score_candidates(job_data, to_score, reuse, active)
+        with self._lock:
+            self.stats['full_rescores'] += len(to_score) - len(reuse)
+            self.stats['partial_rescores'] += len(reuse)
+            self.stats['restamped'] += len(restamps)
+        return scored + len(restamps)
+    
+    def submit(self, candidate_id: Optional[int] = None, job_id: Optional[int] = None) -> bool:
+        """Queue scoring of a candidate against all jobs, a job against all candidates, or everything"""
+        scope = (candidate_id, job_id)
+        with self._lock:
+            if scope in self._queued_scopes:
+                return False
+            self._queued_scopes.add(scope)
+            self.stats['queued'] += 1
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='scoring-worker', daemon=True)
+                self._worker.start()
+        self.queue.put(scope)
+        return True
+    
+    def submit_candidate(self, candidate_id: int) -> bool:
+        """Queue a new or edited candidate for scoring against all jobs"""
+        return self.submit(candidate_id=candidate_id)
+    
+    def submit_job(self, job_id: int) -> bool:
+        """Queue a new or edited job for scoring against the candidate pool"""
+        return self.submit(job_id=job_id)
+    
+    def _run(self):
+        """Worker loop: score one queued scope at a time"""
+        while True:
+            scope = self.queue.get()
+            # Un-mark first so an edit made while this scope is scored queues it again
+            with self._lock:
+                self._queued_scopes.discard(scope)
+            try:
+                scored = self.score_pending(*scope)
+                with self._lock:
+                    self.stats['completed'] += 1
+                    self.stats['scored_pairs'] += scored
+            except Exception as e:
+                print(f"Error scoring queued candidates: {e}")
+                with self._lock:
+                    self.stats['failed'] += 1
+            finally:
+                self.queue.task_done()
+    
+    def get_queue_stats(self) -> Dict:
+        """Get queue depth and worker counters"""
+        with self._lock:
+            return {**self.stats, 'queue_depth': self.queue.qsize()}
+
+# Initialize scoring service instance
+scoring_service = ScoringService() 
\ No newline at end of file
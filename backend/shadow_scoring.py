@@ -0,0 +1,185 @@
+import queue
+import threading
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+from database import db
+from weight_profiles import weight_profiles, WeightProfile
+from mcp_protocol import mcp, MCPContext, MCPRequest
+from scorer import mcp_scorer
+from config import config
+
+class ShadowScorer:
+    """Scores requests with the shadow weight profile off the request path
+    
+    Request handlers only call `put_nowait` on a bounded queue. When the
+    queue is full the shadow work is dropped and counted instead of
+    building a backlog, so primary latency is unaffected. A single daemon
+    worker computes the shadow scores and writes them in batches to
+    shadow_scores, next to the primary score they are compared with.
+    """
+    
+    def __init__(self, queue_size: int = 1000, write_batch_size: int = 50):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.write_batch_size = write_batch_size
+        self.stats = {'submitted': 0, 'dropped': 0, 'completed': 0, 'failed': 0}
+        self._lock = threading.Lock()
+        self._worker = None
+    
+    def _submit(self, source: str, job_id: int, primary_version: Optional[int],
+                primary_scores: Dict[int, float], compute: Callable[[WeightProfile], Dict[int, float]],
+                request_id: Optional[str] = None) -> bool:
+        """Queue shadow work if a shadow profile is set; never blocks"""
+        shadow = weight_profiles.shadow()
+        if shadow is None or not primary_scores:
+            return False
+        
+        task = (source, request_id or str(uuid.uuid4()), job_id, primary_version, primary_scores, shadow, compute)
+        try:
+            self.queue.put_nowait(task)
+        except queue.Full:
+            with self._lock:
+                self.stats['dropped'] += 1
+            return False
+        
+        with self._lock:
+            self.stats['submitted'] += 1
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='shadow-scorer', daemon=True)
+                self._worker.start()
+        return True
+    
+    def submit_mcp_score(self, request: MCPRequest, primary_score: float, primary_version: Optional[int]) -> bool:
+        """Shadow a single /mcp/score request"""
+        candidate_id = request.candidate_data.get('id')
+        return self._submit(
+            'mcp_score', request.context.job_id, primary_version, {candidate_id: primary_score},
+            lambda profile: {candidate_id: mcp.process_score_request(request, profile).score},
+            request_id=request.request_id
+        )
+    
+    def submit_mcp_batch(self, context: MCPContext, candidates: List[Dict], results: List[Dict],
+                         primary_version: Optional[int]) -> bool:
+        """Shadow the returned page of a /mcp/score/batch request"""
+        returned = {result['candidate_id'] for result in results}
+        page = [candidate for candidate in candidates if candidate.get('id') in returned]
+        
+        def compute(profile: WeightProfile) -> Dict[int, float]:
+            shadow = mcp.score_candidates_batch(context, page, limit=len(page), profile=profile)
+            return {result['candidate_id']: result['score'] for result in shadow['results']}
+        
+        return self._submit(
+            'mcp_batch', context.job_id, primary_version,
+            {result['candidate_id']: result['score'] for result in results}, compute
+        )
+    
+    def submit_candidate_scores(self, job_data: Dict, scored: List[Tuple[Dict, float, float]],
+                                primary_version: Optional[int]) -> bool:
+        """Shadow MCPScorer scores computed for a job's candidate list
+        
+        `scored` holds (candidate, match_score, primary final_score) tuples.
+        """
+        def compute(profile: WeightProfile) -> Dict[int, float]:
+            return {
+                candidate['id']: mcp_scorer.compute_mcp_score(candidate, job_data, match_score, profile)['final_score']
+                for candidate, match_score, _ in scored
+            }
+        
+        return self._submit(
+            'candidate_ranking', job_data['id'], primary_version,
+            {candidate['id']: final_score for candidate, _, final_score in scored}, compute
+        )
+    
+    def _run(self):
+        """Worker loop: drain up to a batch of tasks, score them, write the rows at once"""
+        while True:
+            tasks = [self.queue.get()]
+            while len(tasks) < self.write_batch_size:
+                try:
+                    tasks.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            rows = []
+            for source, request_id, job_id, primary_version, primary_scores, shadow, compute in tasks:
+                try:
+                    shadow_scores = compute(shadow)
+                    rows.extend(
+                        (request_id, source, candidate_id, job_id, primary_version,
+                         primary_score, shadow.version, shadow_scores.get(candidate_id))
+                        for candidate_id, primary_score in primary_scores.items()
+                    )
+                    with self._lock:
+                        self.stats['completed'] += 1
+                except Exception as e:
+                    print(f"Error computing shadow score: {e}")
+                    with self._lock:
+                        self.stats['failed'] += 1
+            
+            if rows:
+                self._write(rows)
+            for _ in tasks:
+                self.queue.task_done()
+    
+    def _write(self, rows: List[Tuple]):
+        """Insert shadow score rows in one transaction"""
+        conn = db.get_connection()
+        try:
+            conn.executemany('''
+                INSERT INTO shadow_scores (request_id, source, candidate_id, job_id, primary_profile_version,
+                                           primary_score, shadow_profile_version, shadow_score)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+        except Exception as e:
+            print(f"Error writing shadow scores: {e}")
+        finally:
+            conn.close()
+    
+    def get_queue_stats(self) -> Dict:
+        """Get queue depth and submitted/dropped/completed counters"""
+        with self._lock:
+            return {
+                **self.stats,
+                'queue_depth': self.queue.qsize(),
+                'queue_capacity': self.queue.maxsize
+            }
+    
+    def get_comparison(self, shadow_version: Optional[int] = None) -> List[Dict]:
+        """Summarize stored shadow scores against their primary scores"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT
+                shadow_profile_version,
+                primary_profile_version,
+                source,
+                COUNT(*),
+                AVG(primary_score),
+                AVG(shadow_score),
+                AVG(shadow_score - primary_score),
+                AVG(ABS(shadow_score - primary_score)),
+                MAX(ABS(shadow_score - primary_score))
+            FROM shadow_scores
+            WHERE shadow_score IS NOT NULL AND (? IS NULL OR shadow_profile_version = ?)
+            GROUP BY shadow_profile_version, primary_profile_version, source
+            ORDER BY shadow_profile_version DESC, primary_profile_version DESC, source
+        ''', (shadow_version, shadow_version))
+        comparison = [
+            {
+                'shadow_profile_version': row[0],
+                'primary_profile_version': row[1],
+                'source': row[2],
+                'sample_size': row[3],
+                'avg_primary_score': round(row[4], 2),
+                'avg_shadow_score': round(row[5], 2),
+                'mean_delta': round(row[6], 2),
+                'mean_abs_delta': round(row[7], 2),
+                'max_abs_delta': round(row[8], 2)
+            }
+            for row in cursor.fetchall()
+        ]
+        conn.close()
+        return comparison
+
+# Initialize shadow scorer instance
+shadow_scorer = ShadowScorer(queue_size=config.SHADOW_QUEUE_SIZE) 
\ No newline at end of file
@@ -0,0 +1,406 @@
+import hashlib
+import json
+import math
+import random
+from typing import Dict, Iterable, List, Optional, Tuple
+
+class SpaceSavingSketch:
+    """Space-Saving heavy-hitter summary (Metwally et al.)
+    
+    Keeps at most `capacity` counters. Every reported count is an overestimate
+    by at most its `error`, and any item with true frequency above
+    total / capacity is guaranteed to be tracked.
+    """
+    
+    def __init__(self, capacity: int = 200):
+        self.capacity = capacity
+        self.counters: Dict[str, List[int]] = {}  # item -> [count, error]
+        self.total = 0
+        self.observations = 0
+    
+    def add(self, item: str, count: int = 1):
+        """Add occurrences of an item"""
+        self.total += count
+        if item in self.counters:
+            self.counters[item][0] += count
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+        else:
+            # Replace the current minimum, inheriting its count as error
+            min_item = min(self.counters, key=lambda key: self.counters[key][0])
+            min_count = self.counters.pop(min_item)[0]
+            self.counters[item] = [min_count + count, min_count]
+    
+    def observe(self, items: Iterable[str]):
+        """Record one observation (e.g. one job) contributing the given items"""
+        self.observations += 1
+        for item in items:
+            self.add(item)
+    
+    def min_count(self) -> int:
+        """Smallest tracked count, or 0 while the summary is not full"""
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(counter[0] for counter in self.counters.values())
+    
+    def top(self, k: int) -> List[Tuple[str, int, int]]:
+        """Top-k items as (item, estimated_count, max_overestimate)"""
+        ranked = sorted(self.counters.items(), key=lambda entry: (-entry[1][0], entry[0]))
+        return [(item, counter[0], counter[1]) for item, counter in ranked[:k]]
+    
+    def error_bound(self) -> float:
+        """Worst-case overestimate of any reported count"""
+        return self.total / self.capacity if self.capacity else 0.0
+    
+    @classmethod
+    def merge(cls, sketches: List['SpaceSavingSketch'], capacity: Optional[int] = None) -> 'SpaceSavingSketch':
+        """Merge summaries, keeping the overestimate guarantee (Agarwal et al.)"""
+        capacity = capacity or max((sketch.capacity for sketch in sketches), default=200)
+        merged = cls(capacity)
+        floors = [sketch.min_count() for sketch in sketches]
+        items = set()
+        for sketch in sketches:
+            items.update(sketch.counters)
+            merged.total += sketch.total
+            merged.observations += sketch.observations
+        
+        combined = {}
+        for item in items:
+            count = 0
+            error = 0
+            for sketch, floor in zip(sketches, floors):
+                counter = sketch.counters.get(item)
+                if counter:
+                    count += counter[0]
+                    error += counter[1]
+                else:
+                    # Item may have been evicted from a full summary
+                    count += floor
+                    error += floor
+            combined[item] = [count, error]
+        
+        ranked = sorted(combined.items(), key=lambda entry: (-entry[1][0], entry[0]))
+        merged.counters = dict(ranked[:capacity])
+        return merged
+    
+    def to_dict(self) -> Dict:
+        """Serialize the sketch to a JSON-compatible dict"""
+        return {
+            'type': 'space_saving',
+            'capacity': self.capacity,
+            'total': self.total,
+            'observations': self.observations,
+            'counters': self.counters
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SpaceSavingSketch':
+        """Rebuild a sketch from its serialized form"""
+        sketch = cls(data.get('capacity', 200))
+        sketch.total = data.get('total', 0)
+        sketch.observations = data.get('observations', 0)
+        sketch.counters = {item: list(counter) for item, counter in data.get('counters', {}).items()}
+        return sketch
+
+class CountMinSketch:
+    """Count-Min sketch (Cormode & Muthukrishnan) for point frequency queries
+    
+    Estimates never undercount; with probability 1 - delta they overcount by
+    at most epsilon * total. Counts may be decremented (turnstile model) as long
+    as no item's true count goes negative.
+    """
+    
+    def __init__(self, epsilon: float = 0.005, delta: float = 0.01):
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = int(math.ceil(math.e / epsilon))
+        self.depth = int(math.ceil(math.log(1 / delta)))
+        self.table = [[0] * self.width for _ in range(self.depth)]
+        self.total = 0
+        self.observations = 0
+    
+    def _buckets(self, item: str) -> List[int]:
+        """Column index of the item in every row"""
+        # Stable across processes, unlike the salted builtin hash()
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + row * h2) % self.width for row in range(self.depth)]
+    
+    def add(self, item: str, count: int = 1):
+        """Add (or, with a negative count, remove) occurrences of an item"""
+        self.total += count
+        for row, bucket in enumerate(self._buckets(item)):
+            self.table[row][bucket] += count
+    
+    def observe(self, items: Iterable[str], sign: int = 1):
+        """Record (sign=1) or retract (sign=-1) one observation contributing the given items"""
+        self.observations += sign
+        for item in items:
+            self.add(item, sign)
+    
+    def estimate(self, item: str) -> int:
+        """Estimated count of an item"""
+        return max(0, min(self.table[row][bucket] for row, bucket in enumerate(self._buckets(item))))
+    
+    def error_bound(self) -> float:
+        """Overestimate bound that holds with probability 1 - delta"""
+        return self.epsilon * self.total
+    
+    def to_dict(self) -> Dict:
+        """Serialize the sketch to a JSON-compatible dict"""
+        return {
+            'type': 'count_min',
+            'epsilon': self.epsilon,
+            'delta': self.delta,
+            'total': self.total,
+            'observations': self.observations,
+            'table': self.table
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'CountMinSketch':
+        """Rebuild a sketch from its serialized form"""
+        sketch = cls(data.get('epsilon', 0.005), data.get('delta', 0.01))
+        sketch.total = data.get('total', 0)
+        sketch.observations = data.get('observations', 0)
+        sketch.table = data.get('table', sketch.table)
+        return sketch
+
+class KLLSketch:
+    """KLL quantile sketch (Karnin, Lang & Liberty)
+    
+    Items at compactor level h carry weight 2^h. Sketches of any size merge by
+    concatenating compactors level by level and re-compressing, so per-day
+    sketches can be combined over arbitrary windows.
+    """
+    
+    def __init__(self, k: int = 200, c: float = 2 / 3):
+        self.k = k
+        self.c = c
+        self.compactors: List[List[float]] = [[]]
+        self.count = 0
+        self._random = random.Random()
+    
+    def _capacity(self, level: int) -> int:
+        """Capacity of a compactor; lower levels get geometrically smaller buffers"""
+        depth = len(self.compactors) - level - 1
+        return max(2, int(math.ceil(self.k * self.c ** depth)))
+    
+    def _max_size(self) -> int:
+        """Total number of retained items before a compaction is triggered"""
+        return sum(self._capacity(level) for level in range(len(self.compactors)))
+    
+    def _size(self) -> int:
+        """Number of retained items"""
+        return sum(len(compactor) for compactor in self.compactors)
+    
+    def add(self, value: float):
+        """Add a value to the sketch"""
+        self.compactors[0].append(float(value))
+        self.count += 1
+        if self._size() >= self._max_size():
+            self._compress()
+    
+    def _compress(self):
+        """Compact full levels, promoting every other sorted item one level up"""
+        for level in range(len(self.compactors)):
+            if len(self.compactors[level]) >= self._capacity(level):
+                if level + 1 >= len(self.compactors):
+                    self.compactors.append([])
+                items = sorted(self.compactors[level])
+                # Keep an odd leftover at this level
+                leftover = [items.pop()] if len(items) % 2 else []
+                offset = self._random.randint(0, 1)
+                self.compactors[level + 1].extend(items[offset::2])
+                self.compactors[level] = leftover
+                if self._size() < self._max_size():
+                    break
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate value at quantile q (0-1)"""
+        if self.count == 0:
+            return None
+        weighted = sorted(
+            (value, 2 ** level)
+            for level, compactor in enumerate(self.compactors)
+            for value in compactor
+        )
+        total_weight = sum(weight for _, weight in weighted)
+        target = q * total_weight
+        cumulative = 0
+        for value, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return value
+        return weighted[-1][0]
+    
+    def rank_error(self) -> float:
+        """Normalized rank error (empirical DataSketches bound for KLL at this k)"""
+        return 2.296 / self.k ** 0.9723
+    
+    @classmethod
+    def merge(cls, sketches: List['KLLSketch'], k: int = 200) -> 'KLLSketch':
+        """Merge sketches into a new one"""
+        merged = cls(k)
+        for sketch in sketches:
+            while len(merged.compactors) < len(sketch.compactors):
+                merged.compactors.append([])
+            for level, compactor in enumerate(sketch.compactors):
+                merged.compactors[level].extend(compactor)
+            merged.count += sketch.count
+        while merged._size() >= merged._max_size():
+            merged._compress()
+        return merged
+    
+    def to_dict(self) -> Dict:
+        """Serialize the sketch to a JSON-compatible dict"""
+        return {
+            'type': 'kll',
+            'k': self.k,
+            'count': self.count,
+            'compactors': self.compactors
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'KLLSketch':
+        """Rebuild a sketch from its serialized form"""
+        sketch = cls(data.get('k', 200))
+        sketch.count = data.get('count', 0)
+        sketch.compactors = data.get('compactors', [[]]) or [[]]
+        return sketch
+
+class ScoreMomentsSketch:
+    """Exact, mergeable moment accumulator for 0-100 scores
+    
+    Tracks count, mean and M2 (Welford / Chan et al.) plus counts per score band,
+    so mean, standard deviation and band sizes are exact over any merged window.
+    """
+    
+    SCORE_BANDS = [('excellent', 85), ('good', 70), ('average', 55), ('poor', float('-inf'))]
+    
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.bands = {band: 0 for band, _ in self.SCORE_BANDS}
+    
+    def add(self, value: float):
+        """Add a score"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        for band, threshold in self.SCORE_BANDS:
+            if value >= threshold:
+                self.bands[band] += 1
+                break
+    
+    def std(self) -> float:
+        """Population standard deviation"""
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+    
+    @classmethod
+    def merge(cls, sketches: List['ScoreMomentsSketch']) -> 'ScoreMomentsSketch':
+        """Merge accumulators into a new one"""
+        merged = cls()
+        for sketch in sketches:
+            if sketch.count == 0:
+                continue
+            total = merged.count + sketch.count
+            delta = sketch.mean - merged.mean
+            merged.mean += delta * sketch.count / total
+            merged.m2 += sketch.m2 + delta * delta * merged.count * sketch.count / total
+            merged.count = total
+            for band, count in sketch.bands.items():
+                merged.bands[band] = merged.bands.get(band, 0) + count
+        return merged
+    
+    def to_dict(self) -> Dict:
+        """Serialize the accumulator to a JSON-compatible dict"""
+        return {
+            'type': 'score_moments',
+            'count': self.count,
+            'mean': self.mean,
+            'm2': self.m2,
+            'bands': self.bands
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ScoreMomentsSketch':
+        """Rebuild an accumulator from its serialized form"""
+        sketch = cls()
+        sketch.count = data.get('count', 0)
+        sketch.mean = data.get('mean', 0.0)
+        sketch.m2 = data.get('m2', 0.0)
+        sketch.bands.update(data.get('bands', {}))
+        return sketch
+
+SKETCH_TYPES = {
+    'space_saving': SpaceSavingSketch,
+    'count_min': CountMinSketch,
+    'kll': KLLSketch,
+    'score_moments': ScoreMomentsSketch
+}
+
+class SketchStore:
+    """Persists named sketches in day buckets of the analytics_sketches table
+    
+    All methods take the caller's cursor so sketch updates commit atomically
+    with the rows they summarize.
+    """
+    
+    def load(self, cursor, sketch_name: str, bucket: str):
+        """Load a single sketch bucket, or None if it does not exist"""
+        cursor.execute('''
+            SELECT payload FROM analytics_sketches
+            WHERE sketch_name = ? AND bucket = ?
+        ''', (sketch_name, bucket))
+        row = cursor.fetchone()
+        return self._decode(row[0]) if row else None
+    
+    def load_names_since(self, cursor, sketch_names: List[str], since_bucket: str) -> Dict[str, List]:
+        """Load the buckets of several sketches from `since_bucket` onwards, grouped by name"""
+        placeholders = ', '.join('?' for _ in sketch_names)
+        cursor.execute(f'''
+            SELECT sketch_name, payload FROM analytics_sketches
+            WHERE sketch_name IN ({placeholders}) AND bucket >= ?
+        ''', (*sketch_names, since_bucket))
+        grouped = {name: [] for name in sketch_names}
+        for name, payload in cursor.fetchall():
+            grouped[name].append(self._decode(payload))
+        return grouped
+    
+    def load_since(self, cursor, sketch_name: str, since_bucket: str) -> List:
+        """Load all buckets of a sketch from `since_bucket` (inclusive) onwards"""
+        cursor.execute('''
+            SELECT payload FROM analytics_sketches
+            WHERE sketch_name = ? AND bucket >= ?
+        ''', (sketch_name, since_bucket))
+        return [self._decode(row[0]) for row in cursor.fetchall()]
+    
+    def save(self, cursor, sketch_name: str, bucket: str, sketch):
+        """Insert or replace a sketch bucket"""
+        cursor.execute('''
+            INSERT INTO analytics_sketches (sketch_name, bucket, payload, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(sketch_name, bucket) DO UPDATE SET
+                payload = excluded.payload,
+                updated_at = excluded.updated_at
+        ''', (sketch_name, bucket, json.dumps(sketch.to_dict(), separators=(',', ':'))))
+    
+    def delete(self, cursor, sketch_name: str, bucket: Optional[str] = None):
+        """Delete one bucket, or every bucket of a sketch"""
+        if bucket is None:
+            cursor.execute('DELETE FROM analytics_sketches WHERE sketch_name = ?', (sketch_name,))
+        else:
+            cursor.execute('DELETE FROM analytics_sketches WHERE sketch_name = ? AND bucket = ?',
+                           (sketch_name, bucket))
+    
+    def _decode(self, payload: str):
+        """Deserialize a stored payload into the matching sketch class"""
+        data = json.loads(payload)
+        return SKETCH_TYPES[data['type']].from_dict(data)
+
+# Initialize sketch store instance
+sketch_store = SketchStore() 
\ No newline at end of file
@@ -0,0 +1,414 @@
+import json
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans, kmeans_plusplus
+from database import db, parse_skills
+from embeddings import embedding_store
+from pair_features import normalize_skill
+from config import config
+
+# Mini-batch passes over all candidates per refit
+FIT_EPOCHS = 3
+# Candidate vectors sampled to seed a fresh fit with k-means++
+SEED_SAMPLE_SIZE = 10000
+TOP_SKILLS = 8
+LABEL_SKILLS = 3
+# Candidates without a stored embedding encoded per batch before a fit
+EMBED_BATCH = 500
+
+# Stored 'candidate' embeddings (resume text) of the candidates that are clustered: everyone but flagged duplicates
+CLUSTERED_CANDIDATES = '''
+    FROM candidates c
+    JOIN embeddings e ON e.entity_type = 'candidate' AND e.entity_id = c.id AND e.model_name = ?
+    WHERE c.duplicate_of IS NULL
+'''
+
+def nearest_pools(centroids: np.ndarray, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Nearest centroid (by Euclidean distance, as k-means assigns) of each vector, and its cosine similarity to it"""
+    products = vectors @ centroids.T
+    labels = np.argmax(2 * products - (centroids ** 2).sum(axis=1), axis=1)
+    norms = np.linalg.norm(centroids, axis=1)
+    similarities = products[np.arange(len(vectors)), labels] / np.maximum(norms[labels], 1e-12)
+    return labels, similarities
+
+class TalentPools:
+    """Talent pools: mini-batch k-means clusters of candidate resume embeddings
+    
+    A fit streams the stored 'candidate' embeddings (the ones hybrid
+    retrieval ranks by) page by page through MiniBatchKMeans.partial_fit,
+    FIT_EPOCHS times, so memory is bounded by the batch size rather than the
+    pool. Only candidates without a stored embedding are encoded. Refits
+    start from the current centroids, so a pool keeps its id across refits
+    unless the pool count or embedding model changes. A second pass assigns
+    every candidate to its nearest centroid and labels each pool with its
+    representative skills: frequent in the pool, and more so than outside it.
+    
+    Between refits, an uploaded or edited candidate is assigned on the spot
+    and pulls its centroid toward it by 1/n, the per-centre learning rate of
+    mini-batch k-means. A background thread refits every refit_seconds if
+    candidates changed. Flagged near-duplicates are not clustered.
+    
+    A fit pins the embedding model it starts with. After a model swap the
+    pools stay listed but take no new assignments until refitted.
+    """
+    
+    def __init__(self, n_pools: int = 12, batch_size: int = 1024, refit_seconds: float = 900.0):
+        if n_pools < 1 or batch_size < n_pools:
+            raise ValueError("Talent pool count must be at least 1 and at most the batch size")
+        self.n_pools = n_pools
+        self.batch_size = batch_size
+        self.refit_seconds = refit_seconds
+        self._lock = threading.Lock()
+        self._fit_lock = threading.Lock()
+        self._centroids: Optional[np.ndarray] = None
+        self._counts: Optional[np.ndarray] = None
+        self._fitted_version = None
+        self._model_name = None  # Embedding model the centroids were fitted with
+        self._wake = threading.Event()
+        self._force_refit = False
+        self._worker = None
+    
+    def load(self) -> bool:
+        """Load the stored centroids fitted with the current embedding model, returning whether there were any"""
+        model_name = embedding_store.model_name
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, centroid, data_version FROM talent_pools WHERE model_name = ? ORDER BY id
+        ''', (model_name,))
+        rows = cursor.fetchall()
+        cursor.execute('''
+            SELECT talent_pool_id, COUNT(*) FROM candidates WHERE talent_pool_id IS NOT NULL GROUP BY talent_pool_id
+        ''')
+        sizes = dict(cursor.fetchall())
+        conn.close()
+        if not rows or [row[0] for row in rows] != list(range(1, len(rows) + 1)):
+            return False
+        
+        with self._lock:
+            self._centroids = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows]).copy()
+            self._counts = np.array([max(sizes.get(row[0], 0), 1) for row in rows], dtype=np.float64)
+            self._fitted_version = rows[0][2]
+            self._model_name = model_name
+        return True
+    
+    def _embed_missing(self, store) -> int:
+        """Encode the clustered candidates that have no stored embedding yet for the store's model"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT c.id, c.skills, c.education_level FROM candidates c
+            LEFT JOIN embeddings e ON e.entity_type = 'candidate' AND e.entity_id = c.id AND e.model_name = ?
+            WHERE e.entity_id IS NULL AND c.duplicate_of IS NULL
+            ORDER BY c.id
+        ''', (store.model_name,))
+        rows = cursor.fetchall()
+        for start in range(0, len(rows), EMBED_BATCH):
+            chunk = rows[start:start + EMBED_BATCH]
+            resume_texts = db.get_resume_texts([row[0] for row in chunk])
+            store.get_many(cursor, 'candidate', {
+                candidate_id: store.candidate_text(resume_texts.get(candidate_id), parse_skills(skills), education_level)
+                for candidate_id, skills, education_level in chunk
+            })
+            conn.commit()
+        conn.close()
+        return len(rows)
+    
+    def _pages(self, cursor, ids: List[int], model_name: str) -> Iterator[Tuple[List[int], List[List[str]], np.ndarray]]:
+        """(ids, skills, vectors under the model) of the given clustered candidates, batch_size at a time"""
+        for start in range(0, len(ids), self.batch_size):
+            chunk = ids[start:start + self.batch_size]
+            cursor.execute(f'''
+                SELECT c.id, c.skills, e.vector {CLUSTERED_CANDIDATES} AND c.id IN ({', '.join('?' for _ in chunk)})
+            ''', (model_name, *chunk))
+            rows = cursor.fetchall()
+            if rows:
+                yield (
+                    [row[0] for row in rows],
+                    [parse_skills(row[1]) for row in rows],
+                    np.vstack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+                )
+    
+    def _seed(self, cursor, ids: List[int], k: int, rng: np.random.Generator, model_name: str) -> np.ndarray:
+        """k-means++ initial centroids from a random sample of the clustered candidates"""
+        sample_ids = rng.choice(ids, size=min(len(ids), SEED_SAMPLE_SIZE), replace=False).tolist()
+        vectors = [page[2] for page in self._pages(cursor, sample_ids, model_name)]
+        return kmeans_plusplus(np.vstack(vectors), k, random_state=0)[0]
+    
+    @staticmethod
+    def _representative_skills(pool_skills: Counter, pool_size: int, overall: Counter, total: int,
+                               spellings: Dict[str, str]) -> List[Dict]:
+        """A pool's top skills by share of the pool times lift over the share among all candidates"""
+        skills = []
+        for skill, count in pool_skills.items():
+            share = count / pool_size
+            lift = share / (overall[skill] / total)
+            skills.append({'skill': spellings[skill], 'count': count, 'share': round(share, 4), 'lift': round(lift, 2)})
+        skills.sort(key=lambda item: (-item['share'] * item['lift'], -item['count'], item['skill']))
+        return skills[:TOP_SKILLS]
+    
+    def refit(self) -> Dict:
+        """Fit the pools over every clustered candidate and reassign them all"""
+        with self._fit_lock:
+            start = time.perf_counter()
+            data_version = db.get_data_version('candidates')
+            store = embedding_store.pinned()
+            model_name = store.model_name
+            embedded = self._embed_missing(store)
+            
+            conn = db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT c.id {CLUSTERED_CANDIDATES} ORDER BY c.id', (model_name,))
+            ids = [row[0] for row in cursor.fetchall()]
+            k = min(self.n_pools, len(ids))
+            if k == 0:
+                cursor.execute('DELETE FROM talent_pools')
+                cursor.execute('UPDATE candidates SET talent_pool_id = NULL, talent_pool_similarity = NULL WHERE talent_pool_id IS NOT NULL')
+                conn.commit()
+                conn.close()
+                with self._lock:
+                    self._centroids, self._counts, self._fitted_version, self._model_name = None, None, data_version, model_name
+                return {'pools': 0, 'candidates': 0, 'embedded': embedded, 'fit_ms': round((time.perf_counter() - start) * 1000, 2)}
+            
+            with self._lock:
+                # Centroids of another model live in another vector space: start over
+                previous = self._centroids.copy() if self._centroids is not None and self._model_name == model_name else None
+            rng = np.random.default_rng(0)
+            if previous is None or previous.shape[0] != k:
+                previous = self._seed(cursor, ids, k, rng, model_name)
+            kmeans = MiniBatchKMeans(n_clusters=k, init=previous, n_init=1, batch_size=self.batch_size, random_state=0)
+            # Mini-batches are drawn in a fresh random order each epoch; id order follows upload time, not the data
+            for _ in range(FIT_EPOCHS):
+                for _, _, vectors in self._pages(cursor, rng.permutation(ids).tolist(), model_name):
+                    if previous.shape[1] != vectors.shape[1]:
+                        raise ValueError("Stored candidate embeddings have mixed dimensions")
+                    kmeans.partial_fit(vectors)
+            centroids = kmeans.cluster_centers_.astype(np.float32)
+            
+            # Assign everyone, committing per page so uploads are not blocked for the whole pass
+            counts = np.zeros(k, dtype=np.int64)
+            pool_skills = [Counter() for _ in range(k)]
+            overall = Counter()
+            spellings = {}
+            writer = conn.cursor()
+            for page_ids, skills, vectors in self._pages(cursor, ids, model_name):
+                labels, similarities = nearest_pools(centroids, vectors)
+                writer.executemany(
+                    'UPDATE candidates SET talent_pool_id = ?, talent_pool_similarity = ? WHERE id = ?',
+                    [(int(label) + 1, round(float(similarity), 4), candidate_id)
+                     for candidate_id, label, similarity in zip(page_ids, labels, similarities)]
+                )
+                conn.commit()
+                for label, candidate_skills in zip(labels, skills):
+                    counts[label] += 1
+                    canonical = set()
+                    for skill in candidate_skills:
+                        key = normalize_skill(skill)
+                        spellings.setdefault(key, skill)
+                        canonical.add(key)
+                    pool_skills[label].update(canonical)
+                    overall.update(canonical)
+            writer.execute('''
+                UPDATE candidates SET talent_pool_id = NULL, talent_pool_similarity = NULL
+                WHERE talent_pool_id IS NOT NULL AND (duplicate_of IS NOT NULL OR talent_pool_id > ?)
+            ''', (k,))
+            
+            assigned = int(counts.sum())
+            writer.execute('DELETE FROM talent_pools')
+            for pool in range(k):
+                skills = self._representative_skills(pool_skills[pool], max(int(counts[pool]), 1), overall, assigned, spellings)
+                label = ' / '.join(item['skill'] for item in skills[:LABEL_SKILLS]) or f"Pool {pool + 1}"
+                writer.execute('''
+                    INSERT INTO talent_pools (id, label, centroid, top_skills, model_name, data_version)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (pool + 1, label, centroids[pool].tobytes(), json.dumps(skills), model_name, data_version))
+            conn.commit()
+            conn.close()
+            
+            with self._lock:
+                self._centroids = centroids
+                self._counts = np.maximum(counts, 1).astype(np.float64)
+                self._fitted_version = data_version
+                self._model_name = model_name
+            return {
+                'pools': k,
+                'candidates': assigned,
+                'embedded': embedded,
+                'fit_ms': round((time.perf_counter() - start) * 1000, 2)
+            }
+    
+    def _leave_pool(self, pool_id: int):
+        """Take a candidate out of a pool's count, so the centroid learning rates track the pool sizes (caller holds the lock)"""
+        if self._counts is not None and 1 <= pool_id <= len(self._counts):
+            self._counts[pool_id - 1] = max(1, self._counts[pool_id - 1] - 1)  # Floor of 1, like the fitted counts
+    
+    def assign_candidate(self, candidate_id: int) -> Optional[Dict]:
+        """Assign a new or edited candidate to its nearest pool, nudging that pool's centroid"""
+        store = embedding_store.pinned()
+        with self._lock:
+            fitted = self._centroids is not None and self._model_name == store.model_name
+        if not fitted:
+            self.request_refit()
+            return None
+        candidate = db.get_candidate_by_id(candidate_id)
+        if not candidate:
+            return None
+        if candidate['duplicate_of'] is not None:
+            # Flagged duplicates are not clustered: drop a pool assignment left from before the flag
+            if candidate['talent_pool_id'] is not None:
+                with self._lock:
+                    self._leave_pool(candidate['talent_pool_id'])
+                conn = db.get_connection()
+                conn.execute(
+                    'UPDATE candidates SET talent_pool_id = NULL, talent_pool_similarity = NULL WHERE id = ?', (candidate_id,)
+                )
+                conn.commit()
+                conn.close()
+            return None
+        
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        resume_text = db.get_resume_texts([candidate_id]).get(candidate_id)
+        vector = store.get_many(cursor, 'candidate', {
+            candidate_id: store.candidate_text(resume_text, candidate['skills'], candidate['education_level'])
+        })[candidate_id]
+        with self._lock:
+            if self._centroids is None or self._model_name != store.model_name or self._centroids.shape[1] != vector.shape[0]:
+                conn.commit()
+                conn.close()
+                return None
+            labels, similarities = nearest_pools(self._centroids, vector[None, :])
+            label = int(labels[0])
+            if candidate['talent_pool_id'] != label + 1:
+                if candidate['talent_pool_id'] is not None:
+                    self._leave_pool(candidate['talent_pool_id'])
+                self._counts[label] += 1
+                self._centroids[label] += (vector - self._centroids[label]) / self._counts[label]
+            centroid = self._centroids[label].copy()
+        
+        similarity = round(float(similarities[0]), 4)
+        cursor.execute(
+            'UPDATE candidates SET talent_pool_id = ?, talent_pool_similarity = ? WHERE id = ?',
+            (label + 1, similarity, candidate_id)
+        )
+        cursor.execute('UPDATE talent_pools SET centroid = ? WHERE id = ?', (centroid.tobytes(), label + 1))
+        conn.commit()
+        conn.close()
+        return {'talent_pool_id': label + 1, 'similarity': similarity}
+    
+    def get_pools(self, representatives: int = 3) -> Dict:
+        """Every pool with its size, representative skills and the candidates closest to its centroid"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, label, top_skills, fitted_at FROM talent_pools ORDER BY id')
+        rows = cursor.fetchall()
+        cursor.execute('''
+            SELECT talent_pool_id, COUNT(*) FROM candidates WHERE talent_pool_id IS NOT NULL GROUP BY talent_pool_id
+        ''')
+        sizes = dict(cursor.fetchall())
+        cursor.execute('''
+            SELECT talent_pool_id, id, name, talent_pool_similarity FROM (
+                SELECT talent_pool_id, id, name, talent_pool_similarity,
+                       ROW_NUMBER() OVER (PARTITION BY talent_pool_id ORDER BY talent_pool_similarity DESC, id) AS position
+                FROM candidates WHERE talent_pool_id IS NOT NULL
+            ) WHERE position <= ?
+            ORDER BY talent_pool_id, position
+        ''', (representatives,))
+        closest = {}
+        for pool_id, candidate_id, name, similarity in cursor.fetchall():
+            closest.setdefault(pool_id, []).append({'id': candidate_id, 'name': name, 'similarity': similarity})
+        cursor.execute('SELECT COUNT(*) FROM candidates WHERE talent_pool_id IS NULL AND duplicate_of IS NULL')
+        unassigned = cursor.fetchone()[0]
+        conn.close()
+        
+        pools = [
+            {
+                'id': pool_id,
+                'label': label,
+                'size': sizes.get(pool_id, 0),
+                'top_skills': json.loads(top_skills),
+                'representative_candidates': closest.get(pool_id, [])
+            }
+            for pool_id, label, top_skills, _ in rows if sizes.get(pool_id)
+        ]
+        pools.sort(key=lambda pool: (-pool['size'], pool['id']))
+        return {
+            'pools': pools,
+            'total_pools': len(pools),
+            'assigned_candidates': sum(pool['size'] for pool in pools),
+            'unassigned_candidates': unassigned,
+            'fitted_at': rows[0][3] if rows else None,
+            'refit_pending': (
+                self._centroids is None or self._model_name != embedding_store.model_name
+                or db.get_data_version('candidates') != self._fitted_version
+            )
+        }
+    
+    def get_pool_candidates(self, pool_id: int, offset: int = 0, limit: int = 50) -> Optional[Dict]:
+        """A pool's candidates, closest to its centroid first"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT label FROM talent_pools WHERE id = ?', (pool_id,))
+        pool = cursor.fetchone()
+        if not pool:
+            conn.close()
+            return None
+        cursor.execute('SELECT COUNT(*) FROM candidates WHERE talent_pool_id = ?', (pool_id,))
+        total = cursor.fetchone()[0]
+        cursor.execute('''
+            SELECT id, name, email, skills, experience_years, education_level, talent_pool_similarity
+            FROM candidates WHERE talent_pool_id = ?
+            ORDER BY talent_pool_similarity DESC, id
+            LIMIT ? OFFSET ?
+        ''', (pool_id, limit, offset))
+        candidates = [
+            {
+                'id': row[0],
+                'name': row[1],
+                'email': row[2],
+                'skills': parse_skills(row[3]),
+                'experience_years': row[4],
+                'education_level': row[5],
+                'similarity': row[6]
+            }
+            for row in cursor.fetchall()
+        ]
+        conn.close()
+        return {'pool_id': pool_id, 'label': pool[0], 'total': total, 'offset': offset, 'limit': limit, 'candidates': candidates}
+    
+    def request_refit(self):
+        """Have the background thread refit now, whether or not candidates changed"""
+        self._force_refit = True
+        self._wake.set()
+    
+    def start(self):
+        """Load the stored pools and start the background refit thread once (fitting right away if there are none)"""
+        if self._worker is not None:
+            return
+        if not self.load():
+            self._force_refit = True
+            self._wake.set()
+        self._worker = threading.Thread(target=self._refit_loop, name='talent-pool-refit', daemon=True)
+        self._worker.start()
+    
+    def _refit_loop(self):
+        """Refit every refit_seconds when candidates or the embedding model changed, or when a refit is requested"""
+        while True:
+            self._wake.wait(self.refit_seconds)
+            self._wake.clear()
+            force, self._force_refit = self._force_refit, False
+            try:
+                if force or db.get_data_version('candidates') != self._fitted_version or self._model_name != embedding_store.model_name:
+                    self.refit()
+            except Exception as e:
+                print(f"Error refitting talent pools: {e}")
+
+# Initialize talent pools instance
+talent_pools = TalentPools(
+    n_pools=config.TALENT_POOL_COUNT,
+    batch_size=config.TALENT_POOL_BATCH_SIZE,
+    refit_seconds=config.TALENT_POOL_REFIT_SECONDS
+) 
\ No newline at end of file
@@ -0,0 +1,118 @@
+import html
+import re
+import sqlite3
+import zlib
+from typing import List, Optional, Sequence
+
+# Searchable document types: FTS5 table and indexed columns. The tables are
+# contentless (the text lives in its source table, compressed for resumes),
+# and each FTS rowid is the id of the source row.
+TEXT_INDEXES = {
+    'resume': {'table': 'resume_fts', 'columns': ('text',)},
+    'job': {'table': 'job_fts', 'columns': ('title', 'description')},
+    'message': {'table': 'message_fts', 'columns': ('subject', 'content')}
+}
+
+def _fts5_available() -> bool:
+    """Whether the SQLite library Python links against was built with FTS5"""
+    try:
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE VIRTUAL TABLE fts5_probe USING fts5(text, content='')")
+        conn.close()
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+FTS5_AVAILABLE = _fts5_available()
+if not FTS5_AVAILABLE:
+    print("Warning: SQLite FTS5 not available. Full-text search will be disabled.")
+
+def compress_text(text: str) -> bytes:
+    """Compress text for storage"""
+    return zlib.compress(text.encode('utf-8'), 6)
+
+def decompress_text(data: Optional[bytes]) -> str:
+    """Decompress text stored by compress_text"""
+    return zlib.decompress(data).decode('utf-8') if data else ''
+
+def create_text_index_tables(cursor):
+    """Create the FTS5 tables of every document type"""
+    if not FTS5_AVAILABLE:
+        return
+    for index in TEXT_INDEXES.values():
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS {index['table']}
+            USING fts5({', '.join(index['columns'])}, content='', tokenize='porter unicode61')
+        ''')
+
+def index_document(cursor, doc_type: str, doc_id: int, values: Sequence[Optional[str]]):
+    """Add a document's column values to its type's full-text index"""
+    if not FTS5_AVAILABLE:
+        return
+    index = TEXT_INDEXES[doc_type]
+    cursor.execute(f'''
+        INSERT INTO {index['table']} (rowid, {', '.join(index['columns'])})
+        VALUES (?, {', '.join('?' for _ in index['columns'])})
+    ''', (doc_id, *[value or '' for value in values]))
+
+def unindex_document(cursor, doc_type: str, doc_id: int, values: Sequence[Optional[str]]):
+    """Remove a document from its type's full-text index
+
+    Contentless tables only store the index, so the values must be exactly
+    the ones the document was indexed with.
+    """
+    if not FTS5_AVAILABLE:
+        return
+    index = TEXT_INDEXES[doc_type]
+    table = index['table']
+    cursor.execute(f'''
+        INSERT INTO {table} ({table}, rowid, {', '.join(index['columns'])})
+        VALUES ('delete', ?, {', '.join('?' for _ in index['columns'])})
+    ''', (doc_id, *[value or '' for value in values]))
+
+def clear_text_index(cursor, doc_type: str):
+    """Empty a document type's full-text index"""
+    if not FTS5_AVAILABLE:
+        return
+    table = TEXT_INDEXES[doc_type]['table']
+    cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('delete-all')")
+
+def query_terms(query: str) -> List[str]:
+    """Quoted phrases and bare words of a search query"""
+    return [
+        phrase or word
+        for phrase, word in re.findall(r'"([^"]+)"|(\S+)', query or '')
+        if (phrase or word).strip()
+    ]
+
+def build_match_query(terms: List[str], match_all: bool = True) -> str:
+    """FTS5 MATCH expression for query terms, each quoted so punctuation (C++, node.js) is literal"""
+    quoted = ['"{}"'.format(term.replace('"', '""')) for term in terms]
+    return (' AND ' if match_all else ' OR ').join(quoted)
+
+def make_snippet(text: str, terms: List[str], width: int = 160) -> str:
+    """A window of text around the first query term hit, HTML-escaped, with hits wrapped in <mark>
+
+    Terms match word prefixes, approximating the index's porter stemming
+    (a search for "stream" also highlights "streams" and "streaming").
+    """
+    text = ' '.join((text or '').split())
+    words = [word for term in terms for word in re.findall(r'\w+', term)]
+    if not words:
+        return html.escape(text[:width])
+    pattern = re.compile(r'\b(?:' + '|'.join(re.escape(word) for word in words) + r')\w*', re.IGNORECASE)
+    first = pattern.search(text)
+    start = max(0, (first.start() if first else 0) - width // 3)
+    if start:
+        space = text.find(' ', start)
+        start = space + 1 if 0 <= space < start + 20 else start
+    window = text[start:start + width]
+    # Escape the text between and inside hits, so only the <mark> tags are markup
+    parts, end = [], 0
+    for hit in pattern.finditer(window):
+        parts.append(html.escape(window[end:hit.start()]))
+        parts.append(f"<mark>{html.escape(hit.group(0))}</mark>")
+        end = hit.end()
+    parts.append(html.escape(window[end:]))
+    snippet = ''.join(parts)
+    return ('…' if start else '') + snippet + ('…' if start + width < len(text) else '')
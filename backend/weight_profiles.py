@@ -0,0 +1,327 @@
+import copy
+import json
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional
+from database import db
+from config import config
+
+# Built-in weights, seeded as profile version 1 on first use
+DEFAULT_WEIGHTS = {
+    'scorer': {
+        'default_weights': {
+            'match_score': 0.6,      # RAG matching score weight
+            'experience': 0.3,       # Years of experience weight
+            'education': 0.1         # Education level weight
+        },
+        # Context-aware weight adjustments based on job type
+        'job_type_weights': {
+            'senior': {'match_score': 0.5, 'experience': 0.4, 'education': 0.1},
+            'junior': {'match_score': 0.7, 'experience': 0.1, 'education': 0.2},
+            'lead': {'match_score': 0.4, 'experience': 0.5, 'education': 0.1},
+            'manager': {'match_score': 0.3, 'experience': 0.5, 'education': 0.2},
+            'intern': {'match_score': 0.8, 'experience': 0.0, 'education': 0.2}
+        },
+        # Industry-specific weight adjustments
+        'industry_weights': {
+            'research': {'match_score': 0.4, 'experience': 0.3, 'education': 0.3},
+            'startup': {'match_score': 0.7, 'experience': 0.2, 'education': 0.1},
+            'enterprise': {'match_score': 0.5, 'experience': 0.4, 'education': 0.1}
+        }
+    },
+    'mcp': {
+        'context_weights': {
+            'skills_match': 0.4,
+            'experience_relevance': 0.3,
+            'cultural_fit': 0.15,
+            'growth_potential': 0.15
+        }
+    }
+}
+
+SCORER_WEIGHT_KEYS = ('match_score', 'experience', 'education')
+MCP_WEIGHT_KEYS = ('skills_match', 'experience_relevance', 'cultural_fit', 'growth_potential')
+
+def _merge(base: Dict, overrides: Dict, path: str):
+    """Merge overrides onto base in place, key by key, so nested defaults a partial override omits are kept"""
+    for key, value in overrides.items():
+        if isinstance(base.get(key), dict):
+            if not isinstance(value, dict):
+                raise ValueError(f"{path}.{key} must be an object")
+            _merge(base[key], value, f"{path}.{key}")
+        else:
+            base[key] = value
+
+def _freeze(value):
+    """Recursively wrap dicts in read-only mapping proxies"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    return value
+
+def _thaw(value):
+    """Recursively copy read-only mappings back into plain dicts"""
+    if isinstance(value, Mapping):
+        return {key: _thaw(item) for key, item in value.items()}
+    return value
+
+class WeightProfile:
+    """Immutable snapshot of one weight profile version"""
+    
+    __slots__ = ('version', 'name', 'weights')
+    
+    def __init__(self, version: int, name: str, weights: Dict):
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'weights', _freeze(weights))
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("WeightProfile snapshots are immutable")
+    
+    @property
+    def scorer(self) -> Mapping:
+        """MCPScorer weights (default, job type and industry)"""
+        return self.weights['scorer']
+    
+    @property
+    def mcp(self) -> Mapping:
+        """ModelContextProtocol weights"""
+        return self.weights['mcp']
+    
+    def to_dict(self) -> Dict:
+        """Serialize the snapshot"""
+        return {'version': self.version, 'name': self.name, 'weights': _thaw(self.weights)}
+
+class WeightProfileRegistry:
+    """Versioned scoring weight profiles stored in the weight_profiles table
+    
+    Scorers read `current()` once per request and use that snapshot
+    throughout, so activating a new version never changes weights under an
+    in-flight request. The active (and optional shadow) version is
+    re-checked at most every `refresh_seconds`, letting every worker pick up
+    changes without a restart.
+    """
+    
+    def __init__(self, refresh_seconds: float = 5.0):
+        self.refresh_seconds = refresh_seconds
+        self._snapshot: Optional[WeightProfile] = None
+        self._shadow_snapshot: Optional[WeightProfile] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+    
+    def current(self) -> WeightProfile:
+        """Get the active profile snapshot"""
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - self._checked_at >= self.refresh_seconds:
+            snapshot = self.refresh()
+        return snapshot
+    
+    def shadow(self) -> Optional[WeightProfile]:
+        """Get the shadow profile snapshot, or None when shadow scoring is off"""
+        self.current()
+        return self._shadow_snapshot
+    
+    def refresh(self) -> WeightProfile:
+        """Reload the active and shadow profiles if their versions changed"""
+        with self._lock:
+            conn = db.get_connection()
+            cursor = conn.cursor()
+            try:
+                active_version, shadow_version = self._flagged_versions(cursor)
+                if active_version is None:
+                    self._seed_default(cursor)
+                    conn.commit()
+                    active_version, shadow_version = self._flagged_versions(cursor)
+                # Swaps are single reference assignments; readers never see a partial profile
+                self._snapshot = self._load_snapshot(cursor, active_version, self._snapshot)
+                self._shadow_snapshot = self._load_snapshot(cursor, shadow_version, self._shadow_snapshot)
+                self._checked_at = time.monotonic()
+            finally:
+                conn.close()
+            return self._snapshot
+    
+    def _flagged_versions(self, cursor):
+        """Get the (active, shadow) versions, None where unset"""
+        cursor.execute('SELECT version, is_active FROM weight_profiles WHERE is_active = 1 OR is_shadow = 1')
+        active_version = shadow_version = None
+        for version, is_active in cursor.fetchall():
+            if is_active:
+                active_version = version
+            else:
+                shadow_version = version
+        return active_version, shadow_version
+    
+    def _load_snapshot(self, cursor, version: Optional[int], loaded: Optional[WeightProfile]) -> Optional[WeightProfile]:
+        """Reuse the loaded snapshot if it is still the wanted version, else load it"""
+        if version is None:
+            return None
+        if loaded is not None and loaded.version == version:
+            return loaded
+        cursor.execute('SELECT version, name, weights FROM weight_profiles WHERE version = ?', (version,))
+        version, name, weights = cursor.fetchone()
+        return WeightProfile(version, name, json.loads(weights))
+    
+    def _seed_default(self, cursor):
+        """Insert the built-in weights as the active profile if the registry is empty"""
+        cursor.execute('''
+            INSERT INTO weight_profiles (name, weights, is_active, activated_at)
+            SELECT 'default', ?, 1, CURRENT_TIMESTAMP
+            WHERE NOT EXISTS (SELECT 1 FROM weight_profiles)
+        ''', (json.dumps(DEFAULT_WEIGHTS),))
+    
+    def validate(self, weights: Dict) -> Dict:
+        """Merge partial weights onto the defaults and validate the result"""
+        if not isinstance(weights, dict):
+            raise ValueError("weights must be an object")
+        unknown = set(weights) - set(DEFAULT_WEIGHTS)
+        if unknown:
+            raise ValueError(f"Unknown weight sections: {sorted(unknown)}")
+        
+        merged = copy.deepcopy(DEFAULT_WEIGHTS)
+        for section, groups in weights.items():
+            if not isinstance(groups, dict):
+                raise ValueError(f"'{section}' must be an object")
+            for group, values in groups.items():
+                if group not in merged[section]:
+                    raise ValueError(f"Unknown weight group: {section}.{group}")
+                if not isinstance(values, dict):
+                    raise ValueError(f"{section}.{group} must be an object")
+                _merge(merged[section][group], values, f"{section}.{group}")
+        
+        def check(path: str, values: Dict, keys):
+            missing = set(keys) - set(values)
+            if missing:
+                raise ValueError(f"{path} is missing weights: {sorted(missing)}")
+            for key, value in values.items():
+                if key not in keys:
+                    raise ValueError(f"Unknown weight {path}.{key}")
+                if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+                    raise ValueError(f"{path}.{key} must be a non-negative number")
+            if sum(values.values()) <= 0:
+                raise ValueError(f"{path} weights must not all be zero")
+        
+        scorer = merged['scorer']
+        check('scorer.default_weights', scorer['default_weights'], SCORER_WEIGHT_KEYS)
+        for group in ('job_type_weights', 'industry_weights'):
+            for name, values in scorer[group].items():
+                check(f'scorer.{group}.{name}', values, SCORER_WEIGHT_KEYS)
+        check('mcp.context_weights', merged['mcp']['context_weights'], MCP_WEIGHT_KEYS)
+        return merged
+    
+    def create_profile(self, name: str, weights: Dict, activate: bool = False) -> Dict:
+        """Store a new profile version, optionally activating it"""
+        merged = self.validate(weights)
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        try:
+            self._seed_default(cursor)
+            cursor.execute('''
+                INSERT INTO weight_profiles (name, weights, is_active) VALUES (?, ?, 0)
+            ''', (name, json.dumps(merged)))
+            version = cursor.lastrowid
+            if activate:
+                self._activate(cursor, version)
+            conn.commit()
+        finally:
+            conn.close()
+        
+        if activate:
+            self.refresh()
+        return self.get_profile(version)
+    
+    def activate(self, version: int) -> bool:
+        """Make a stored profile version the active one"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT 1 FROM weight_profiles WHERE version = ?', (version,))
+            if not cursor.fetchone():
+                return False
+            self._activate(cursor, version)
+            conn.commit()
+        finally:
+            conn.close()
+        
+        self.refresh()
+        return True
+    
+    def _activate(self, cursor, version: int):
+        """Flip the active flag inside the caller's transaction"""
+        cursor.execute('UPDATE weight_profiles SET is_active = 0 WHERE is_active = 1 AND version != ?', (version,))
+        cursor.execute('''
+            UPDATE weight_profiles SET is_active = 1, is_shadow = 0, activated_at = CURRENT_TIMESTAMP WHERE version = ?
+        ''', (version,))
+        # Stored scores of the previous profile are stale from now on (STALE_SCORE_CONDITION)
+        db.bump_data_version(cursor, 'weight_profiles', 'scores')
+    
+    def set_shadow(self, version: Optional[int]) -> bool:
+        """Evaluate a stored profile in shadow mode (None turns shadow scoring off)"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        try:
+            if version is not None:
+                cursor.execute('SELECT is_active FROM weight_profiles WHERE version = ?', (version,))
+                row = cursor.fetchone()
+                if not row:
+                    return False
+                if row[0]:
+                    raise ValueError("The active profile cannot also be the shadow profile")
+            cursor.execute('UPDATE weight_profiles SET is_shadow = 0 WHERE is_shadow = 1')
+            if version is not None:
+                cursor.execute('UPDATE weight_profiles SET is_shadow = 1 WHERE version = ?', (version,))
+            db.bump_data_version(cursor, 'weight_profiles')
+            conn.commit()
+        finally:
+            conn.close()
+        
+        self.refresh()
+        return True
+    
+    def get_profile(self, version: int) -> Optional[Dict]:
+        """Get a stored profile version"""
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT version, name, weights, is_active, created_at, activated_at, is_shadow
+            FROM weight_profiles WHERE version = ?
+        ''', (version,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        if row:
+            return {
+                'version': row[0],
+                'name': row[1],
+                'weights': json.loads(row[2]),
+                'is_active': bool(row[3]),
+                'is_shadow': bool(row[6]),
+                'created_at': row[4],
+                'activated_at': row[5]
+            }
+        return None
+    
+    def list_profiles(self) -> List[Dict]:
+        """List all profile versions, newest first (without weights)"""
+        self.current()  # Seeds the default profile on a fresh database
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT version, name, is_active, created_at, activated_at, is_shadow
+            FROM weight_profiles ORDER BY version DESC
+        ''')
+        profiles = [
+            {
+                'version': row[0],
+                'name': row[1],
+                'is_active': bool(row[2]),
+                'is_shadow': bool(row[5]),
+                'created_at': row[3],
+                'activated_at': row[4]
+            }
+            for row in cursor.fetchall()
+        ]
+        conn.close()
+        return profiles
+
+# Initialize weight profile registry instance
+weight_profiles = WeightProfileRegistry(refresh_seconds=config.WEIGHT_PROFILE_REFRESH_SECONDS) 
\ No newline at end of file
@@ -0,0 +1,179 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from database import db, SCORE_COMPONENTS
+from ranking import top_k_rows
+
+# Weights RAGMatcher.compute_overall_match uses for the stored components
+BASELINE_WEIGHTS = {'skills': 0.4, 'experience': 0.3, 'education': 0.1, 'semantic': 0.2}
+
+class JobScoreMatrix:
+    """Columnar component scores of one job's scored candidates
+    
+    Rows are ordered by candidate id, which is also the tie-break order for
+    every ranking computed from the matrix.
+    """
+    
+    def __init__(self, candidate_ids: np.ndarray, components: np.ndarray, missing_components: int):
+        self.candidate_ids = candidate_ids
+        self.components = components  # (n, len(SCORE_COMPONENTS)) float64
+        self.missing_components = missing_components
+        self.baseline_scores = components @ np.array([BASELINE_WEIGHTS[c] for c in SCORE_COMPONENTS])
+        self.baseline_ranks = rank_positions(self.baseline_scores)
+
+def rank_positions(scores: np.ndarray) -> np.ndarray:
+    """1-based rank of every row (score descending, row order breaks ties)"""
+    order = np.argsort(-scores, kind='stable')
+    ranks = np.empty(len(scores), dtype=np.int64)
+    ranks[order] = np.arange(1, len(scores) + 1)
+    return ranks
+
+class WhatIfSimulator:
+    """Re-ranks a job's scored candidates under arbitrary component weights
+    
+    Component scores come from candidate_scores and are cached per job as a
+    numpy matrix, rebuilt when the scores data version changes. A what-if
+    query is one matrix-vector product plus an argpartition for the
+    shortlist.
+    """
+    
+    def __init__(self, max_jobs: int = 32):
+        self.max_jobs = max_jobs
+        self._matrices = OrderedDict()  # job_id -> (scores data version, JobScoreMatrix)
+        self._lock = threading.Lock()
+    
+    def get_matrix(self, job_id: int) -> JobScoreMatrix:
+        """Get the cached component matrix for a job, reloading it if scores changed"""
+        version = db.get_data_version('scores')
+        with self._lock:
+            entry = self._matrices.get(job_id)
+            if entry and entry[0] == version:
+                self._matrices.move_to_end(job_id)
+                return entry[1]
+        
+        matrix = self._load_matrix(job_id)
+        with self._lock:
+            self._matrices[job_id] = (version, matrix)
+            self._matrices.move_to_end(job_id)
+            while len(self._matrices) > self.max_jobs:
+                self._matrices.popitem(last=False)
+        return matrix
+    
+    def _load_matrix(self, job_id: int) -> JobScoreMatrix:
+        """Read a job's component scores into a columnar matrix"""
+        columns = ', '.join(f'{component}_component' for component in SCORE_COMPONENTS)
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT candidate_id, {columns}
+            FROM candidate_scores
+            WHERE id IN (SELECT MAX(id) FROM candidate_scores WHERE job_id = ? GROUP BY candidate_id)
+            ORDER BY candidate_id
+        ''', (job_id,))
+        rows = cursor.fetchall()
+        conn.close()
+        
+        complete = [row for row in rows if all(value is not None for value in row[1:])]
+        if complete:
+            data = np.array(complete, dtype=np.float64)
+            candidate_ids, components = data[:, 0].astype(np.int64), data[:, 1:]
+        else:
+            candidate_ids = np.zeros(0, dtype=np.int64)
+            components = np.zeros((0, len(SCORE_COMPONENTS)))
+        return JobScoreMatrix(candidate_ids, components, len(rows) - len(complete))
+    
+    def normalize_weights(self, weights: Dict[str, float]) -> Dict[str, float]:
+        """Validate a weight vector and scale it to sum to 1 (missing components weigh 0)"""
+        unknown = set(weights) - set(SCORE_COMPONENTS)
+        if unknown:
+            raise ValueError(f"Unknown components: {sorted(unknown)}; expected {list(SCORE_COMPONENTS)}")
+        if any(value < 0 for value in weights.values()):
+            raise ValueError("Weights must be non-negative")
+        total = sum(weights.values())
+        if total <= 0:
+            raise ValueError("At least one weight must be positive")
+        return {component: weights.get(component, 0.0) / total for component in SCORE_COMPONENTS}
+    
+    def simulate(self, job_id: int, weights: Dict[str, float], top_k: int = 20) -> Dict:
+        """Shortlist under the given weights, with rank deltas against the baseline weights"""
+        start = time.perf_counter()
+        weights = self.normalize_weights(weights)
+        matrix = self.get_matrix(job_id)
+        total = len(matrix.candidate_ids)
+        top_k = min(top_k, total)
+        
+        scores = matrix.components @ np.array([weights[c] for c in SCORE_COMPONENTS])
+        shortlist_rows = top_k_rows(scores, top_k)
+        baseline_rows = top_k_rows(matrix.baseline_scores, top_k)
+        
+        # Only the baseline shortlist members that dropped out need a full-array rank
+        dropped_rows = np.setdiff1d(baseline_rows, shortlist_rows)
+        dropped_ranks = [self._rank_of(scores, row) for row in dropped_rows]
+        
+        names = self._candidate_names(
+            [int(matrix.candidate_ids[row]) for row in np.concatenate([shortlist_rows, dropped_rows])]
+        )
+        shortlist = []
+        for new_rank, row in enumerate(shortlist_rows, start=1):
+            candidate_id = int(matrix.candidate_ids[row])
+            baseline_rank = int(matrix.baseline_ranks[row])
+            shortlist.append({
+                'candidate_id': candidate_id,
+                'name': names.get(candidate_id),
+                'new_rank': new_rank,
+                'baseline_rank': baseline_rank,
+                'rank_delta': baseline_rank - new_rank,  # Positive = moved up
+                'new_score': round(float(scores[row]), 2),
+                'baseline_score': round(float(matrix.baseline_scores[row]), 2),
+                'components': {
+                    component: round(float(value), 2)
+                    for component, value in zip(SCORE_COMPONENTS, matrix.components[row])
+                }
+            })
+        dropped_out = sorted([
+            {
+                'candidate_id': int(matrix.candidate_ids[row]),
+                'name': names.get(int(matrix.candidate_ids[row])),
+                'baseline_rank': int(matrix.baseline_ranks[row]),
+                'new_rank': new_rank,
+                'rank_delta': int(matrix.baseline_ranks[row]) - new_rank
+            }
+            for row, new_rank in zip(dropped_rows, dropped_ranks)
+        ], key=lambda item: item['baseline_rank'])
+        
+        return {
+            'job_id': job_id,
+            'weights_used': {component: round(value, 4) for component, value in weights.items()},
+            'baseline_weights': BASELINE_WEIGHTS,
+            'total_candidates': total,
+            'missing_components': matrix.missing_components,
+            'top_k': top_k,
+            'shortlist_overlap': top_k - len(dropped_rows),
+            'shortlist': shortlist,
+            'dropped_out': dropped_out,
+            'compute_ms': round((time.perf_counter() - start) * 1000, 2)
+        }
+    
+    def _rank_of(self, scores: np.ndarray, row: int) -> int:
+        """1-based rank of one row under rank_positions' ordering"""
+        score = scores[row]
+        return int(np.count_nonzero(scores > score) + np.count_nonzero(scores[:row] == score) + 1)
+    
+    def _candidate_names(self, candidate_ids: List[int]) -> Dict[int, Optional[str]]:
+        """Fetch names for the handful of candidates being returned"""
+        if not candidate_ids:
+            return {}
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT id, name FROM candidates WHERE id IN ({', '.join('?' for _ in candidate_ids)})",
+            candidate_ids
+        )
+        names = dict(cursor.fetchall())
+        conn.close()
+        return names
+
+# Initialize what-if simulator instance
+what_if_simulator = WhatIfSimulator() 
\ No newline at end of file